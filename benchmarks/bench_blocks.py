@@ -0,0 +1,66 @@
+"""
+Compares pydantic block models with compact blocks: conversion throughput
+(graph to blocks to code entries) and the memory held by the block trees.
+
+    python -m benchmarks.bench_blocks --sizes 10000 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.generator.graph2block import G2BConverter
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from benchmarks.bench_converter import GRAPHS
+
+
+def convert(graph, compact: bool):
+    blocks = [block[0] for block in G2BConverter(graph).graph_to_blocks('start', compact=compact)]
+    cgm = CodeGenerationManager()
+    for block in blocks:
+        cgm.add_block(block)
+    return blocks, cgm.process_blocks()
+
+
+def block_memory(graph, compact: bool) -> int:
+    """Bytes still allocated after building the block trees."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    blocks = G2BConverter(graph).graph_to_blocks('start', compact=compact)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del blocks
+    return used
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--graphs', nargs='+', choices=sorted(GRAPHS), default=list(GRAPHS))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'graph':>8} {'nodes':>8} {'blocks':>8} {'best s':>10} {'blocks/s':>10} {'MB':>8}")
+    for name in args.graphs:
+        for n in args.sizes:
+            graph = GRAPHS[name](n)
+            for compact in (False, True):
+                best = float('inf')
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    _, entries = convert(graph, compact)
+                    best = min(best, time.perf_counter() - start)
+                megabytes = block_memory(graph, compact) / 2 ** 20
+                label = 'compact' if compact else 'models'
+                print(f"{name:>8} {graph.number_of_nodes():>8} {label:>8} {best:>10.4f} "
+                      f"{len(entries) / best:>10.0f} {megabytes:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
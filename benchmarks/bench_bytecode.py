@@ -0,0 +1,53 @@
+"""
+Compares the ways of getting a runnable code object once the blocks are
+built: generating the program text and compiling it, building the AST and
+compiling it, and loading the marshalled code object as the cache does:
+
+    python -m benchmarks.bench_bytecode --sizes 1000 10000 --kind while_loops
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.cache import code_from_pyc, code_to_pyc
+from src.pipeline import code_generator, convert_source, convert_to_code, convert_to_module
+
+
+def best_of(repeat, function):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=sorted(PROGRAMS), default='while_loops')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'blocks':>8} {'text s':>9} {'ast s':>9} {'cached s':>9} {'pyc KB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            diagram = write_synthetic_diagram(Path(directory) / f'{size}.drawio', args.kind, size)
+            blocks = convert_source(diagram).blocks
+            pyc = code_to_pyc(compile(convert_to_module(blocks), '<flow2code>', 'exec'), bytes(8))
+
+            text = best_of(args.repeat, lambda: compile(
+                convert_to_code(code_generator(blocks).process_blocks()), '<flow2code>', 'exec'))
+            tree = best_of(args.repeat, lambda: compile(convert_to_module(blocks), '<flow2code>', 'exec'))
+            cached = best_of(args.repeat, lambda: code_from_pyc(pyc))
+            print(f"{len(blocks):>8} {text:>9.4f} {tree:>9.4f} {cached:>9.5f} {len(pyc) / 2 ** 10:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
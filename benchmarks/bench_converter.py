@@ -0,0 +1,119 @@
+"""
+Times graph-to-block conversion on long chains and deep nesting.
+
+Graphs are built already annotated (node types and edge roles as left by
+label matching), so only ``G2BConverter`` is measured. Blocks are built
+compact, as in the pipeline (see ``bench_blocks`` for the pydantic models):
+
+    chain   START -> n process blocks -> END
+    loop    a repeat loop whose body is a chain of n process blocks
+    nested  n decisions, each nested in the 'Yes' branch of the previous one, all
+            branches joining at one block before END
+    elif    n decisions on the main flow, each in the 'No' branch of the previous one
+
+    python -m benchmarks.bench_converter --sizes 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+
+from src.generator.graph2block import G2BConverter
+
+
+def chain_graph(n: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node('start', type='terminator', label='START')
+    previous = 'start'
+    for i in range(n):
+        graph.add_node(f'p{i}', type='process', label=f'x{i} = {i}')
+        graph.add_edge(previous, f'p{i}', role='u_def')
+        previous = f'p{i}'
+    graph.add_node('end', type='terminator', label='END')
+    graph.add_edge(previous, 'end', role='u_def')
+    return graph
+
+
+def loop_graph(n: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node('start', type='terminator', label='START')
+    graph.add_node('loop', type='repeat_loop', label='repeat 3 times')
+    graph.add_edge('start', 'loop')
+    previous = 'loop'
+    for i in range(n):
+        graph.add_node(f'p{i}', type='process', label=f'x{i} = {i}')
+        graph.add_edge(previous, f'p{i}', role='body' if previous == 'loop' else 'u_def')
+        previous = f'p{i}'
+    graph.add_edge(previous, 'loop', role='u_def')
+    graph.add_node('end', type='terminator', label='END')
+    graph.add_edge('loop', 'end', role='exit')
+    return graph
+
+
+def nested_graph(n: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node('start', type='terminator', label='START')
+    graph.add_node('join', type='process', label='y = 0')
+    graph.add_node('end', type='terminator', label='END')
+    graph.add_edge('join', 'end', role='u_def')
+    previous = 'start'
+    for i in range(n):
+        graph.add_node(f'd{i}', type='decision', label=f'x > {i}')
+        graph.add_node(f'p{i}', type='process', label=f'x = {i}')
+        if previous == 'start':
+            graph.add_edge(previous, f'd{i}')
+        else:
+            graph.add_edge(previous, f'd{i}', label='Yes', role='true branch')
+        graph.add_edge(f'd{i}', f'p{i}', label='No', role='false branch')
+        graph.add_edge(f'p{i}', 'join', role='u_def')
+        previous = f'd{i}'
+    if previous == 'start':
+        graph.add_edge(previous, 'join')
+    else:
+        graph.add_edge(previous, 'join', label='Yes', role='true branch')
+    return graph
+
+
+def elif_graph(n: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node('start', type='terminator', label='START')
+    graph.add_node('end', type='terminator', label='END')
+    graph.add_edge('start', 'd0')
+    for i in range(n):
+        graph.add_node(f'd{i}', type='decision', label=f'x == {i}')
+        graph.add_node(f'p{i}', type='process', label=f'y = {i}')
+        graph.add_edge(f'd{i}', f'p{i}', label='Yes', role='true branch')
+        graph.add_edge(f'd{i}', f'd{i + 1}' if i + 1 < n else 'end', label='No', role='false branch')
+        graph.add_edge(f'p{i}', 'end', role='u_def')
+    return graph
+
+
+GRAPHS = {'chain': chain_graph, 'loop': loop_graph, 'nested': nested_graph, 'elif': elif_graph}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--graphs', nargs='+', choices=sorted(GRAPHS), default=list(GRAPHS))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'graph':>8} {'nodes':>8} {'best s':>10} {'nodes/s':>12}")
+    for name in args.graphs:
+        for n in args.sizes:
+            graph = GRAPHS[name](n)
+            best = float('inf')
+            for _ in range(args.repeat):
+                converter = G2BConverter(graph)
+                start = time.perf_counter()
+                converter.graph_to_blocks('start', compact=True)
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:>8} {graph.number_of_nodes():>8} {best:>10.4f} {graph.number_of_nodes() / best:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Times the traversal-heavy stages on ``nx.DiGraph`` and on ``CSRGraph``
+(built from the parsed graph, or from a snapshot):
+
+    python -m benchmarks.bench_csr_graph --kinds sequence while_loops --sizes 10000 50000
+
+Both graphs must produce the same code and validation errors, which is
+checked on every run.
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser.snapshot import load_snapshot, save_snapshot
+from src.parser.validator import validate_graph
+from src.pipeline import find_starting_node, graph_to_blocks
+from src.utils.csr_graph import CSRGraph
+from src.utils.matching import classify_edges, classify_loops, map_labels_to_edges
+
+STAGES = ('map_labels_to_edges', 'classify_loops', 'classify_edges', 'graph_to_blocks', 'validate_graph')
+
+
+def run_stages(graph):
+    """Runs the stages on ``graph`` in pipeline order; returns their times and results."""
+    times = {}
+    start = time.perf_counter()
+    map_labels_to_edges(graph, classify=False)
+    times['map_labels_to_edges'] = time.perf_counter() - start
+    start = time.perf_counter()
+    classify_loops(graph)
+    times['classify_loops'] = time.perf_counter() - start
+    start = time.perf_counter()
+    classify_edges(graph)
+    times['classify_edges'] = time.perf_counter() - start
+    start = time.perf_counter()
+    blocks = graph_to_blocks(graph)
+    times['graph_to_blocks'] = time.perf_counter() - start
+    start = time.perf_counter()
+    errors = validate_graph(graph, graph.nodes)
+    times['validate_graph'] = time.perf_counter() - start
+    return times, (find_starting_node(graph), blocks, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kinds', nargs='+', choices=sorted(PROGRAMS), default=['sequence', 'while_loops'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'kind':>12} {'nodes':>7} {'graph':>6} {'build s':>8} " + ' '.join(f'{stage[:14]:>14}' for stage in STAGES))
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in args.kinds:
+            for size in args.sizes:
+                diagram = write_synthetic_diagram(Path(directory) / f'{kind}.drawio', kind, size)
+                parsed = parse_drawio_file(diagram)
+                snapshot_path = Path(directory) / f'{kind}.f2c'
+                save_snapshot(parsed, snapshot_path)
+
+                builds = {
+                    'nx': lambda: copy.deepcopy(parsed),
+                    'csr': lambda: CSRGraph.from_networkx(parsed),
+                    'snap': lambda: CSRGraph.from_snapshot(load_snapshot(snapshot_path)),
+                }
+                results = {}
+                for name, build in builds.items():
+                    start = time.perf_counter()
+                    graph = build()
+                    build_time = time.perf_counter() - start
+                    times, results[name] = run_stages(graph)
+                    print(f"{kind:>12} {len(parsed):>7} {name:>6} {build_time:>8.4f} "
+                          + ' '.join(f'{times[stage]:>14.4f}' for stage in STAGES))
+                assert results['csr'] == results['nx'] == results['snap'], "The graphs should give the same results"
+
+
+if __name__ == '__main__':
+    main()
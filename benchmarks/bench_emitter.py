@@ -0,0 +1,69 @@
+"""
+Compares building the generated program as one string with streaming it
+through a ``CodeSink``: peak memory of the code generation stage and the time
+until the first bytes reach the output.
+
+    python -m benchmarks.bench_emitter --sizes 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.generator.graph2block import G2BConverter
+from src.generator.codeSink import CodeSink
+from src.pipeline import code_generator, convert_to_code, iter_code
+from benchmarks.bench_converter import GRAPHS
+
+
+class FirstWrite:
+    """Binary /dev/null that remembers when it was first written to."""
+
+    def __init__(self):
+        self.first = None
+        self.bytes = 0
+
+    def write(self, data):
+        if self.first is None:
+            self.first = time.perf_counter()
+        self.bytes += len(data)
+
+
+def generate(blocks, stream: bool):
+    target = FirstWrite()
+    start = time.perf_counter()
+    tracemalloc.start()
+    cgm = code_generator(blocks)
+    if stream:
+        with CodeSink(target) as sink:
+            sink.write_all(iter_code(cgm.iter_entries()))
+    else:
+        target.write(convert_to_code(cgm.process_blocks()).encode())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return time.perf_counter() - start, target.first - start, peak, target.bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--graphs', nargs='+', choices=sorted(GRAPHS), default=['chain', 'loop'])
+    args = parser.parse_args(argv)
+
+    print(f"{'graph':>8} {'nodes':>8} {'mode':>8} {'total s':>9} {'first s':>9} {'peak MB':>9} {'output MB':>10}")
+    for name in args.graphs:
+        for n in args.sizes:
+            graph = GRAPHS[name](n)
+            blocks = [block[0] for block in G2BConverter(graph).graph_to_blocks('start', compact=True)]
+            for stream in (False, True):
+                total, first, peak, size = generate(blocks, stream)
+                mode = 'stream' if stream else 'string'
+                print(f"{name:>8} {graph.number_of_nodes():>8} {mode:>8} {total:>9.3f} {first:>9.4f} "
+                      f"{peak / 2 ** 20:>9.1f} {size / 2 ** 20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Times label-to-edge matching on synthetic diagrams with many decisions.
+
+Every decision gets two outgoing edges and a "Yes"/"No" text block near each
+exit, scattered over a square canvas:
+
+    python -m benchmarks.bench_matching --decisions 100 1000 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+
+from src.utils import matching
+
+
+def decision_grid_graph(n_decisions: int, seed: int = 0) -> nx.DiGraph:
+    rng = random.Random(seed)
+    side = int(n_decisions ** 0.5) + 1
+    graph = nx.DiGraph()
+    for i in range(n_decisions):
+        x, y = (i % side) * 400 + rng.randint(0, 40), (i // side) * 400 + rng.randint(0, 40)
+        geometry = lambda gx, gy, w, h: {'x': float(gx), 'y': float(gy), 'width': float(w), 'height': float(h)}
+        graph.add_node(f'd{i}', type='decision', label=f'x > {i}', geometry=geometry(x, y, 80, 80))
+        graph.add_node(f'yes{i}', type='process', label='pass', geometry=geometry(x + 200, y + 10, 120, 60))
+        graph.add_node(f'no{i}', type='process', label='pass', geometry=geometry(x - 20, y + 200, 120, 60))
+        graph.add_node(f'tyes{i}', type='text', label='Yes', geometry=geometry(x + 85, y + 15, 40, 30))
+        graph.add_node(f'tno{i}', type='text', label='No', geometry=geometry(x + 45, y + 85, 40, 30))
+        graph.add_edge(f'd{i}', f'yes{i}', style='edgeStyle=none;html=1;exitX=1;exitY=0.5;exitDx=0;exitDy=0;')
+        graph.add_edge(f'd{i}', f'no{i}', style='edgeStyle=none;html=1;exitX=0.5;exitY=1;exitDx=0;exitDy=0;')
+    return graph
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--decisions', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'decisions':>10} {'texts':>8} {'best s':>10}")
+    for n in args.decisions:
+        best = float('inf')
+        for _ in range(args.repeat):
+            graph = decision_grid_graph(n)
+            start = time.perf_counter()
+            matching.map_labels_to_edges(graph)
+            best = min(best, time.perf_counter() - start)
+        print(f"{n:>10} {2 * n:>8} {best:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares peak RSS and wall time of the tree and streaming draw.io parsers.
+
+Every measurement runs in a fresh interpreter so peak RSS is not polluted by
+earlier runs:
+
+    python -m benchmarks.bench_parser --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import write_chain_diagram
+
+MODES = ('tree', 'streaming')
+
+
+def measure(mode, file_path):
+    """Parses ``file_path`` in this process and returns the measurements."""
+    from src.parser.drawio_parser import parse_drawio_file
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    graph = parse_drawio_file(file_path, streaming=(mode == 'streaming'))
+    wall = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': mode,
+        'wall_s': round(wall, 4),
+        'peak_rss_mb': round(rss_after / 1024, 1),
+        'parse_rss_mb': round((rss_after - rss_before) / 1024, 1),
+        'nodes': graph.number_of_nodes(),
+        'edges': graph.number_of_edges(),
+    }
+
+
+def run_case(mode, file_path):
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.bench_parser', '--worker', mode, str(file_path)],
+        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='number of cells in each synthetic diagram')
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        mode, file_path = args.worker
+        print(json.dumps(measure(mode, file_path)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'cells':>10} {'file MB':>8} {'mode':>10} {'wall s':>8} {'peak RSS MB':>12} {'parse RSS MB':>13}")
+        for size in args.sizes:
+            file_path = write_chain_diagram(Path(tmp) / f'chain_{size}.drawio', size)
+            file_mb = file_path.stat().st_size / 2 ** 20
+            for mode in MODES:
+                result = run_case(mode, file_path)
+                print(f"{size:>10} {file_mb:>8.1f} {mode:>10} {result['wall_s']:>8.3f} "
+                      f"{result['peak_rss_mb']:>12.1f} {result['parse_rss_mb']:>13.1f}")
+            file_path.unlink()
+
+
+if __name__ == '__main__':
+    main()
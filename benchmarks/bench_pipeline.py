@@ -0,0 +1,110 @@
+"""
+Times every pipeline stage on synthetic flowcharts of growing size, so
+scaling regressions show up as numbers.
+
+For each diagram kind (see ``benchmarks.synthetic.PROGRAMS``) and size, the
+whole conversion runs ``--repeat`` times and every stage keeps its best wall
+time. One more run traces memory and gives the peak allocation of each stage.
+The time per node should stay flat as sizes grow:
+
+    python -m benchmarks.bench_pipeline --kinds sequence mixed --sizes 1000 10000 --json results.json
+
+The same stages are benchmarked with pytest-benchmark in
+``benchmarks/test_pipeline_benchmarks.py``.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.pipeline import code_generator, convert_file, convert_to_code, graph_to_blocks
+from src.profiling import Profiler
+from src.utils.matching import classify_edges, classify_loops, map_labels_to_edges
+
+STAGES = ('parse_drawio_file', 'map_labels_to_edges', 'classify_loops', 'classify_edges', 'graph_to_blocks',
+          'process_blocks', 'emit')
+# Decisions convert their continuation into every branch, so code from nested
+# decisions grows quadratically
+DEFAULT_SIZES = {'nested': [25, 50, 100], 'mixed': [1000, 3000]}
+
+
+def run_stage(stage: str, state: dict):
+    """Runs one stage on ``state`` (``path``, then ``graph``, ``blocks``, ``entries``, ``code``)."""
+    if stage == 'parse_drawio_file':
+        state['graph'] = parse_drawio_file(state['path'])
+    elif stage == 'map_labels_to_edges':
+        map_labels_to_edges(state['graph'], classify=False)
+    elif stage == 'classify_loops':
+        classify_loops(state['graph'])
+    elif stage == 'classify_edges':
+        classify_edges(state['graph'])
+    elif stage == 'graph_to_blocks':
+        state['blocks'] = graph_to_blocks(state['graph'])
+    elif stage == 'process_blocks':
+        state['entries'] = code_generator(state['blocks']).process_blocks()
+    elif stage == 'emit':
+        state['code'] = convert_to_code(state['entries'])
+    else:
+        raise ValueError(f'Unknown stage: {stage!r}')
+
+
+def prepare_stage(stage: str, path: Path) -> dict:
+    """State with every stage before ``stage`` done."""
+    state = {'path': path}
+    for previous in STAGES[:STAGES.index(stage)]:
+        run_stage(previous, state)
+    return state
+
+
+def measure(path: Path, repeat: int) -> dict:
+    """Best wall time, CPU time and peak allocation of each stage, and the graph counts."""
+    best = {}
+    for _ in range(repeat):
+        with Profiler(trace_memory=False) as profiler:
+            convert_file(path, profiler=profiler)
+        for span in profiler.spans:
+            if span.name not in best or span.wall < best[span.name]['wall']:
+                best[span.name] = {'wall': span.wall, 'cpu': span.cpu}
+    with Profiler() as profiler:
+        convert_file(path, profiler=profiler)
+    counts = {}
+    for span in profiler.spans:
+        best[span.name]['peak_allocated'] = span.peak_allocated
+        counts.update(span.counts)
+    return {'stages': best, 'counts': counts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kinds', nargs='+', choices=sorted(PROGRAMS), default=list(PROGRAMS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='approximate number of blocks (default: 1000 10000, fewer for nested and mixed)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', type=Path, default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'kind':>14} {'size':>7} {'nodes':>7} {'stage':>20} {'best ms':>10} {'us/node':>9} {'peak KiB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in args.kinds:
+            for size in args.sizes or DEFAULT_SIZES.get(kind, [1000, 10000]):
+                path = write_synthetic_diagram(Path(directory) / f'{kind}-{size}.drawio', kind, size)
+                result = measure(path, args.repeat)
+                nodes = result['counts'].get('nodes', 0)
+                results.append({'kind': kind, 'size': size, **result})
+                for stage in STAGES:
+                    timing = result['stages'][stage]
+                    print(f"{kind:>14} {size:>7} {nodes:>7} {stage:>20} {timing['wall'] * 1000:>10.2f} "
+                          f"{timing['wall'] * 1e6 / max(nodes, 1):>9.2f} {timing['peak_allocated'] / 1024:>10.1f}")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Measures what tracing costs: the same synthetic program runs as release code
+and under the ``Tracer`` (block hit counts and timings). ``--input`` is what
+the program's ``input()`` calls return, the loop count for while_loops:
+
+    python -m benchmarks.bench_runtime --kind while_loops --size 20 --input 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.runtime import Tracer, load_program, new_namespace, run_program
+
+
+def best_of(repeat, function):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=sorted(PROGRAMS), default='while_loops')
+    parser.add_argument('--size', type=int, default=20)
+    parser.add_argument('--input', default='10000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        program = load_program(write_synthetic_diagram(Path(directory) / 'diagram.drawio', args.kind, args.size))
+
+    def namespace():
+        names = new_namespace()
+        names['input'] = lambda prompt='': args.input
+        return names
+
+    release = best_of(args.repeat, lambda: run_program(program, namespace()))
+    tracer = Tracer(program)
+    traced = best_of(args.repeat, lambda: tracer.run(namespace()))
+    hits = sum(stats.hits for stats in tracer.stats.values()) // args.repeat
+    print(f"{'blocks':>8} {'hits':>10} {'release s':>10} {'trace s':>10} {'slowdown':>9}")
+    print(f'{len(program.labels):>8} {hits:>10} {release:>10.4f} {traced:>10.4f} {traced / release:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures the throughput of ``ConversionService``: many concurrent requests
+for a synthetic diagram, with a growing number of worker processes and with
+batching on (``--batch-size``) and off (batches of one request):
+
+    python -m benchmarks.bench_service --workers 1 2 4 --requests 64 --size 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.service import DEFAULT_BATCH_SIZE, ConversionService
+
+
+async def serve_requests(data: bytes, workers: int, batch_size: int, requests: int):
+    async with ConversionService(workers=workers, batch_size=batch_size, timeout=None) as service:
+        # Start the worker processes before timing
+        await asyncio.gather(*(service.convert(data) for _ in range(service.workers)))
+        batches = service.counters['batches']
+        start = time.perf_counter()
+        await asyncio.gather(*(service.convert(data) for _ in range(requests)))
+        return time.perf_counter() - start, service.counters['batches'] - batches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=sorted(PROGRAMS), default='mixed')
+    parser.add_argument('--size', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = write_synthetic_diagram(Path(directory) / 'diagram.drawio', args.kind, args.size).read_bytes()
+
+    print(f"{'workers':>8} {'batch':>6} {'batches':>8} {'seconds':>9} {'requests/s':>11}")
+    for workers in args.workers:
+        for batch_size in (1, args.batch_size):
+            seconds, batches = asyncio.run(serve_requests(data, workers, batch_size, args.requests))
+            print(f"{workers:>8} {batch_size:>6} {batches:>8} {seconds:>9.3f} {args.requests / seconds:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
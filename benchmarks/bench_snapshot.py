@@ -0,0 +1,61 @@
+"""
+Compares the ways of getting a parsed graph: parsing the XML, unpickling a
+pickled ``nx.DiGraph`` and loading a columnar snapshot (memory-mapped, then
+rebuilt with ``to_networkx``):
+
+    python -m benchmarks.bench_snapshot --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser.snapshot import load_snapshot, save_snapshot
+
+
+def best_of(repeat, function):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=sorted(PROGRAMS), default='sequence')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'nodes':>8} {'parse s':>9} {'unpickle s':>11} {'mmap s':>9} {'to_nx s':>9} "
+          f"{'xml MB':>7} {'pickle MB':>10} {'snap MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        for size in args.sizes:
+            diagram = write_synthetic_diagram(directory / f'{size}.drawio', args.kind, size)
+            graph = parse_drawio_file(diagram)
+            pickled = pickle.dumps(graph, protocol=pickle.HIGHEST_PROTOCOL)
+            snapshot_path = directory / f'{size}.f2c'
+            save_snapshot(graph, snapshot_path)
+            snapshot = load_snapshot(snapshot_path)
+
+            parse = best_of(args.repeat, lambda: parse_drawio_file(diagram))
+            unpickle = best_of(args.repeat, lambda: pickle.loads(pickled))
+            load = best_of(args.repeat, lambda: load_snapshot(snapshot_path))
+            rebuild = best_of(args.repeat, snapshot.to_networkx)
+            print(f"{len(graph):>8} {parse:>9.4f} {unpickle:>11.4f} {load:>9.4f} {rebuild:>9.4f} "
+                  f"{diagram.stat().st_size / 2 ** 20:>7.2f} {len(pickled) / 2 ** 20:>10.2f} "
+                  f"{snapshot_path.stat().st_size / 2 ** 20:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
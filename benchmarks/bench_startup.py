@@ -0,0 +1,72 @@
+"""
+Startup regression benchmark based on ``python -X importtime``.
+
+Imports the CLI entry module in a fresh interpreter, reports the slowest
+imports and fails when the cumulative import time exceeds the budget or when
+a heavy module (GUI, debugger, numerical stack) is imported eagerly:
+
+    python -m benchmarks.bench_startup --budget-ms 150
+
+The budget depends on the machine, so only this script checks it; the test
+suite only checks that no heavy module is imported eagerly.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+ENTRY_MODULE = 'src.cli'
+# Cumulative import time allowed for ENTRY_MODULE
+STARTUP_BUDGET_MS = 150
+# Modules that must only be imported once a command needs them
+LAZY_MODULES = ('dearpygui', 'prompt_toolkit', 'coloredlogs', 'numpy', 'networkx', 'pydantic')
+
+
+def import_times(module: str = ENTRY_MODULE) -> Dict[str, int]:
+    """
+    Imports ``module`` in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        Cumulative import time in microseconds for every imported module.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '../')),
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def eager_lazy_modules(times: Dict[str, int]):
+    return sorted(name for name in times if name.split('.')[0] in LAZY_MODULES)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default=ENTRY_MODULE)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5, help='best of this many runs is reported')
+    args = parser.parse_args(argv)
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[args.module])
+    total_ms = best[args.module] / 1000
+    print(f'{args.module}: {total_ms:.1f} ms cumulative import time (budget {args.budget_ms:.0f} ms)')
+    for name, cumulative in sorted(best.items(), key=lambda item: -item[1])[:10]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    eager = eager_lazy_modules(best)
+    if eager:
+        print(f'Eagerly imported: {", ".join(eager)}')
+    return 1 if eager or total_ms > args.budget_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
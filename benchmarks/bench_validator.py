@@ -0,0 +1,117 @@
+"""
+Times loop validation on nested-loop stress graphs.
+
+Each graph nests ``depth`` while loops; every loop body is a chain of
+``diamonds`` if/else decisions. The number of elementary cycles grows as
+``2 ** (depth * diamonds)``, so enumerating them (``--simple-cycles``, capped
+by ``--cycle-limit``) blows up while natural-loop detection stays linear:
+
+    python -m benchmarks.bench_validator --depth 1 4 16 --diamonds 4 16 64
+
+``--full`` also times the whole rule engine (``validate_graph``), with
+``--workers`` threads checking node and edge chunks.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+
+from src.parser.validator import validate_graph, validate_loops
+
+
+def nested_loop_graph(depth: int, diamonds: int):
+    """
+    Returns ``(graph, nodes)`` in the shape ``validate_graph`` expects.
+    """
+    graph = nx.DiGraph()
+    nodes = {}
+
+    def add(node_id, node_type):
+        graph.add_node(node_id, type=node_type)
+        nodes[node_id] = {"type": node_type}
+        return node_id
+
+    def add_body(level, entry):
+        """Chains the diamonds of one loop level after ``entry``; returns the last node."""
+        last = entry
+        for i in range(diamonds):
+            decision = add(f"if{level}_{i}", "decision")
+            yes = add(f"yes{level}_{i}", "process")
+            no = add(f"no{level}_{i}", "process")
+            join = add(f"join{level}_{i}", "connector")
+            graph.add_edge(last, decision)
+            graph.add_edge(decision, yes, label="Yes")
+            graph.add_edge(decision, no, label="No")
+            graph.add_edge(yes, join)
+            graph.add_edge(no, join)
+            last = join
+        return last
+
+    previous = add("start", "terminator")
+    exits = []
+    for level in range(depth):
+        header = add(f"while{level}", "decision")
+        graph.add_edge(previous, header)
+        previous = add_body(level, header)
+        exits.append(header)
+    # Close the loops from the innermost outwards
+    for level in reversed(range(depth)):
+        graph.add_edge(previous, exits[level])
+        previous = exits[level]
+    graph.add_edge(previous, add("end", "terminator"))
+    return graph, nodes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--diamonds', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--simple-cycles', action='store_true',
+                        help='also time the old enumeration of elementary cycles')
+    parser.add_argument('--cycle-limit', type=int, default=100_000,
+                        help='stop enumerating cycles after this many')
+    parser.add_argument('--full', action='store_true', help='also time validate_graph')
+    parser.add_argument('--workers', type=int, default=None, help='threads used by validate_graph')
+    args = parser.parse_args(argv)
+
+    header = f"{'depth':>6} {'diamonds':>9} {'nodes':>8} {'edges':>8} {'loops s':>10}"
+    if args.simple_cycles:
+        header += f" {'cycles':>10} {'cycles s':>10}"
+    if args.full:
+        header += f" {'errors':>8} {'full s':>10}"
+    print(header)
+    for depth in args.depth:
+        for diamonds in args.diamonds:
+            best = float('inf')
+            for _ in range(args.repeat):
+                graph, nodes = nested_loop_graph(depth, diamonds)
+                start = time.perf_counter()
+                errors = validate_loops(graph, nodes)
+                best = min(best, time.perf_counter() - start)
+            assert not errors, errors
+            line = f"{depth:>6} {diamonds:>9} {graph.number_of_nodes():>8} {graph.number_of_edges():>8} {best:>10.4f}"
+            if args.simple_cycles:
+                start = time.perf_counter()
+                n_cycles = sum(1 for _ in itertools.islice(nx.simple_cycles(graph), args.cycle_limit))
+                elapsed = time.perf_counter() - start
+                capped = '+' if n_cycles == args.cycle_limit else ''
+                line += f" {str(n_cycles) + capped:>10} {elapsed:>10.4f}"
+            if args.full:
+                best = float('inf')
+                for _ in range(args.repeat):
+                    graph, nodes = nested_loop_graph(depth, diamonds)
+                    start = time.perf_counter()
+                    errors = validate_graph(graph, nodes, workers=args.workers)
+                    best = min(best, time.perf_counter() - start)
+                line += f" {len(errors):>8} {best:>10.4f}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Synthetic draw.io diagrams for benchmarks and tests: plain chains of any
+length (``write_chain_diagram``) and structured flowcharts with decisions,
+while loops, repeat and for-each loops and text labels
+(``write_synthetic_diagram``).
+"""
+import random
+from pathlib import Path
+
+HEADER = '''<mxfile host="flow2code" type="embed">
+  <diagram id="synthetic" name="Page-1">
+    <mxGraphModel grid="1" gridSize="10" page="1">
+      <root>
+        <mxCell id="0" />
+        <mxCell id="1" parent="0" />
+'''
+FOOTER = '''      </root>
+    </mxGraphModel>
+  </diagram>
+</mxfile>
+'''
+
+TERMINATOR_STYLE = 'rounded=1;whiteSpace=wrap;html=1;arcSize=50;'
+PROCESS_STYLE = 'whiteSpace=wrap;html=1;'
+EDGE_STYLE = 'edgeStyle=none;html=1;exitX=0.5;exitY=1;exitDx=0;exitDy=0;entryX=0.5;entryY=0;entryDx=0;entryDy=0;'
+
+
+def vertex_xml(cell_id, value, style, x, y, width=120, height=60):
+    return (f'        <mxCell id="{cell_id}" value="{value}" style="{style}" parent="1" vertex="1">\n'
+            f'          <mxGeometry x="{x}" y="{y}" width="{width}" height="{height}" as="geometry" />\n'
+            f'        </mxCell>\n')
+
+
+def edge_xml(cell_id, source, target, style=EDGE_STYLE):
+    return (f'        <mxCell id="{cell_id}" style="{style}" parent="1" source="{source}" target="{target}" edge="1">\n'
+            f'          <mxGeometry relative="1" as="geometry" />\n'
+            f'        </mxCell>\n')
+
+
+def write_chain_diagram(file_path: Path, n_cells: int) -> Path:
+    """
+    Writes a START -> process -> ... -> END diagram with roughly ``n_cells`` cells.
+
+    Every process node is followed by the edge leading to the next one, so the
+    cell count is about twice the number of nodes.
+    """
+    file_path = Path(file_path)
+    n_process = max(0, (n_cells - 3) // 2)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        f.write(vertex_xml('start', 'START', TERMINATOR_STYLE, 0, 0))
+        previous = 'start'
+        for i in range(n_process):
+            node_id = f'p{i}'
+            f.write(vertex_xml(node_id, f'x{i % 100} = {i}', PROCESS_STYLE, 0, 80 * (i + 1)))
+            f.write(edge_xml(f'e{i}', previous, node_id))
+            previous = node_id
+        f.write(vertex_xml('end', 'END', TERMINATOR_STYLE, 0, 80 * (n_process + 1)))
+        f.write(edge_xml('e_end', previous, 'end'))
+        f.write(FOOTER)
+    return file_path
+
+
+# Structured flowcharts
+#
+# A program is a list of items, laid out top to bottom:
+#
+#     ('process', code)          ('input', 'name:type')     ('output', expression)
+#     ('if', condition, yes_items, no_items)    both branches meet in a connector
+#     ('while', condition, body)                a connector, then a decision whose
+#                                               'Yes' branch leads back to it
+#     ('repeat', count, body)                   hexagon loops, their body ends with
+#     ('for_each', variable, body)              an edge back to the hexagon
+#
+# A for-each hexagon is labelled with its loop variable only: the generated
+# code is 'for <label> in collection:', and the label must contain 'for' to be
+# read as a for-each loop. Programs with such loops take 'collection' as input.
+# 'Yes' branches and loop bodies are laid out to the right of their decision,
+# 'No' branches below it, with the 'Yes'/'No' labels next to the exit points.
+
+DECISION_STYLE = 'rhombus;whiteSpace=wrap;html=1;'
+CONNECTOR_STYLE = 'ellipse;whiteSpace=wrap;html=1;aspect=fixed;'
+LOOP_STYLE = 'shape=hexagon;perimeter=hexagonPerimeter2;whiteSpace=wrap;html=1;fixedSize=1;'
+IO_STYLE = 'shape=parallelogram;perimeter=parallelogramPerimeter;whiteSpace=wrap;html=1;fixedSize=1;'
+TEXT_STYLE = 'text;html=1;align=center;verticalAlign=middle;resizable=0;points=[];autosize=1;strokeColor=none;fillColor=none;'
+# Right exit: 'Yes' branches of decisions, exits of hexagon loops
+RIGHT_EDGE_STYLE = 'edgeStyle=none;html=1;exitX=1;exitY=0.5;exitDx=0;exitDy=0;'
+# Bottom exit (EDGE_STYLE): 'No' branches of decisions, bodies of hexagon loops
+
+ROW = 120
+BRANCH_OFFSET = 300
+
+
+def escape_label(label: str) -> str:
+    """Escapes a label as draw.io stores it: HTML in an XML attribute."""
+    html = label.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br>')
+    return html.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+class FlowchartWriter:
+    """
+    Writes a program (see above) as draw.io cells.
+
+    Args:
+        notes_per_decision: free text blocks added far left of every decision,
+            to make label matching work with dense text.
+    """
+
+    def __init__(self, f, notes_per_decision: int = 0):
+        self.f = f
+        self.notes_per_decision = notes_per_decision
+        self.y = 0
+        self.count = 0
+        self.vertices = 0
+
+    def new_id(self, prefix: str) -> str:
+        self.count += 1
+        return f'{prefix}{self.count}'
+
+    def vertex(self, prefix, label, style, x, width=120, height=60) -> str:
+        cell_id = self.new_id(prefix)
+        self.f.write(vertex_xml(cell_id, escape_label(label), style, x, self.y, width, height))
+        self.vertices += 1
+        return cell_id
+
+    def connect(self, pending, target: str):
+        for source, style in pending:
+            self.f.write(edge_xml(self.new_id('e'), source, target, style))
+
+    def decision(self, condition: str, x: int) -> str:
+        decision = self.vertex('d', condition, DECISION_STYLE, x, 120, 80)
+        self.f.write(vertex_xml(self.new_id('t'), 'Yes', TEXT_STYLE, x + 100, self.y, 40, 30))
+        self.f.write(vertex_xml(self.new_id('t'), 'No', TEXT_STYLE, x + 40, self.y + 85, 40, 30))
+        for i in range(self.notes_per_decision):
+            self.f.write(vertex_xml(self.new_id('t'), f'note {i}', TEXT_STYLE, x - 1000 - 50 * i, self.y, 40, 30))
+        self.vertices += 2 + self.notes_per_decision
+        self.y += 2 * ROW
+        return decision
+
+    def write(self, items, pending, x: int = 0):
+        """Writes ``items`` after the dangling ``(source, style)`` edges in ``pending``; returns the new ones."""
+        for item in items:
+            kind = item[0]
+            if kind in ('process', 'input', 'output'):
+                style = IO_STYLE if kind != 'process' else PROCESS_STYLE
+                node = self.vertex(kind[0], item[1], style, x)
+                self.connect(pending, node)
+                self.y += ROW
+                pending = [(node, EDGE_STYLE)]
+            elif kind == 'if':
+                _, condition, yes_items, no_items = item
+                decision = self.decision(condition, x)
+                self.connect(pending, decision)
+                yes_pending = self.write(yes_items, [(decision, RIGHT_EDGE_STYLE)], x + BRANCH_OFFSET)
+                no_pending = self.write(no_items, [(decision, EDGE_STYLE)], x)
+                merge = self.vertex('c', '', CONNECTOR_STYLE, x + 50, 20, 20)
+                self.connect(yes_pending + no_pending, merge)
+                self.y += ROW
+                pending = [(merge, EDGE_STYLE)]
+            elif kind == 'while':
+                _, condition, body = item
+                entry = self.vertex('c', '', CONNECTOR_STYLE, x + 50, 20, 20)
+                self.connect(pending, entry)
+                self.y += ROW
+                decision = self.decision(condition, x)
+                self.connect([(entry, EDGE_STYLE)], decision)
+                self.connect(self.write(body, [(decision, RIGHT_EDGE_STYLE)], x + BRANCH_OFFSET), entry)
+                pending = [(decision, EDGE_STYLE)]
+            elif kind in ('repeat', 'for_each'):
+                label = f'repeat {item[1]} times' if kind == 'repeat' else item[1]
+                loop = self.vertex('l', label, LOOP_STYLE, x, 120, 80)
+                self.connect(pending, loop)
+                self.y += ROW
+                self.connect(self.write(item[-1], [(loop, EDGE_STYLE)], x), loop)
+                pending = [(loop, RIGHT_EDGE_STYLE)]
+            else:
+                raise ValueError(f'Unknown item: {kind!r}')
+        return pending
+
+
+def write_program_diagram(file_path: Path, program, notes_per_decision: int = 0) -> int:
+    """Writes START -> program -> END as a diagram; returns the number of vertices."""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        writer = FlowchartWriter(f, notes_per_decision)
+        start = writer.vertex('s', 'START', TERMINATOR_STYLE, 0)
+        writer.y += ROW
+        pending = writer.write(program, [(start, EDGE_STYLE)])
+        writer.connect(pending, writer.vertex('s', 'END', TERMINATOR_STYLE, 0))
+        f.write(FOOTER)
+    return writer.vertices + 1
+
+
+def program_source(program) -> str:
+    """The Python code a program stands for, written directly, to check what its diagram converts to."""
+    lines = []
+
+    def write(items, indent):
+        pad = '    ' * indent
+        for item in items:
+            kind = item[0]
+            if kind == 'process':
+                lines.append(pad + item[1])
+            elif kind == 'input':
+                name, value_type = item[1].split(':')
+                lines.append(pad + (f'{name} = input()' if value_type == 'str' else f'{name} = {value_type}(input())'))
+            elif kind == 'output':
+                lines.append(pad + f'print({item[1]})')
+            elif kind == 'if':
+                _, condition, yes_items, no_items = item
+                lines.append(pad + f'if {condition}:')
+                write(yes_items or [('process', 'pass')], indent + 1)
+                if no_items:
+                    lines.append(pad + 'else:')
+                    write(no_items, indent + 1)
+            else:
+                header = {'while': f'while {item[1]}:', 'repeat': f'for _ in range({item[1]}):',
+                          'for_each': f'for {item[1]} in collection:'}[kind]
+                lines.append(pad + header)
+                write(item[-1], indent + 1)
+
+    write(program, 0)
+    return '\n'.join(lines) + '\n'
+
+
+def sequence_program(n: int):
+    """A long chain: an input, ``n`` process blocks, an output."""
+    return ([('input', 'x:int')] + [('process', f'x = x + {i}') for i in range(n)] + [('output', 'x')])
+
+
+def nested_decisions_program(n: int):
+    """
+    ``n`` decisions, each nested in the 'Yes' branch of the previous one.
+    From 100 on, the code is indented deeper than Python's tokenizer allows,
+    only the AST path compiles it.
+    """
+    program = [('process', f'y = {n}')]
+    for i in reversed(range(n)):
+        program = [('if', f'x > {i}', program, [('process', f'y = {i}')])]
+    return [('input', 'x:int')] + program + [('output', 'y')]
+
+
+def hexagon_loops_program(n: int):
+    """``n`` repeat and for-each loops one after the other, each with a short body."""
+    program = [('input', 'collection:str')]
+    for i in range(n // 3):
+        if i % 2:
+            program.append(('repeat', i % 7 + 1, [('process', f'a{i} = {i}'), ('process', f'b{i} = a{i} * 2')]))
+        else:
+            program.append(('for_each', f'for_item{i}', [('process', f'c{i} = for_item{i}'), ('output', f'c{i}')]))
+    return program
+
+
+def while_loops_program(n: int):
+    """``n // 4`` while loops (decisions with back edges), each with a counter."""
+    program = [('input', 'x:int')]
+    for i in range(n // 4):
+        program.append(('process', f'i{i} = 0'))
+        program.append(('while', f'i{i} < x', [('process', f'i{i} = i{i} + 1')]))
+    return program
+
+
+def mixed_program(n: int, seed: int = 0, max_depth: int = 6):
+    """
+    A random mix of every construct with about ``n`` nodes, nested up to
+    ``max_depth``.
+    """
+    rng = random.Random(seed)
+    budget = [n]
+
+    def block(depth):
+        items = []
+        while budget[0] > 0 and (depth == 0 or len(items) < rng.randint(1, 4)):
+            budget[0] -= 1
+            choice = rng.random() if depth < max_depth else 0
+            i = budget[0]
+            if choice < 0.5:
+                items.append(('process', f'v{i} = {i}'))
+            elif choice < 0.65:
+                # Branches that are both empty would be one edge to the connector
+                items.append(('if', f'v > {i}', block(depth + 1) or [('process', 'pass')], block(depth + 1)))
+            elif choice < 0.75:
+                items.append(('process', f'w{i} = 0'))
+                items.append(('while', f'w{i} < 3', block(depth + 1) + [('process', f'w{i} = w{i} + 1')]))
+            elif choice < 0.87:
+                items.append(('repeat', rng.randint(1, 9), block(depth + 1) or [('process', 'pass')]))
+            else:
+                items.append(('for_each', f'for_e{i}', block(depth + 1) or [('process', 'pass')]))
+        return items
+
+    return [('input', 'collection:str'), ('process', 'v = len(collection)')] + block(0)
+
+
+PROGRAMS = {
+    'sequence': sequence_program,
+    'nested': nested_decisions_program,
+    'hexagon_loops': hexagon_loops_program,
+    'while_loops': while_loops_program,
+    'mixed': mixed_program,
+}
+
+
+def write_synthetic_diagram(file_path: Path, kind: str, size: int, notes_per_decision: int = 0) -> Path:
+    """Writes a diagram of one of the ``PROGRAMS`` kinds, with about ``size`` blocks."""
+    file_path = Path(file_path)
+    write_program_diagram(file_path, PROGRAMS[kind](size), notes_per_decision)
+    return file_path
@@ -0,0 +1,56 @@
+"""
+pytest-benchmark suite: every pipeline stage on every synthetic diagram kind
+and size. Stages are timed on fresh inputs (the graph is annotated in place);
+the peak allocation of each stage is stored in ``extra_info``.
+
+    pytest benchmarks/test_pipeline_benchmarks.py --benchmark-autosave
+    pytest benchmarks/test_pipeline_benchmarks.py --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmarks.bench_pipeline import STAGES, prepare_stage, run_stage
+from benchmarks.synthetic import write_synthetic_diagram
+
+SIZES = {
+    'sequence': [100, 1000, 10000],
+    'nested': [10, 25, 50],
+    'hexagon_loops': [100, 1000, 10000],
+    'while_loops': [100, 1000, 10000],
+    'mixed': [100, 1000, 3000],
+}
+CASES = [(kind, size) for kind, sizes in SIZES.items() for size in sizes]
+
+
+@pytest.fixture(scope='module', params=CASES, ids=[f'{kind}-{size}' for kind, size in CASES])
+def diagram(request, tmp_path_factory):
+    kind, size = request.param
+    return write_synthetic_diagram(tmp_path_factory.mktemp('diagrams') / f'{kind}-{size}.drawio', kind, size)
+
+
+def peak_allocation(stage, path) -> int:
+    state = prepare_stage(stage, path)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    run_stage(stage, state)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    if started:
+        tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.parametrize('stage', STAGES)
+def test_stage(benchmark, diagram, stage):
+    benchmark.group = stage
+    benchmark.extra_info['peak_allocated'] = peak_allocation(stage, diagram)
+    benchmark.pedantic(run_stage, setup=lambda: ((stage, prepare_stage(stage, diagram)), {}), rounds=5)
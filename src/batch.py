@@ -0,0 +1,195 @@
+"""
+Headless batch conversion of draw.io diagrams.
+
+Converts every diagram found in the given files, directories or glob patterns
+and writes the generated code next to each input (``diagram.drawio`` ->
+``diagram.py``). A JSON summary with per-file timing and failures is written
+at the end:
+
+    python -m src.batch diagrams/ more/*.drawio --workers 8 --summary summary.json
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import argparse
+import glob
+import json
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+def collect_inputs(inputs: Iterable[str], pattern: str = '*.drawio') -> List[Path]:
+    """
+    Expands files, directories (searched recursively for ``pattern``) and glob
+    patterns into a sorted list of unique diagram paths.
+    """
+    found = {}
+    for item in inputs:
+        candidates = [Path(match) for match in glob.glob(item, recursive=True)] if glob.has_magic(item) else [Path(item)]
+        for candidate in candidates:
+            if candidate.is_dir():
+                for path in candidate.rglob(pattern):
+                    found[path.resolve()] = None
+            elif candidate.exists():
+                found[candidate.resolve()] = None
+            else:
+                raise FileNotFoundError(f'No such file or directory: {candidate}')
+    return sorted(found)
+
+
+# Caches of this process, by directory and size: the first put of a cache
+# scans its directory to learn its size, so a batch reuses one per worker
+_caches: Dict = {}
+
+
+def worker_cache(cache_options: Dict):
+    """The ``ConversionCache`` of this process for ``cache_options``."""
+    from src.cache import ConversionCache
+
+    key = (str(cache_options['directory']), cache_options['max_bytes'])
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = ConversionCache(cache_options['directory'], cache_options['max_bytes'])
+    return cache
+
+
+def convert_one(file_path: Path, page=None, cache_options: Optional[Dict] = None, debugger: bool = True) -> Dict:
+    """
+    Converts a single diagram and writes ``<name>.py`` next to it.
+
+    Args:
+        cache_options: ``directory``, ``max_bytes`` and ``store_artifacts`` of
+            the conversion cache, None to convert without a cache.
+        debugger: generate the ``custom_debugger()`` calls and their prelude,
+            False for release code.
+
+    Returns:
+        A summary entry with the status, timing and, on failure, the error.
+    """
+    output_path = file_path.with_suffix('.py')
+    entry = {'input': str(file_path), 'output': None, 'status': 'ok', 'seconds': 0.0}
+    start = time.perf_counter()
+    try:
+        if cache_options:
+            from src.cache import convert_file_cached
+
+            code = convert_file_cached(file_path, worker_cache(cache_options), page=page,
+                                       store_artifacts=cache_options['store_artifacts'], debugger=debugger)
+            output_path.write_text(code, encoding='utf-8')
+        else:
+            from src.pipeline import write_file
+
+            # Stream into a temporary file so a failed conversion leaves no partial output
+            partial_path = output_path.with_name(output_path.name + '.partial')
+            try:
+                write_file(file_path, partial_path, page=page, debugger=debugger)
+                os.replace(partial_path, output_path)
+            finally:
+                if partial_path.exists():
+                    partial_path.unlink()
+        entry['output'] = str(output_path)
+    except Exception as exc:
+        entry['status'] = 'failed'
+        entry['error'] = f'{type(exc).__name__}: {exc}'
+        entry['traceback'] = traceback.format_exc()
+    entry['seconds'] = round(time.perf_counter() - start, 6)
+    return entry
+
+
+def run_batch(files: List[Path], workers: Optional[int] = None, page=None,
+              cache_options: Optional[Dict] = None, debugger: bool = True) -> Dict:
+    """
+    Converts ``files`` in a process pool of ``workers`` processes
+    (in-process when ``workers`` is 1), see ``convert_one``.
+
+    Returns:
+        The summary: totals plus one entry per file, in input order.
+    """
+    start = time.perf_counter()
+    if workers == 1:
+        entries = [convert_one(path, page, cache_options, debugger) for path in files]
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(convert_one, path, page, cache_options, debugger): path for path in files}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        entries = [results[path] for path in files]
+    failed = [entry for entry in entries if entry['status'] != 'ok']
+    return {
+        'total': len(entries),
+        'succeeded': len(entries) - len(failed),
+        'failed': len(failed),
+        'seconds': round(time.perf_counter() - start, 6),
+        'files': entries,
+    }
+
+
+def build_arg_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.ArgumentParser:
+    if parser is None:
+        parser = argparse.ArgumentParser(prog='flow2code-batch', description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='diagram files, directories or glob patterns')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: CPU count, 1 runs in-process)')
+    parser.add_argument('--pattern', default='*.drawio', help='file pattern used inside directories')
+    parser.add_argument('--page', default=None, help='only convert this page (index or name)')
+    parser.add_argument('--summary', type=Path, default=Path('flow2code-summary.json'),
+                        help='where to write the JSON summary')
+    add_release_argument(parser)
+    add_cache_arguments(parser)
+    return parser
+
+
+def add_release_argument(parser: argparse.ArgumentParser):
+    parser.add_argument('--release', action='store_true',
+                        help='generate the code without the custom_debugger() calls and their prelude')
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--cache-dir', type=Path, default=None,
+                        help='reuse results of earlier conversions stored in this directory')
+    parser.add_argument('--cache-size', type=float, default=256,
+                        help='maximum cache size in MB, least recently used entries are evicted (default: 256)')
+    parser.add_argument('--cache-artifacts', action='store_true',
+                        help='also cache the annotated graph and block tree')
+
+
+def cache_options_from_args(args: argparse.Namespace) -> Optional[Dict]:
+    if args.cache_dir is None:
+        return None
+    return {'directory': str(args.cache_dir), 'max_bytes': int(args.cache_size * 2 ** 20),
+            'store_artifacts': args.cache_artifacts}
+
+
+def parse_page(page: Optional[str]):
+    """Turns a ``--page`` argument into a page index when it is numeric."""
+    if page is not None and page.lstrip('-').isdigit():
+        return int(page)
+    return page
+
+
+def run(args: argparse.Namespace) -> int:
+    files = collect_inputs(args.inputs, args.pattern)
+    summary = run_batch(files, workers=args.workers, page=parse_page(args.page),
+                        cache_options=cache_options_from_args(args), debugger=not args.release)
+    args.summary.write_text(json.dumps(summary, indent=2), encoding='utf-8')
+    for entry in summary['files']:
+        if entry['status'] != 'ok':
+            print(f"FAILED {entry['input']}: {entry['error']}", file=sys.stderr)
+    print(f"Converted {summary['succeeded']}/{summary['total']} diagrams in {summary['seconds']:.2f}s "
+          f"(summary: {args.summary})")
+    return 1 if summary['failed'] else 0
+
+
+def main(argv=None) -> int:
+    return run(build_arg_parser().parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+On-disk cache of conversion results.
+
+Entries are keyed by the SHA-256 of the diagram bytes, the flow2code version
+and the generation options, so a repeated conversion costs one hash and one
+read. The generated code is always stored; the annotated graph and block tree
+can be stored as well (pickled). Compiled programs are stored as marshalled
+code objects in the .pyc format (see ``compile_file_cached``). The cache is
+bounded by size and evicts the least recently used entries.
+
+Writes go to a temporary file that is atomically renamed into place, and
+readers treat entries that disappear under them as misses, so several batch
+workers can share one cache directory.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import hashlib
+import io
+import json
+import marshal
+import pickle
+import tempfile
+from contextlib import contextmanager
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+from typing import Dict, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without the inter-process lock
+    fcntl = None
+
+from src import __version__
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+CODE_SUFFIX = '.py'
+ARTIFACTS_SUFFIX = '.pkl'
+BYTECODE_SUFFIX = '.pyc'
+# .pyc flags: hash-based, never checked against a source file
+UNCHECKED_HASH_PYC = 0b01
+
+
+class ConversionCache:
+    """
+    Size-bounded LRU cache of conversion results in ``directory``.
+
+    Entry files live in two-character fan-out directories
+    (``ab/abcdef....py``). Their modification time is the LRU clock: every hit
+    touches the entry, eviction removes the oldest ones first.
+    """
+
+    def __init__(self, directory: Union[Path, str], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Approximate size of the cache; a full scan happens when it exceeds max_bytes
+        self._estimated_bytes: Optional[int] = None
+
+    @staticmethod
+    def make_key(data: bytes, options: Optional[Dict] = None) -> str:
+        """Hashes the diagram bytes together with the version and the generation options."""
+        digest = hashlib.sha256()
+        digest.update(__version__.encode())
+        digest.update(b'\0')
+        digest.update(json.dumps(options or {}, sort_keys=True, default=str).encode())
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.directory / key[:2] / (key + suffix)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached code for ``key`` or None."""
+        path = self._path(key, CODE_SUFFIX)
+        try:
+            code = path.read_text(encoding='utf-8')
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return code
+
+    def get_artifacts(self, key: str) -> Optional[Dict]:
+        """Returns the cached intermediate results (graph, block tree) for ``key`` or None."""
+        path = self._path(key, ARTIFACTS_SUFFIX)
+        try:
+            with open(path, 'rb') as f:
+                artifacts = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return artifacts
+
+    def get_bytecode(self, key: str) -> Optional[CodeType]:
+        """Returns the cached code object for ``key`` or None, also when another Python version wrote it."""
+        path = self._path(key, BYTECODE_SUFFIX)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return code_from_pyc(data)
+
+    def put(self, key: str, code: str, artifacts: Optional[Dict] = None):
+        """Stores the code (and optionally pickled artifacts) for ``key``, then evicts if needed."""
+        written = self._write(self._path(key, CODE_SUFFIX), code.encode('utf-8'))
+        if artifacts is not None:
+            written += self._write(self._path(key, ARTIFACTS_SUFFIX),
+                                   pickle.dumps(artifacts, protocol=pickle.HIGHEST_PROTOCOL))
+        self._added(written)
+
+    def put_bytecode(self, key: str, code: CodeType):
+        """Stores a code object for ``key``, then evicts if needed."""
+        self._added(self._write(self._path(key, BYTECODE_SUFFIX), code_to_pyc(code, bytes.fromhex(key[:16]))))
+
+    def _added(self, written: int):
+        if self._estimated_bytes is None:
+            self._estimated_bytes = self.size()
+        else:
+            self._estimated_bytes += written
+        if self._estimated_bytes > self.max_bytes:
+            self.evict()
+
+    def _write(self, path: Path, data: bytes) -> int:
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        return len(data)
+
+    def _entries(self):
+        for path in self.directory.glob('??/*'):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def size(self) -> int:
+        """Total size of the cached entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes: Optional[int] = None):
+        """Removes least recently used entries until the cache fits in ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock():
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._estimated_bytes = total
+
+    def clear(self):
+        self.evict(0)
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def code_to_pyc(code: CodeType, source_hash: bytes) -> bytes:
+    """
+    A .pyc file of ``code``: this interpreter's magic number, unchecked
+    hash-based flags, the 8 byte ``source_hash`` and the marshalled code.
+    """
+    return MAGIC_NUMBER + UNCHECKED_HASH_PYC.to_bytes(4, 'little') + source_hash + marshal.dumps(code)
+
+
+def code_from_pyc(data: bytes) -> Optional[CodeType]:
+    """The code object of a .pyc file, None if another Python version wrote it."""
+    if data[:4] != MAGIC_NUMBER:
+        return None
+    return marshal.loads(data[16:])
+
+
+def _code_options(page: Optional[Union[int, str]], debugger: bool, **options) -> Dict:
+    """Key options of generated code; code with the debugger keeps the keys it had before release code."""
+    options['page'] = page
+    if not debugger:
+        options['debugger'] = False
+    return options
+
+
+def compile_file_cached(file_path: Union[Path, str], cache: ConversionCache,
+                        page: Optional[Union[int, str]] = None, streaming: bool = False,
+                        debugger: bool = True) -> CodeType:
+    """
+    Compiles a draw.io file through ``cache``, see ``compile_source``. On a
+    hit the code object is unmarshalled, so no code is generated or compiled.
+    Entries are keyed by the interpreter's cache tag as well, since code
+    objects only load in the Python version that compiled them.
+    """
+    from src.pipeline import compile_source
+
+    data = Path(file_path).expanduser().read_bytes()
+    key = cache.make_key(data, _code_options(page, debugger, output='bytecode',
+                                             cache_tag=sys.implementation.cache_tag))
+    code = cache.get_bytecode(key)
+    if code is not None:
+        return code
+    code = compile_source(io.BytesIO(data), page=page, streaming=streaming, debugger=debugger).code
+    cache.put_bytecode(key, code)
+    return code
+
+
+def convert_file_cached(file_path: Union[Path, str], cache: ConversionCache,
+                        page: Optional[Union[int, str]] = None, streaming: bool = False,
+                        store_artifacts: bool = False, debugger: bool = True) -> str:
+    """
+    Converts a draw.io file through ``cache``: the file is read once, and on a
+    miss it is converted from the bytes already in memory.
+
+    Returns:
+        The generated Python code.
+    """
+    from src.pipeline import convert_source
+
+    data = Path(file_path).expanduser().read_bytes()
+    key = cache.make_key(data, _code_options(page, debugger))
+    code = cache.get(key)
+    if code is not None:
+        return code
+    conversion = convert_source(io.BytesIO(data), page=page, streaming=streaming, debugger=debugger)
+    artifacts = {'graph': conversion.graph, 'blocks': conversion.blocks} if store_artifacts else None
+    cache.put(key, conversion.code, artifacts)
+    return conversion.code
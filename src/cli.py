@@ -0,0 +1,251 @@
+"""
+Command line entry point (``flow2code``).
+
+Sub-commands import what they need when they run, so ``flow2code --help`` and
+headless conversions never load dearpygui or prompt_toolkit, and the
+conversion pipeline (networkx, numpy, pydantic) is only loaded when a
+conversion actually happens.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import argparse
+import logging
+
+from src import __version__
+from src.batch import (add_cache_arguments, add_release_argument, build_arg_parser as build_batch_parser,
+                       cache_options_from_args, parse_page)
+
+
+def configure_logging(verbose: bool):
+    level = logging.DEBUG if verbose else logging.WARNING
+    if verbose:
+        try:
+            import coloredlogs
+        except ImportError:
+            pass
+        else:
+            coloredlogs.install(level=level, fmt='%(hostname)s %(name)s[%(process)d] %(levelname)s %(message)s')
+            return
+    logging.basicConfig(level=level)
+
+
+def run_convert(args: argparse.Namespace) -> int:
+    page = parse_page(args.page)
+    cache_options = cache_options_from_args(args)
+    profiling = args.profile or args.timings or args.trace
+    if args.emit == 'pyc':
+        return run_compile(args, page, cache_options, profiling)
+    if cache_options and not profiling:
+        from src.cache import ConversionCache, convert_file_cached
+
+        cache = ConversionCache(cache_options['directory'], cache_options['max_bytes'])
+        code = convert_file_cached(args.file, cache, page=page, streaming=args.streaming,
+                                   store_artifacts=cache_options['store_artifacts'], debugger=not args.release)
+    else:
+        from src.pipeline import write_file
+        from src.profiling import NULL_PROFILER, Profiler
+
+        # Profiling measures an actual conversion, so the cache is bypassed
+        profiler = Profiler(profile=bool(args.profile)) if profiling else NULL_PROFILER
+        # Stream the code to its destination as it is generated
+        write_file(args.file, args.output or sys.stdout, page=page, streaming=args.streaming, profiler=profiler,
+                   snapshot=args.snapshot, debugger=not args.release)
+        if not args.output:
+            print()
+        if profiling:
+            profiler.close()
+            write_profile(profiler, args)
+        return 0
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(code)
+    else:
+        print(code)
+    return 0
+
+
+def run_compile(args: argparse.Namespace, page, cache_options, profiling) -> int:
+    """Writes the compiled program as a .pyc file, which ``python`` runs directly."""
+    import hashlib
+
+    from src.cache import code_to_pyc
+
+    if not args.output:
+        print('--emit pyc needs --output', file=sys.stderr)
+        return 2
+    if cache_options and not profiling:
+        from src.cache import ConversionCache, compile_file_cached
+
+        cache = ConversionCache(cache_options['directory'], cache_options['max_bytes'])
+        code = compile_file_cached(args.file, cache, page=page, streaming=args.streaming, debugger=not args.release)
+    else:
+        from src.pipeline import compile_source
+        from src.profiling import NULL_PROFILER, Profiler
+
+        profiler = Profiler(profile=bool(args.profile)) if profiling else NULL_PROFILER
+        code = compile_source(args.file, page=page, streaming=args.streaming, profiler=profiler,
+                              snapshot=args.snapshot, debugger=not args.release).code
+        if profiling:
+            profiler.close()
+            write_profile(profiler, args)
+    with open(args.file, 'rb') as f:
+        source_hash = hashlib.sha256(f.read()).digest()[:8]
+    with open(args.output, 'wb') as f:
+        f.write(code_to_pyc(code, source_hash))
+    return 0
+
+
+def write_profile(profiler, args: argparse.Namespace):
+    if args.timings == '-':
+        print(profiler.report(), file=sys.stderr)
+    elif args.timings:
+        profiler.write_json(args.timings)
+    if args.trace:
+        profiler.write_chrome_trace(args.trace)
+    if args.profile:
+        stage = profiler.dump_profile(args.profile)
+        print(f'cProfile of the slowest stage ({stage}) written to {args.profile}', file=sys.stderr)
+
+
+def run_flowchart(args: argparse.Namespace) -> int:
+    """Converts a diagram and runs the program in the chosen mode, see ``src.runtime``."""
+    from src import runtime
+
+    traced = args.breakpoints or args.stats or args.heatmap
+    mode = args.mode or (runtime.TRACE if traced else runtime.RELEASE)
+    if mode != runtime.TRACE and traced:
+        print('--break, --stats and --heatmap need --mode trace', file=sys.stderr)
+        return 2
+    page = parse_page(args.page)
+    program = runtime.load_program(args.file, page=page, streaming=args.streaming,
+                                   debugger=mode == runtime.DEBUG, snapshot=args.snapshot)
+    if mode != runtime.TRACE:
+        runtime.run_program(program)
+        return 0
+    try:
+        tracer = runtime.Tracer(program, args.breakpoints)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    status = 0
+    try:
+        tracer.run()
+    except runtime.StopProgram as exc:
+        print(exc, file=sys.stderr)
+        status = 1
+    finally:
+        if args.stats and args.stats != '-':
+            tracer.write_json(args.stats)
+        else:
+            print(tracer.report(), file=sys.stderr)
+        if args.heatmap:
+            from src.heatmap import write_heatmap
+
+            write_heatmap(args.file, args.heatmap, tracer.stats, page=page, metric=args.heatmap_metric)
+    return status
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    from src import batch
+
+    return batch.run(args)
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    from src import daemon
+
+    # The daemon parses its own arguments, so asyncio is only imported when it runs
+    parser = argparse.ArgumentParser(prog='flow2code watch', description=daemon.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    return daemon.run(daemon.build_arg_parser(parser).parse_args(args.arguments))
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    from src import service
+
+    parser = argparse.ArgumentParser(prog='flow2code serve', description=service.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    return service.run(service.build_arg_parser(parser).parse_args(args.arguments))
+
+
+def run_gui(args: argparse.Namespace) -> int:
+    from src.gui import run_gui
+
+    run_gui()
+    return 0
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='flow2code', description='Convert draw.io flowcharts into Python code.')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    parser.add_argument('-v', '--verbose', action='store_true', help='enable debug logging')
+    parser.set_defaults(handler=run_gui)
+    subparsers = parser.add_subparsers(title='commands')
+
+    convert = subparsers.add_parser('convert', help='convert a single diagram')
+    convert.add_argument('file', help='draw.io file to convert')
+    convert.add_argument('-o', '--output', help='write the code to this file instead of stdout')
+    convert.add_argument('--page', default=None, help='only convert this page (index or name)')
+    convert.add_argument('--streaming', action='store_true', help='use the streaming XML parser')
+    convert.add_argument('--snapshot', metavar='FILE', default=None,
+                         help='load the parsed diagram from this snapshot file, (re)writing it when out of date')
+    convert.add_argument('--emit', choices=['source', 'pyc'], default='source',
+                         help="'pyc' compiles the program without generating its source and writes a .pyc file")
+    add_release_argument(convert)
+    add_cache_arguments(convert)
+    convert.add_argument('--timings', metavar='FILE',
+                         help="write the time, memory and counts of each stage as JSON ('-' prints a table)")
+    convert.add_argument('--trace', metavar='FILE', help='write the stages in Chrome trace event format')
+    convert.add_argument('--profile', metavar='FILE', help='write a cProfile dump of the slowest stage')
+    convert.set_defaults(handler=run_convert)
+
+    run = subparsers.add_parser('run', help='convert a diagram and run the program')
+    run.add_argument('file', help='draw.io file to run')
+    run.add_argument('--page', default=None, help='only run this page (index or name)')
+    run.add_argument('--streaming', action='store_true', help='use the streaming XML parser')
+    run.add_argument('--snapshot', metavar='FILE', default=None,
+                     help='load the parsed diagram from this snapshot file, (re)writing it when out of date')
+    run.add_argument('--mode', choices=['release', 'trace', 'debug'], default=None,
+                     help="'release' runs the code as is (default), 'trace' counts and times each block, "
+                          "'debug' calls custom_debugger() before each statement")
+    run.add_argument('--break', dest='breakpoints', metavar='BLOCK_ID', action='append', default=[],
+                     help='pause when this block is reached (trace mode, can be repeated)')
+    run.add_argument('--stats', metavar='FILE',
+                     help="write the hits and time of each block as JSON ('-' prints a table, as trace mode does "
+                          "by default)")
+    run.add_argument('--heatmap', metavar='FILE',
+                     help='write a copy of the diagram with each block coloured by its cost (trace mode)')
+    run.add_argument('--heatmap-metric', choices=['seconds', 'hits'], default='seconds',
+                     help='what the heatmap colours show (default: seconds)')
+    run.set_defaults(handler=run_flowchart)
+
+    batch = subparsers.add_parser('batch', help='convert many diagrams in parallel')
+    build_batch_parser(batch)
+    batch.set_defaults(handler=run_batch)
+
+    watch = subparsers.add_parser('watch', help='keep diagrams converted while they are edited', add_help=False)
+    watch.set_defaults(handler=run_watch)
+
+    serve = subparsers.add_parser('serve', help='serve conversions over HTTP', add_help=False)
+    serve.set_defaults(handler=run_serve)
+
+    gui = subparsers.add_parser('gui', help='pick a file in the Dear PyGui file dialog (default)')
+    gui.set_defaults(handler=run_gui)
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_arg_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.handler in (run_watch, run_serve):
+        args.arguments = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    configure_logging(args.verbose)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
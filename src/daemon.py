@@ -0,0 +1,437 @@
+"""
+Watch daemon: keeps diagrams converted while they are being edited.
+
+Watches files and directories for diagrams, with inotify when
+``inotify_simple`` is installed and by polling otherwise. Saves are debounced.
+Every diagram keeps an ``IncrementalConverter`` in memory, so a save only
+redoes the work the edit requires. The code is written next to the diagram
+(``diagram.drawio`` -> ``diagram.py``) and served over a Unix socket (or a TCP
+port) with a JSON lines protocol, one request and one response per line:
+
+    {"op": "convert", "path": "diagrams/a.drawio"}  -> {"ok": true, "code": "...", "version": 3, ...}
+    {"op": "status"}                                -> {"ok": true, "documents": [...]}
+    {"op": "ping"}                                  -> {"ok": true}
+
+Requests are served concurrently with asyncio. Conversions run in a pool of
+worker processes; every diagram always goes to the same worker, which keeps
+its converter.
+
+    python -m src.daemon diagrams/ --socket /tmp/flow2code.sock --workers 4
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import time
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import inotify_simple
+except ImportError:  # Polling is used instead
+    inotify_simple = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_INTERVAL = 0.5
+
+
+# Worker side: one converter per diagram, kept between conversions
+
+_converters = {}
+
+
+def convert_in_worker(path: str, page=None, debugger: bool = True) -> Dict:
+    """
+    Brings the code of a diagram up to date with the converter kept in this
+    process. ``code`` is None when the diagram did not change.
+    """
+    from src.incremental import IncrementalConverter
+
+    key = (path, page, debugger)
+    converter = _converters.get(key)
+    if converter is None:
+        converter = _converters[key] = IncrementalConverter(page=page, debugger=debugger)
+    start = time.perf_counter()
+    try:
+        result = converter.update(path)
+    except Exception:
+        del _converters[key]
+        raise
+    return {
+        'code': None if result.mode == 'unchanged' else converter.code,
+        'mode': result.mode,
+        'patches': len(result.patches),
+        'seconds': round(time.perf_counter() - start, 6),
+    }
+
+
+def forget_in_worker(path: str, page=None, debugger: bool = True):
+    _converters.pop((path, page, debugger), None)
+
+
+class Document:
+    """What the daemon knows about one diagram."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.version = 0  # Number of conversions that changed the code
+        self.code: Optional[str] = None
+        self.error: Optional[str] = None
+        self.mode: Optional[str] = None
+        self.seconds = 0.0
+        self.updated: Optional[float] = None
+        self.signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the converted file
+        self.task: Optional[asyncio.Task] = None
+        self.stale = False
+
+    def to_json(self, code: bool = False) -> Dict:
+        data = {'path': str(self.path), 'version': self.version, 'error': self.error, 'mode': self.mode,
+                'seconds': self.seconds, 'updated': self.updated}
+        if code:
+            data['code'] = self.code
+        return data
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WatchDaemon:
+    """
+    Watches ``roots`` (files or directories searched recursively for
+    ``pattern``) and converts diagrams when they change.
+
+    Args:
+        workers: number of worker processes, 0 to convert in a thread of this process.
+        debounce: seconds a file must stay unchanged before it is converted.
+        interval: seconds between polls when inotify is not used.
+        write_output: write ``<name>.py`` next to each diagram.
+        use_inotify: None to use inotify when available.
+        debugger: generate the ``custom_debugger()`` calls and their prelude,
+            False for release code.
+    """
+
+    def __init__(self, roots: Iterable, pattern: str = '*.drawio', page=None, workers: Optional[int] = None,
+                 debounce: float = DEFAULT_DEBOUNCE, interval: float = DEFAULT_INTERVAL, write_output: bool = True,
+                 use_inotify: Optional[bool] = None, debugger: bool = True):
+        self.roots = [Path(root).expanduser().resolve() for root in roots]
+        self.pattern = pattern
+        self.page = page
+        self.debugger = debugger
+        self.debounce = debounce
+        self.interval = interval
+        self.write_output = write_output
+        if use_inotify is None:
+            use_inotify = inotify_simple is not None
+        elif use_inotify and inotify_simple is None:
+            raise RuntimeError('inotify_simple is not installed')
+        self.use_inotify = use_inotify
+
+        if workers == 0:
+            self._executors: List[Executor] = [ThreadPoolExecutor(max_workers=1)]
+        else:
+            # Single-process executors, so a diagram always reaches the worker holding its converter
+            self._executors = [ProcessPoolExecutor(max_workers=1) for _ in range(workers or os.cpu_count() or 1)]
+        self.documents: Dict[Path, Document] = {}
+        self._pending: Dict[Path, float] = {}  # Changed files and the time of their last change
+        self._signatures: Dict[Path, Tuple[int, int]] = {}
+        self._servers = []
+        self._tasks = []
+        self._inotify = None
+        self._watches = {}
+
+    # Watching
+
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        """Signatures of all watched diagrams."""
+        found = {}
+        for root in self.roots:
+            paths = root.rglob(self.pattern) if root.is_dir() else [root]
+            for path in paths:
+                signature = file_signature(path)
+                if signature is not None:
+                    found[path] = signature
+        return found
+
+    def _poll(self):
+        now = time.monotonic()
+        found = self.scan()
+        for path, signature in found.items():
+            if self._signatures.get(path) != signature:
+                self._pending[path] = now
+        for path in self._signatures.keys() - found.keys():
+            self._pending[path] = now
+        self._signatures = found
+
+    def _watch_directory(self, directory: Path):
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+        try:
+            self._watches[self._inotify.add_watch(str(directory), mask)] = directory
+        except OSError as exc:
+            logger.warning('Cannot watch %s: %s', directory, exc)
+
+    def _start_inotify(self):
+        self._inotify = inotify_simple.INotify()
+        for root in self.roots:
+            if root.is_dir():
+                self._watch_directory(root)
+                for directory in root.rglob('*'):
+                    if directory.is_dir():
+                        self._watch_directory(directory)
+            else:
+                self._watch_directory(root.parent)
+        asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._read_inotify)
+
+    def _read_inotify(self):
+        now = time.monotonic()
+        for event in self._inotify.read(timeout=0):
+            directory = self._watches.get(event.wd)
+            if directory is None or not event.name:
+                continue
+            path = directory / event.name
+            if event.mask & inotify_simple.flags.ISDIR:
+                if event.mask & (inotify_simple.flags.CREATE | inotify_simple.flags.MOVED_TO):
+                    self._watch_directory(path)
+                    for child in path.rglob(self.pattern):
+                        self._pending[child] = now
+            elif self._is_watched(path):
+                self._pending[path] = now
+
+    def _is_watched(self, path: Path) -> bool:
+        for root in self.roots:
+            if path == root or (root in path.parents and path.match(self.pattern)):
+                return True
+        return False
+
+    async def _watch(self):
+        tick = min(self.interval, self.debounce) / 2 if not self.use_inotify else self.debounce / 2
+        last_poll = 0.0
+        while True:
+            now = time.monotonic()
+            if not self.use_inotify and now - last_poll >= self.interval:
+                self._poll()
+                last_poll = now
+            for path, changed in list(self._pending.items()):
+                if now - changed >= self.debounce:
+                    del self._pending[path]
+                    if path.exists():
+                        self.schedule(path)
+                    else:
+                        await self.forget(path)
+            await asyncio.sleep(tick)
+
+    # Conversions
+
+    def _executor(self, path: Path) -> Executor:
+        return self._executors[zlib.crc32(str(path).encode()) % len(self._executors)]
+
+    def schedule(self, path: Path) -> asyncio.Task:
+        """Converts a diagram, after the conversion already running for it if any."""
+        document = self.documents.get(path)
+        if document is None:
+            document = self.documents[path] = Document(path)
+        if document.task is not None and not document.task.done():
+            document.stale = True
+        else:
+            document.task = asyncio.get_running_loop().create_task(self._convert(document))
+        return document.task
+
+    async def _convert(self, document: Document):
+        loop = asyncio.get_running_loop()
+        document.stale = True
+        while document.stale:
+            document.stale = False
+            signature = file_signature(document.path)
+            try:
+                result = await loop.run_in_executor(self._executor(document.path), convert_in_worker,
+                                                    str(document.path), self.page, self.debugger)
+            except Exception as exc:
+                document.error = f'{type(exc).__name__}: {exc}'
+                document.mode = 'failed'
+                logger.warning('Converting %s failed: %s', document.path, document.error)
+            else:
+                document.error = None
+                document.mode = result['mode']
+                document.seconds = result['seconds']
+                if result['code'] is not None and result['code'] != document.code:
+                    document.code = result['code']
+                    document.version += 1
+                    if self.write_output:
+                        await asyncio.to_thread(write_code, document.path.with_suffix('.py'), document.code)
+                logger.info('Converted %s (%s) in %.3fs', document.path, document.mode, document.seconds)
+            document.signature = signature
+            document.updated = time.time()
+        return document
+
+    async def convert(self, path) -> Document:
+        """Returns the up to date document of a diagram, converting it if needed."""
+        path = Path(path).expanduser().resolve()
+        document = self.documents.get(path)
+        if document is None or document.stale or document.signature != file_signature(path):
+            self.schedule(path)
+            document = self.documents[path]
+        if document.task is not None:
+            await asyncio.shield(document.task)
+        return document
+
+    async def forget(self, path: Path):
+        document = self.documents.pop(path, None)
+        if document is not None:
+            logger.info('Forgetting %s', path)
+            await asyncio.get_running_loop().run_in_executor(self._executor(path), forget_in_worker,
+                                                             str(path), self.page, self.debugger)
+
+    # Requests
+
+    async def handle_request(self, request: Dict) -> Dict:
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True}
+        if op == 'status':
+            return {'ok': True, 'documents': [document.to_json() for document in self.documents.values()]}
+        if op == 'convert':
+            if 'path' not in request:
+                return {'ok': False, 'error': "'convert' needs a 'path'"}
+            document = await self.convert(request['path'])
+            if document.error is not None:
+                return {'ok': False, 'error': document.error, **document.to_json()}
+            return {'ok': True, **document.to_json(code=True)}
+        return {'ok': False, 'error': f'Unknown op: {op!r}'}
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except json.JSONDecodeError as exc:
+                    response = {'ok': False, 'error': f'Invalid JSON: {exc}'}
+                except Exception as exc:
+                    response = {'ok': False, 'error': f'{type(exc).__name__}: {exc}'}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Life cycle
+
+    async def start(self, socket_path=None, host: str = '127.0.0.1', port: Optional[int] = None):
+        """Converts the watched diagrams, then starts watching and serving."""
+        found = self.scan()
+        self._signatures = found
+        await asyncio.gather(*(self.schedule(path) for path in found))
+        if self.use_inotify:
+            self._start_inotify()
+        self._tasks.append(asyncio.get_running_loop().create_task(self._watch()))
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._servers.append(await asyncio.start_unix_server(self._serve_client, path=str(socket_path)))
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._serve_client, host, port))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+            self._inotify.close()
+        for executor in self._executors:
+            executor.shutdown(cancel_futures=True)
+
+    async def run(self, socket_path=None, host: str = '127.0.0.1', port: Optional[int] = None):
+        await self.start(socket_path, host, port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.close()
+
+
+def write_code(output_path: Path, code: str):
+    """Writes the code through a temporary file, so readers never see a partial file."""
+    partial_path = output_path.with_name(output_path.name + '.partial')
+    partial_path.write_text(code, encoding='utf-8')
+    os.replace(partial_path, output_path)
+
+
+def request(payload: Dict, socket_path=None, host: str = '127.0.0.1', port: Optional[int] = None,
+            timeout: Optional[float] = None) -> Dict:
+    """Sends one request to a running daemon and returns its response."""
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(str(socket_path))
+    else:
+        connection = socket.create_connection((host, port), timeout=timeout)
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(payload).encode() + b'\n')
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+def build_arg_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.ArgumentParser:
+    from src.batch import add_release_argument
+
+    if parser is None:
+        parser = argparse.ArgumentParser(prog='flow2code-watch', description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='diagram files or directories to watch')
+    parser.add_argument('--pattern', default='*.drawio', help='file pattern used inside directories')
+    parser.add_argument('--page', default=None, help='only convert this page (index or name)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: CPU count, 0 converts in-process)')
+    parser.add_argument('--socket', default=None, help='serve requests on this Unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='address to serve requests on with --port')
+    parser.add_argument('--port', type=int, default=None, help='serve requests on this TCP port')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help='seconds a file must stay unchanged before it is converted')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help='seconds between polls when inotify is not available')
+    parser.add_argument('--poll', action='store_true', help='poll even when inotify is available')
+    parser.add_argument('--no-write', action='store_true', help='only serve the code, do not write .py files')
+    add_release_argument(parser)
+    return parser
+
+
+def run(args: argparse.Namespace) -> int:
+    from src.batch import parse_page
+
+    daemon = WatchDaemon(args.inputs, pattern=args.pattern, page=parse_page(args.page), workers=args.workers,
+                         debounce=args.debounce, interval=args.interval, write_output=not args.no_write,
+                         use_inotify=False if args.poll else None, debugger=not args.release)
+    try:
+        asyncio.run(daemon.run(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    return run(build_arg_parser().parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,9 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 from src.generator.blockModel import Block, IfStatement, Loop, WhileLoop, RepeatLoop, ForEachLoop, Input, Output
-from typing import List
+from src.generator.compactBlocks import (CompactBlock, DECISION, LOOP_KINDS, WHILE_LOOP, REPEAT_LOOP, FOR_EACH_LOOP,
+                                         PROCESS, INPUT, OUTPUT)
+from typing import Iterator, List, Optional, Tuple
 
 class CodeGenerationManager:
     def __init__(self, indent_size=4):
@@ -19,55 +21,79 @@ class CodeGenerationManager:
         - The indentation level (integer).
         - The code block (string or list of strings).
         """
-        processed = []
+        return list(self.iter_entries())
+
+    def iter_entries(self) -> Iterator[List]:
+        """Yields the entries of ``process_blocks`` one at a time."""
         for block in self._code_blocks:
-            processed.extend(self.process_block(block))
-        return processed
+            yield from self.iter_block(block)
 
     def process_block(self, block, current_indent=0) -> List[List]:
         """
-        Recursively process blocks and return a 2-by-n list containing:
+        Process a block and return a 2-by-n list containing:
         - The indentation level (integer).
         - The code block (string or list of strings).
-        """
-        processed = []
-
-        # Base case: If the block is a simple Block, return its code
-
-        # Handle IfStatement
-        if isinstance(block, IfStatement):
-            # Add the condition block
-            processed.append([block.block_id, current_indent, block.code])
-
-            # Process true_branch_body
-            for true_block in block.true_branch_body:
-                processed.extend(self.process_block(true_block, current_indent + 1))
-
-            # Add the else branch if it exists
-            if block.false_branch_body:
-                processed.append([block.block_id, current_indent, ['else:']])
-                for false_block in block.false_branch_body:
-                    processed.extend(self.process_block(false_block, current_indent + 1))
-
-        # Handle Loop and its derivatives
-        elif isinstance(block, Loop):
-            if isinstance(block, WhileLoop):
-                processed.append([block.block_id, current_indent, [f'while {block.condition}:']])
-            elif isinstance(block, RepeatLoop):
-                processed.append([block.block_id, current_indent, [f'for _cntr_ in range({block.counter}):']])
-            elif isinstance(block, ForEachLoop):
-                processed.append([block.block_id, current_indent, [f'for {block.iterator_var} in collection:']])
-
-            # Process the body of the loop
-            for body_block in block.body:
-                processed.extend(self.process_block(body_block, current_indent + 1))
-        elif block.__class__ in (Block, Input, Output) and not hasattr(block, 'true_branch_body'):
-            processed.append([block.block_id, current_indent, block.code])
-            return processed
 
+        Accepts ``CompactBlock`` trees as well as ``blockModel`` trees, which
+        are converted first.
+        """
+        return list(self.iter_block(block, current_indent))
 
+    def iter_block(self, block, current_indent=0) -> Iterator[List]:
+        """
+        Yields the entries of ``process_block`` while walking the block tree
+        depth-first with an explicit stack of pending child lists, so memory
+        and stack use grow with the nesting depth only.
+        """
+        for _, entry in self.walk_block(block, current_indent):
+            yield entry
 
-        return processed
+    def walk_block(self, block, current_indent=0) -> Iterator[Tuple[Optional[CompactBlock], List]]:
+        """
+        Like ``iter_block``, but yields ``(block, entry)`` pairs: the compact
+        block an entry is the header of, or None for 'else:' entries.
+        """
+        if not isinstance(block, CompactBlock):
+            block = CompactBlock.from_model(block)
+        # Lists of blocks still to emit, with their indentation and, for a
+        # decision's true branch, the decision whose else branch follows
+        stack = [(iter((block,)), current_indent, None)]
+        while stack:
+            blocks, indent, else_of = stack[-1]
+            block = next(blocks, None)
+            if block is None:
+                stack.pop()
+                # Add the else branch if it exists
+                if else_of is not None and else_of.orelse:
+                    yield None, [else_of.block_id, indent - 1, ['else:']]
+                    stack.append((iter(else_of.orelse), indent, None))
+                continue
+
+            entry = self.entry(block, indent)
+            if entry is not None:
+                yield block, entry
+            # Handle IfStatement: the true branch, then the else branch
+            if block.kind == DECISION:
+                stack.append((iter(block.body), indent + 1, block))
+            # Handle Loop and its derivatives: the body of the loop
+            elif block.kind in LOOP_KINDS:
+                stack.append((iter(block.body), indent + 1, None))
+
+    @staticmethod
+    def entry(block: CompactBlock, indent: int) -> Optional[List]:
+        """The entry of a block's own line (the header of decisions and loops), None if it has none."""
+        kind = block.kind
+        if kind == DECISION:
+            return [block.block_id, indent, [f'if {block.text}:']]
+        elif kind == WHILE_LOOP:
+            return [block.block_id, indent, [f'while {block.text}:']]
+        elif kind == REPEAT_LOOP:
+            return [block.block_id, indent, [f'for _cntr_ in range({block.text}):']]
+        elif kind == FOR_EACH_LOOP:
+            return [block.block_id, indent, [f'for {block.text} in collection:']]
+        elif kind in (PROCESS, INPUT, OUTPUT):
+            return [block.block_id, indent, block.code]
+        return None
 
 
 if __name__ == "__main__":
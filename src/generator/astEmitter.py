@@ -0,0 +1,183 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+import ast
+from typing import Callable, Iterable, List, Optional
+
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from src.generator.compactBlocks import (CompactBlock, DECISION, LOOP, WHILE_LOOP, REPEAT_LOOP, FOR_EACH_LOOP,
+                                         PROCESS, INPUT, OUTPUT)
+
+
+def build_module(blocks: Iterable[CompactBlock], prelude: str,
+                 entry_lines: Callable[[List], List[str]]) -> ast.Module:
+    """
+    Builds the ``ast.Module`` of the program the text generator would write
+    for ``blocks`` (compact blocks or ``blockModel`` trees), without going
+    through the program text.
+
+    Decisions and loops become ``If``, ``While`` and ``For`` nodes directly.
+    Only what the diagram holds as code (process, input and output blocks,
+    conditions, counters and iterators) is parsed, all of it in one
+    ``ast.parse`` call: every piece is placed unindented on the line it has in
+    the program. ``prelude`` is the text the program starts with and
+    ``entry_lines`` turns a ``[block_id, indent, code]`` entry into its
+    lines, as the text generator does. With an empty prelude the code starts
+    on line 1.
+
+    Nodes get the line numbers they have in the program text, so code
+    compiled from the module reports the same lines. Columns inside the code
+    of a block are counted from the start of that code.
+    """
+    # Lines to parse, the prelude first, and the pieces of code among them
+    lines = [prelude] if prelude else []
+    pieces = []
+    # Compound nodes in the order of their headers
+    compounds = []
+    body = []
+    # The text is the prelude, then each entry line after a newline
+    line = prelude.count('\n') + 2 if prelude else 1
+    # Lists of blocks still to emit, the statements they go into, their
+    # indentation, and the block and node owning the statements
+    stack = [(iter(blocks), body, 0, None, None)]
+    while stack:
+        blocks, statements, indent, owner_block, owner = stack[-1]
+        block = next(blocks, _END)
+        if block is _END:
+            stack.pop()
+            if owner is None:
+                continue
+            if not statements:
+                raise SyntaxError(f'expected an indented block (block {owner_block.block_id})',
+                                  (None, owner.lineno, owner.col_offset + 1, None))
+            if owner_block.kind == DECISION and statements is owner.body and owner_block.orelse:
+                lines.append('')  # The 'else:' line
+                line += 1
+                stack.append((iter(owner_block.orelse), owner.orelse, indent, owner_block, owner))
+            continue
+        if not isinstance(block, CompactBlock):
+            block = CompactBlock.from_model(block)
+
+        kind = block.kind
+        column = 4 * indent
+        if kind in (PROCESS, INPUT, OUTPUT):
+            code = entry_lines([block.block_id, 0, block.code])
+            lines.extend(code)
+            # A placeholder, replaced by the statements once they are parsed
+            pieces.append(_Piece(block, line, len(code)))
+            statements.append(pieces[-1])
+            line += len(code)
+            continue
+        if kind == LOOP:
+            # Bare loops have no header, their body is emitted in place
+            stack.append((iter(block.body), statements, indent + 1, None, None))
+            continue
+        entry = CodeGenerationManager.entry(block, 0)
+        if entry is None:
+            continue
+        header = entry[2][0]
+        if kind == DECISION:
+            node = ast.If(test=None, body=[], orelse=[])
+        elif kind == WHILE_LOOP:
+            node = ast.While(test=None, body=[], orelse=[])
+        elif kind == REPEAT_LOOP:
+            # for _cntr_ in range(<text>):
+            counter = _at(ast.Call(func=_at(ast.Name(id='range', ctx=ast.Load()), line, column + 14, column + 19),
+                                   args=[], keywords=[]), line, column + 14, column + len(header) - 1)
+            node = ast.For(target=_at(ast.Name(id='_cntr_', ctx=ast.Store()), line, column + 4, column + 10),
+                           iter=counter, body=[], orelse=[])
+        else:
+            # for <text> in collection:
+            collection = _at(ast.Name(id='collection', ctx=ast.Load()), line, column + len(header) - 11,
+                             column + len(header) - 1)
+            node = ast.For(target=None, iter=collection, body=[], orelse=[])
+        statements.append(_at(node, line, column, column + len(header)))
+        compounds.append(node)
+        # The condition, counter or iterator goes on the header line: as an
+        # expression, or as the target of an assignment for iterators
+        code = (f'{block.text} = None' if kind == FOR_EACH_LOOP else block.text).split('\n')
+        header_lines = len(entry_lines(entry))
+        lines.extend(code + [''] * (header_lines - len(code)))
+        pieces.append(_Piece(block, line, len(code), node))
+        stack.append((iter(block.body), node.body, indent + 1, block, node))
+        line += header_lines
+
+    prelude_statements = _parse_pieces('\n'.join(lines), pieces)
+    for statements in [body] + [statements for node in compounds for statements in (node.body, node.orelse)]:
+        if any(isinstance(statement, _Piece) for statement in statements):
+            statements[:] = [child for statement in statements
+                             for child in (statement.statements if isinstance(statement, _Piece) else (statement,))]
+    # Compound nodes end where their last statement ends; inner ones first
+    for node in reversed(compounds):
+        last = (node.orelse or node.body)[-1]
+        node.end_lineno, node.end_col_offset = last.end_lineno, last.end_col_offset
+    return ast.Module(body=prelude_statements + body, type_ignores=[])
+
+
+_END = object()
+
+
+class _Piece:
+    """Code of a block, parsed with all others; ``node`` is the header node it completes, if any."""
+    __slots__ = ('block', 'line', 'count', 'node', 'statements')
+
+    def __init__(self, block: CompactBlock, line: int, count: int, node: Optional[ast.stmt] = None):
+        self.block = block
+        self.line = line
+        self.count = count
+        self.node = node
+        self.statements = []
+
+
+def _parse_pieces(source: str, pieces: List[_Piece]) -> List[ast.stmt]:
+    """
+    Parses the code pieces in one go, hands every piece its statements and
+    completes the header nodes. Returns the statements of the prelude.
+    """
+    try:
+        statements = ast.parse(source).body
+    except SyntaxError as exc:
+        piece = next((piece for piece in pieces if piece.line <= (exc.lineno or 0) < piece.line + piece.count), None)
+        if piece is None:
+            raise
+        raise SyntaxError(f'{exc.msg} (block {piece.block.block_id})',
+                          (exc.filename, exc.lineno, exc.offset, exc.text)) from None
+    # Pieces and statements are both in line order; walk them backwards
+    end = len(statements)
+    for piece in reversed(pieces):
+        start = end
+        while start > 0 and statements[start - 1].lineno >= piece.line:
+            start -= 1
+        piece.statements = statements[start:end]
+        if piece.statements and piece.statements[-1].end_lineno >= piece.line + piece.count:
+            _error(piece, 'code continues past its block')
+        if piece.node is not None:
+            _complete(piece)
+        end = start
+    return statements[:end]
+
+
+def _complete(piece: _Piece):
+    """Puts the condition, counter or iterator parsed from a header piece into its node."""
+    node, statements = piece.node, piece.statements
+    if isinstance(node, ast.For) and node.target is None:
+        if len(statements) != 1 or not isinstance(statements[0], ast.Assign) or len(statements[0].targets) != 1:
+            _error(piece, 'invalid loop variable')
+        node.target = statements[0].targets[0]
+    elif len(statements) != 1 or not isinstance(statements[0], ast.Expr):
+        _error(piece, 'invalid expression')
+    elif isinstance(node, ast.For):
+        node.iter.args.append(statements[0].value)
+    else:
+        node.test = statements[0].value
+
+
+def _error(piece: _Piece, message: str):
+    raise SyntaxError(f'{message} (block {piece.block.block_id})', (None, piece.line, 1, None))
+
+
+def _at(node: ast.AST, line: int, column: int, end_column: int) -> ast.AST:
+    """Places a node on one line of the program."""
+    node.lineno, node.col_offset, node.end_lineno, node.end_col_offset = line, column, line, end_column
+    return node
@@ -17,26 +17,32 @@ class Block(BaseModel):
         return [self.p_code]
 
 
+def input_code(p_code: str) -> List[str]:
+    """Code that reads a ``name:type`` input block from stdin."""
+    var_name, var_type = p_code.split(':')
+    num_types = ['int', 'integer', 'number', 'float']
+    str_types = ['string', 'text', 'str', 'words', 'word', 'name']
+    arr_types = ['array[int]', 'array[float]', 'array[numbers]', 'array[digits]',
+                 'list[int]', 'list[float]', 'list[numbers]', 'list[digits]']
+
+    if var_type in num_types:
+        var_type = 'float' if var_type not in ['int', 'integer'] else 'int'
+        return [f'{var_name} = {var_type}(input())']
+    elif var_type in str_types:
+        return [f'{var_name} = input()']
+    elif var_type in arr_types:
+        element_type = 'float' if 'float' in var_type else 'int'
+        return [
+            f'data = [{element_type}(i) for i in input(f"Enter values of type {element_type} separated by \',\'").split(\',\')]']
+    else:
+        return [p_code]
+
+
 class Input(Block):
     @property
     def code(self):
-        var_name, var_type = self.p_code.split(':')
-        num_types = ['int', 'integer', 'number', 'float']
-        str_types = ['string', 'text', 'str', 'words', 'word', 'name']
-        arr_types = ['array[int]', 'array[float]', 'array[numbers]', 'array[digits]',
-                     'list[int]', 'list[float]', 'list[numbers]', 'list[digits]']
-
-        if var_type in num_types:
-            var_type = 'float' if var_type not in ['int', 'integer'] else 'int'
-            return [f'{var_name} = {var_type}(input())']
-        elif var_type in str_types:
-            return [f'{var_name} = input()']
-        elif var_type in arr_types:
-            element_type = 'float' if 'float' in var_type else 'int'
-            return [
-                f'data = [{element_type}(i) for i in input(f"Enter values of type {element_type} separated by \',\'").split(\',\')]']
-        else:
-            return [self.p_code]
+        return input_code(self.p_code)
+
 
 class Output(Block):
     @property
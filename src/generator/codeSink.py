@@ -0,0 +1,68 @@
+import io
+from pathlib import Path
+from typing import Iterable, Union
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class CodeSink:
+    """
+    Buffered writer for generated code.
+
+    Collects text chunks and hands them to the target in pieces of about
+    ``buffer_size`` characters, so output starts before the whole program
+    is generated and never has to be held in memory at once.
+
+    The target can be a path (opened for writing and closed with the sink), a
+    text file, a binary file or a socket.
+    """
+
+    def __init__(self, target: Union[Path, str, io.IOBase], buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 encoding: str = 'utf-8'):
+        self._owned = isinstance(target, (str, Path))
+        if self._owned:
+            target = open(target, 'w', encoding=encoding)
+        self.target = target
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self._chunks = []
+        self._buffered = 0
+        self.written = 0  # Characters handed to the target so far
+
+        if hasattr(target, 'sendall'):
+            self._send = lambda text: target.sendall(text.encode(encoding))
+        elif isinstance(target, io.TextIOBase):
+            self._send = target.write
+        else:
+            self._send = lambda text: target.write(text.encode(encoding))
+
+    def write(self, text: str):
+        self._chunks.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, chunks: Iterable[str]):
+        for chunk in chunks:
+            self.write(chunk)
+
+    def flush(self):
+        if self._chunks:
+            text = ''.join(self._chunks)
+            self._chunks.clear()
+            self._buffered = 0
+            self._send(text)
+            self.written += len(text)
+        if hasattr(self.target, 'flush'):
+            self.target.flush()
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self.target.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
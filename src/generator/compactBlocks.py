@@ -0,0 +1,169 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from src.generator.blockModel import (Block, Input, Output, IfStatement, Loop, WhileLoop, RepeatLoop, ForEachLoop,
+                                      input_code)
+
+# Block kinds are the graph node types they come from
+PROCESS = 'process'
+INPUT = 'input'
+OUTPUT = 'output'
+DECISION = 'decision'
+WHILE_LOOP = 'while_loop'
+REPEAT_LOOP = 'repeat_loop'
+FOR_EACH_LOOP = 'for_each_loop'
+# A bare ``Loop`` model: its body is generated without a loop header
+LOOP = 'loop'
+# Models the code generator does not know; they generate nothing
+UNKNOWN = 'unknown'
+
+LOOP_KINDS = (WHILE_LOOP, REPEAT_LOOP, FOR_EACH_LOOP, LOOP)
+
+MODEL_KINDS = {
+    IfStatement: DECISION,
+    WhileLoop: WHILE_LOOP,
+    RepeatLoop: REPEAT_LOOP,
+    ForEachLoop: FOR_EACH_LOOP,
+    Loop: LOOP,
+    Block: PROCESS,
+    Input: INPUT,
+    Output: OUTPUT,
+}
+
+
+@dataclass(slots=True)
+class CompactBlock:
+    """
+    Lightweight block used internally by the converter and the code generator.
+
+    One class covers every block type, told apart by ``kind``. ``text`` holds
+    what the pydantic model keeps in its type-specific field: the code of
+    process, input and output blocks, the condition of decisions and while
+    loops, the counter of repeat loops and the iterator of for-each loops.
+    Loops keep their body in ``body``; decisions keep the true branch in
+    ``body`` and the false branch in ``orelse``.
+
+    Use ``to_model`` to get the equivalent ``blockModel`` tree.
+    """
+    kind: str
+    block_id: str = '-1'
+    text: str = ''
+    body: Optional[List['CompactBlock']] = None
+    orelse: Optional[List['CompactBlock']] = None
+
+    @classmethod
+    def new(cls, kind: str, block_id: str = '-1', text: str = '') -> 'CompactBlock':
+        """Creates a block with empty child lists for decisions and loops."""
+        if kind == DECISION:
+            return cls(kind, block_id, text, [], [])
+        if kind in LOOP_KINDS:
+            return cls(kind, block_id, text, [])
+        return cls(kind, block_id, text)
+
+    @property
+    def code(self) -> List[str]:
+        """Code of a process, input or output block, as ``Block.code`` returns it."""
+        if self.kind == INPUT:
+            return input_code(self.text)
+        if self.kind == OUTPUT:
+            return [f'print({self.text})']
+        return [self.text]
+
+    def to_model(self) -> Block:
+        """Builds the pydantic ``blockModel`` tree of this block."""
+        root = _model(self)
+        stack = [(self, root)]
+        while stack:
+            block, model = stack.pop()
+            for children, target in _child_lists(block, model):
+                for child in children:
+                    child_model = _model(child)
+                    target.append(child_model)
+                    if child.body is not None:
+                        stack.append((child, child_model))
+        return root
+
+    @classmethod
+    def from_model(cls, model) -> 'CompactBlock':
+        """
+        Converts a ``blockModel`` tree. Items the code generator ignores (of
+        unknown classes, or lists nested in bodies) become ``UNKNOWN`` blocks.
+        """
+        root = _compact(model)
+        stack = [(model, root)]
+        while stack:
+            model, block = stack.pop()
+            if block.kind == DECISION:
+                pairs = ((model.true_branch_body, block.body), (model.false_branch_body, block.orelse))
+            elif block.kind in LOOP_KINDS:
+                pairs = ((model.body, block.body),)
+            else:
+                continue
+            for children, target in pairs:
+                for child in children:
+                    child_block = _compact(child)
+                    target.append(child_block)
+                    stack.append((child, child_block))
+        return root
+
+
+def count_blocks(blocks: List[Optional[CompactBlock]]) -> int:
+    """Number of blocks in ``blocks`` and everything nested in them."""
+    count = 0
+    stack = [block for block in blocks if block is not None]
+    while stack:
+        block = stack.pop()
+        count += 1
+        if block.body:
+            stack.extend(block.body)
+        if block.orelse:
+            stack.extend(block.orelse)
+    return count
+
+
+def _model(block: CompactBlock) -> Block:
+    kind = block.kind
+    if kind == DECISION:
+        return IfStatement(block_id=block.block_id, condition=block.text)
+    if kind == WHILE_LOOP:
+        return WhileLoop(block_id=block.block_id, condition=block.text)
+    if kind == REPEAT_LOOP:
+        return RepeatLoop(block_id=block.block_id, counter=block.text)
+    if kind == FOR_EACH_LOOP:
+        return ForEachLoop(block_id=block.block_id, iterator_var=block.text)
+    if kind == LOOP:
+        return Loop(block_id=block.block_id)
+    if kind == INPUT:
+        return Input(block_id=block.block_id, code=block.text)
+    if kind == OUTPUT:
+        return Output(block_id=block.block_id, code=block.text)
+    return Block(block_id=block.block_id, code=block.text)
+
+
+def _child_lists(block: CompactBlock, model: Block):
+    if block.kind == DECISION:
+        return (block.body, model.true_branch_body), (block.orelse, model.false_branch_body)
+    if block.body is not None:
+        return ((block.body, model.body),)
+    return ()
+
+
+def _compact(model) -> CompactBlock:
+    kind = MODEL_KINDS.get(model.__class__, UNKNOWN)
+    if kind == DECISION:
+        text = model.condition
+    elif kind == WHILE_LOOP:
+        text = model.condition
+    elif kind == REPEAT_LOOP:
+        text = model.counter
+    elif kind == FOR_EACH_LOOP:
+        text = model.iterator_var
+    elif kind in (PROCESS, INPUT, OUTPUT):
+        text = model.p_code
+    else:
+        return CompactBlock(UNKNOWN)
+    return CompactBlock.new(kind, model.block_id, text)
@@ -3,142 +3,264 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from typing import List, Set
+from types import MappingProxyType
+from typing import List, Optional
 from src.generator.blockModel import Block,Input, Output, IfStatement, WhileLoop, RepeatLoop, ForEachLoop
+from src.generator.compactBlocks import CompactBlock, MODEL_KINDS, PROCESS, REPEAT_LOOP
 from src.utils.matching import map_labels_to_edges
+from src.utils.graph_analysis import immediate_post_dominators
 from src.parser.drawio_parser import parse_drawio_file
 
+# Block model of every node type; None for nodes that are not converted
+BLOCK_MAP = MappingProxyType({
+    'process': Block,
+    'input':Input,
+    'output':Output,
+    'while_loop': WhileLoop,
+    'repeat_loop': RepeatLoop,
+    'for_each_loop': ForEachLoop,
+    'decision': IfStatement,
+    'terminator': None,  # Start/End nodes, not converted to blocks
+    'connector': None,   # Connectors handle flow but don't create blocks
+    'text': None         # Text nodes provide labels for edges but are not blocks
+})
+
+
 class G2BConverter:
-    block_map = {
-            'process': Block,
-            'input':Input,
-            'output':Output,
-            'while_loop': WhileLoop,
-            'repeat_loop': RepeatLoop,
-            'for_each_loop': ForEachLoop,
-            'decision': IfStatement,
-            'terminator': None,  # Start/End nodes, not converted to blocks
-            'connector': None,   # Connectors handle flow but don't create blocks
-            'text': None         # Text nodes provide labels for edges but are not blocks
-        }
-    visited = set()
+    """
+    Converts an annotated graph into block trees.
+
+    The converter keeps no state between conversions other than caches of
+    the graph's successors and post-dominators, so one instance can run
+    several conversions, also concurrently from several threads. The graph
+    must not change while it is in use.
+
+    The branches of a decision run up to the node where they join again
+    (its immediate post-dominator), and the flow after the decision, on the
+    main flow or in a loop body, continues from that node.
+    """
+    block_map = BLOCK_MAP
 
     def __init__(self, graph:nx.DiGraph):
         self.graph = graph
+        self._successors = {}
+        self._out_edges = {}
+        self._post_dominators = None
 
     def create_block(self,node_id):
         """Create a block instance from a node."""
+        return self.create_compact_block(node_id).to_model()
+
+    def create_compact_block(self, node_id) -> CompactBlock:
+        """Create the compact block of a node, see ``create_block``."""
         node_data = self.graph.nodes[node_id]
         block_type = self.block_map.get(node_data['type'])
         if block_type is None:
-            return Block(code='pass')
+            return CompactBlock(PROCESS, text='pass')
         label = node_data.get('label', '').replace('&lt;', '<').replace('&gt;', '>').replace('<br>', '\n').replace('&nbsp;', ' ')
-        if block_type in (IfStatement,WhileLoop):
-            return block_type(block_id=node_id ,condition=label)
-        elif block_type == RepeatLoop:
-            return block_type(block_id=node_id ,counter=label.replace('repeat ', '').replace('times',''))
-        elif block_type == ForEachLoop:
-            return block_type(block_id=node_id ,iterator_var=label)
-        else:
-            return block_type(block_id=node_id ,code=label)
+        kind = MODEL_KINDS[block_type]
+        if kind == REPEAT_LOOP:
+            label = label.replace('repeat ', '').replace('times','')
+        return CompactBlock.new(kind, node_id, label)
 
-    def process_node(self, node_id, visited) -> [Block]:
-        """Recursive helper to process nodes."""
-        if node_id in visited:
-            return [Block(code='pass')]  # Avoid infinite loops due to cycles
-        visited.add(node_id)
+    def successors(self, node_id) -> tuple:
+        """Successors of a node, computed once per node."""
+        successors = self._successors.get(node_id)
+        if successors is None:
+            successors = self._successors[node_id] = tuple(self.graph.successors(node_id))
+        return successors
 
-        node_data = self.graph.nodes[node_id]
-        block = self.create_block(node_id)
+    def out_edges(self, node_id) -> tuple:
+        """``(successor, edge_data)`` pairs of a node, computed once per node."""
+        out_edges = self._out_edges.get(node_id)
+        if out_edges is None:
+            out_edges = self._out_edges[node_id] = tuple(self.graph[node_id].items())
+        return out_edges
 
-        if node_data['type'] in ('while_loop', 'repeat_loop', 'for_each_loop'):
-            body_successors = [node_id]
+    def join_point(self, node_id) -> Optional[str]:
+        """
+        The node where the branches of a decision join again, None if they
+        end separately or the decision has only one branch. Post-dominators
+        are computed once per converter.
+        """
+        if len(self.successors(node_id)) < 2:
+            return None
+        if self._post_dominators is None:
+            self._post_dominators = immediate_post_dominators(self.graph)
+        return self._post_dominators.get(node_id)
 
-            # Classify successors as loop body or exit
-            for successor in self.graph.successors(node_id):
-                edge_data = self.graph.get_edge_data(node_id, successor, {})
-                role = edge_data.get('role', 'normal')
-                if role == 'body':
-                    body_successors.append(successor)
+    def flow_successors(self, node_id) -> List[str]:
+        """
+        Nodes the flow continues with after a node and everything nested in
+        it: the only successor, the successors on 'exit' edges, or for a
+        decision its join point. Empty where the flow ends.
+        """
+        if self.graph.nodes[node_id]['type'] == 'decision':
+            join = self.join_point(node_id)
+            return [join] if join is not None else []
+        successors = self.successors(node_id)
+        if len(successors) == 1:
+            return [successors[0]]
+        #go through successor which edge is marked as 'exit' or 'no'
+        return [successor for successor, edge_data in self.out_edges(node_id)
+                if edge_data.get('role', '').lower() in ('exit', 'no')]
 
+    def branch(self, decision, first) -> List[str]:
+        """
+        Nodes of the branch of ``decision`` starting at ``first``, in order,
+        up to (not including) the join point of the decision.
+        """
+        join = self.join_point(decision)
+        nodes = []
+        seen = {decision}
+        following = [first]
+        while following:
+            node = following[-1]
+            if node == join or node in seen:
+                break
+            nodes.append(node)
+            seen.add(node)
+            following = self.flow_successors(node)
+        return nodes
 
+    def process_node(self, node_id, visited, compact: bool = False) -> [Block]:
+        """
+        Converts a node and everything nested in it (loop bodies, decision
+        branches) depth-first with an explicit stack, so the nesting depth of
+        the diagram is not limited by the recursion limit.
 
+        Blocks are built as ``CompactBlock``; pydantic models are only created
+        at the end, unless ``compact`` is set.
+        """
+        block, children = self._visit(node_id, visited)
+        stack = [children] if children is not None else []
+        while stack:
+            for child_id, target in stack[-1]:
+                child, grandchildren = self._visit(child_id, visited)
+                if target is not None:
+                    target.append(child)
+                if grandchildren is not None:
+                    stack.append(grandchildren)
+                    break
+            else:
+                stack.pop()
+        return [block if compact else block.to_model()]
 
-            node = body_successors[-1]
-            loop_not_closed = True
-            while loop_not_closed:
-                if len(list(self.graph.successors(node))) == 1:
-                    successor = list(self.graph.successors(node))[0]
-                    if successor == node_id or successor in body_successors:
-                        loop_not_closed = False
-                        break
-                    body_successors.append(successor)
-                    node = body_successors[-1]
-                else:
-                    for successor, edge_data in self.graph[node].items():
-                        role = edge_data.get('role', '').lower()
-                        if role in ('exit', 'false branch'):
-                            if successor == node_id or successor in body_successors:
-                                loop_not_closed = False
-                                break
-                            body_successors.append(successor)
-                            node = body_successors[-1]
-                
-
-            nested_block = [self.process_node(successor, visited) for successor in body_successors[1:]]
-            if nested_block:
-                block.body += flatten(nested_block)
-
-            # Process loop exit successor (blocks outside the loop)
-
-
-        elif node_data['type'] == 'decision':
-            # Handle true and false branches
-            for successor, edge_data in self.graph[node_id].items():
+    def _visit(self, node_id, visited):
+        """
+        Creates the block of a node.
+
+        Returns:
+            The block and an iterator over ``(child_id, target)`` pairs still to
+            be converted, where ``target`` is the list of the block the child
+            belongs to (None when the child is converted but dropped), or None
+            when the block has no children.
+        """
+        if node_id in visited:
+            return CompactBlock(PROCESS, text='pass'), None  # Avoid infinite loops due to cycles
+        visited.add(node_id)
+
+        node_type = self.graph.nodes[node_id]['type']
+        block = self.create_compact_block(node_id)
+
+        if node_type in ('while_loop', 'repeat_loop', 'for_each_loop'):
+            body = block.body
+            return block, iter([(successor, body) for successor in self.loop_body(node_id)])
+        elif node_type == 'decision':
+            # Handle true and false branches, each up to the join point
+            children = []
+            for successor, edge_data in self.out_edges(node_id):
                 label = edge_data.get('label', '').lower()
-                nested_block = self.process_node(successor, visited)
-                if label == 'yes' and nested_block:
-                    block.true_branch_body += flatten(nested_block)
-                elif label == 'no' and nested_block:
-                    block.false_branch_body += flatten(nested_block)
-        return [block]
+                if label in ('yes', 'no'):
+                    target = block.body if label == 'yes' else block.orelse
+                    nodes = self.branch(node_id, successor)
+                    if not nodes:
+                        # A branch going straight to the join point
+                        target.append(CompactBlock(PROCESS, text='pass'))
+                    children.extend((node, target) for node in nodes)
+                else:
+                    children.append((successor, None))
+            return block, iter(children)
+        return block, None
+
+    def loop_body(self, node_id) -> List[str]:
+        """
+        Nodes of a loop body in order: the successors on 'body' edges, then
+        the chain that follows them until it returns into the loop. After
+        blocks with several successors the chain continues as described in
+        ``flow_successors``.
+        """
+        body = [node_id]
+        # Classify successors as loop body or exit
+        for successor, edge_data in self.out_edges(node_id):
+            if edge_data.get('role', 'normal') == 'body':
+                body.append(successor)
+        members = set(body)
+
+        node = body[-1]
+        while True:
+            following = self.flow_successors(node)
+            closed = False
+            for successor in following:
+                if successor in members:
+                    closed = True
+                    break
+                body.append(successor)
+                members.add(successor)
+                node = successor
+            # Dead end (no successors, or none leading on): the body ends here
+            if closed or not following:
+                break
+        return body[1:]
 
+    def graph_to_blocks(self, start_node: str, compact: bool = False) -> List[Block]:
+        """
+        Converts the main flow following ``start_node`` (see ``main_flow``)
+        into nested Block instances, one tree per main flow node.
+
+        Returns ``CompactBlock`` trees instead of pydantic models if ``compact`` is set.
+        The tree of a decision ends where its branches join, which is the
+        next main flow node, so every node is converted once.
+        """
+        return [self.process_node(node_id, set(), compact) for node_id in self.main_flow(start_node)]
 
-    def graph_to_blocks(self, start_node: str) -> List[Block]:
+    def main_flow(self, start_node: str) -> List[str]:
         """
-        Recursively convert a NetworkX digraph into nested Block instances.
+        Nodes of the main flow after ``start_node``. The main flow continues
+        along the only successor, along 'exit' edges, or after a decision at
+        its join point (see ``flow_successors``), and ends at a node without
+        such successors or when it runs into itself.
         """
         node = start_node
         black_box = []
-        while len(list(self.graph.successors(node)))>0:
-            if len(list(self.graph.successors(node))) == 1:
-                black_box.append(list(self.graph.successors(node))[0])
-                node = black_box[-1]
-            else:
-                #go through successor which edge is marked as 'exit' or 'no'
-                for successor, edge_data in self.graph[node].items():
-                    label = edge_data.get('role', '').lower()
-                    if label in ('exit', 'no'):
-                        black_box.append(successor)
-                        node = black_box[-1]
-        return [self.process_node(start_node,set()) for start_node in black_box]
+        seen = {start_node}
+        while True:
+            following = self.flow_successors(node)
+            if not following or following[-1] in seen:
+                break
+            black_box.extend(following)
+            seen.update(following)
+            node = following[-1]
+        return black_box
 
 
 def flatten(nested_list):
     """
-    Recursively flattens a nested list of arbitrary depth.
+    Flattens a nested list of arbitrary depth.
 
     :param nested_list: A list, potentially containing other lists
     :return: A single flat list with all the values from the nested lists
     """
     flat_list = []
-
-    for item in nested_list:
-        if isinstance(item, list):
-            flat_list.extend(flatten(item))
-        else:
+    stack = [iter(nested_list)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, list):
+                stack.append(iter(item))
+                break
             flat_list.append(item)
-
+        else:
+            stack.pop()
     return flat_list
 
 
@@ -147,7 +269,7 @@ if __name__ == '__main__':
     # Example Usage
     # Define the graph from the given nodes and edges
 
-    file_path = os.path.abspath(r'C:\Users\orman\Documents\MimicHub\Pygorithm\tests\data\test.drawio')
+    file_path = os.path.join(os.path.dirname(__file__), '../../tests/data/test.drawio')
     graph = parse_drawio_file(file_path)
     map_labels_to_edges(graph)
     converter = G2BConverter(graph)
@@ -0,0 +1,49 @@
+"""
+Dear PyGui front end: pick a draw.io file and print the generated code.
+
+dearpygui is only imported when the GUI is started.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+
+def run_gui():
+    import dearpygui.dearpygui as dpg
+    from src.pipeline import convert_file
+
+    def select_file(sender, app_data):
+        # File path for the selected file
+        file_path = app_data["file_path_name"]
+        file_path = os.path.abspath(file_path)
+        # Update label text to show the selected file path
+        dpg.set_value("file_path_label", f"Selected file: {file_path}")
+        print(convert_file(file_path))
+
+    def show_file_dialog(sender, app_data):
+        dpg.show_item("file_dialog_id")
+
+    # Create context for Dear PyGui
+    dpg.create_context()
+    # Main window with explicit ID
+    with dpg.window(label="File Selector", id="main_window", width=500, height=500):
+        dpg.add_button(label="Select drawio file", callback=show_file_dialog)
+        dpg.add_text("", tag="file_path_label")
+    # File dialog
+    with dpg.file_dialog(directory_selector=False, show=False, callback=select_file,
+                         id="file_dialog_id", width=450, height=450,
+                         file_count=1, modal=True, tag="file_dialog_tag"):
+        dpg.add_file_extension(".drawio", color=(150, 255, 150, 255))
+        dpg.add_file_extension(".*")
+    # Create and show the viewport
+    dpg.create_viewport(title="Select drawio file", width=500, height=500)
+    dpg.setup_dearpygui()
+    dpg.show_viewport()
+    dpg.set_primary_window("main_window", True)
+    dpg.start_dearpygui()
+    # Clean up context
+    dpg.destroy_context()
+
+
+if __name__ == "__main__":
+    run_gui()
@@ -0,0 +1,127 @@
+"""
+Heatmaps of traced runs, drawn onto a copy of the diagram.
+
+``write_heatmap`` takes the per-block stats of a ``runtime.Tracer`` and
+writes a copy of the draw.io file where every block that ran is filled with
+a colour from light (cold) to red (hot), by time or by hit count, and blocks
+that never ran are grey. Each block gets a tooltip with its hits, its time
+and its share of the run.
+
+    tracer = Tracer(load_program('diagram.drawio'))
+    tracer.run()
+    write_heatmap('diagram.drawio', 'diagram.heatmap.drawio', tracer.stats)
+
+draw.io keeps tooltips on an ``UserObject`` around the ``mxCell``, which
+then holds the id and the label. Cells that are not wrapped yet are wrapped.
+The parser reads wrapped cells, so the copy converts to the same code.
+Compressed pages are written back as plain XML.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Mapping, Optional, Union
+
+from src.parser.drawio_pages import iter_inflated_xml
+from src.parser.drawio_parser import WRAPPER_TAGS
+from src.parser.style import set_style_value
+from src.runtime import BlockStats
+
+METRICS = ('seconds', 'hits')
+# Fill colours of the coldest and the hottest block, and of blocks that never ran
+COLD = (0xff, 0xf5, 0xeb)
+HOT = (0xd7, 0x30, 0x1f)
+NOT_RUN = '#f5f5f5'
+
+
+def heat_color(fraction: float) -> str:
+    """The fill colour for a block with ``fraction`` (0 to 1) of the hottest block's cost."""
+    fraction = min(max(fraction, 0.0), 1.0)
+    return '#' + ''.join(f'{round(cold + (hot - cold) * fraction):02x}' for cold, hot in zip(COLD, HOT))
+
+
+def block_tooltip(stats: BlockStats, total_seconds: float) -> str:
+    if not stats.hits:
+        return 'not run'
+    share = stats.seconds / total_seconds if total_seconds else 0.0
+    return (f"{stats.hits} hit{'' if stats.hits == 1 else 's'}, {stats.seconds * 1000:.3f} ms "
+            f'({stats.seconds / stats.hits * 1e6:.2f} us per hit, {share:.1%} of the run)')
+
+
+def apply_heatmap(model: ET.Element, stats: Mapping[str, BlockStats], metric: str = 'seconds') -> int:
+    """
+    Colours the vertices of a ``mxGraphModel`` (or any element holding
+    cells) that have stats and sets their tooltips, see the module
+    documentation. Returns the number of cells changed.
+    """
+    if metric not in METRICS:
+        raise ValueError(f'Unknown metric {metric!r}, use one of {METRICS}')
+    hottest = max((getattr(block, metric) for block in stats.values()), default=0)
+    total_seconds = sum(block.seconds for block in stats.values())
+    wrappers = {wrapper.find('mxCell'): wrapper for tag in WRAPPER_TAGS for wrapper in model.iter(tag)}
+    # Cells to wrap, by the element they are in
+    to_wrap: Dict[ET.Element, Dict[ET.Element, ET.Element]] = {}
+    parents = None
+    changed = 0
+    for cell in model.iter('mxCell'):
+        wrapper = wrappers.get(cell)
+        block = stats.get(cell.get('id') if wrapper is None else wrapper.get('id'))
+        if block is None or cell.get('vertex') != '1':
+            continue
+        if wrapper is None:
+            if parents is None:
+                parents = {child: parent for parent in model.iter() for child in parent}
+            wrapper = ET.Element('UserObject', {'label': cell.attrib.pop('value', ''), 'id': cell.attrib.pop('id')})
+            to_wrap.setdefault(parents[cell], {})[cell] = wrapper
+        wrapper.set('tooltip', block_tooltip(block, total_seconds))
+        color = heat_color(getattr(block, metric) / hottest if hottest else 0.0) if block.hits else NOT_RUN
+        cell.set('style', set_style_value(cell.get('style', ''), 'fillColor', color))
+        changed += 1
+    for parent, wrapped in to_wrap.items():
+        for cell, wrapper in wrapped.items():
+            wrapper.append(cell)
+        parent[:] = [wrapped.get(child, child) for child in parent]
+    return changed
+
+
+def heatmap_models(root: ET.Element, page: Optional[Union[int, str]] = None) -> List[ET.Element]:
+    """
+    The elements holding the cells of ``page`` in a parsed draw.io document,
+    or of all uncompressed pages (the cells ``parse_drawio_file`` reads by
+    default). A compressed page that is selected is inflated in place.
+    """
+    if root.tag == 'mxGraphModel':
+        return [root]
+    diagrams = root.findall('diagram')
+    if page is None:
+        return [diagram for diagram in diagrams if len(diagram)]
+    if isinstance(page, int):
+        diagram = diagrams[page]
+    else:
+        diagram = next((diagram for diagram in diagrams if diagram.get('name') == page), None)
+        if diagram is None:
+            names = [diagram.get('name') for diagram in diagrams]
+            raise KeyError(f'No page named {page!r}, available pages: {names}')
+    if not len(diagram) and (diagram.text or '').strip():
+        diagram.append(ET.fromstring(b''.join(iter_inflated_xml(diagram.text))))
+        diagram.text = None
+    return [diagram]
+
+
+def write_heatmap(source: Union[Path, str, BinaryIO], target: Union[Path, str, BinaryIO],
+                  stats: Mapping[str, BlockStats], page: Optional[Union[int, str]] = None,
+                  metric: str = 'seconds') -> int:
+    """
+    Writes a copy of the draw.io file ``source`` to ``target`` with the
+    heatmap of ``stats`` (``Tracer.stats``) on it, see ``apply_heatmap``.
+    ``page`` is the page the program was converted from, if one was selected.
+    Returns the number of cells changed.
+    """
+    if isinstance(source, (str, Path)):
+        source = Path(source).expanduser()
+    tree = ET.parse(source)
+    changed = sum(apply_heatmap(model, stats, metric) for model in heatmap_models(tree.getroot(), page))
+    tree.write(target, encoding='utf-8')
+    return changed
@@ -0,0 +1,446 @@
+"""
+Incremental re-conversion of a diagram that is being edited.
+
+``IncrementalConverter`` keeps the annotated graph, the block trees and the
+generated lines of the previous conversion. On every update the diagram is
+parsed again and its nodes and edges are diffed against the previous parse
+by id and attribute hash:
+
+- Moved or relabelled shapes and restyled edges are applied to the annotated
+  graph. Label matching, loop classification and edge roles are recomputed
+  for the affected decisions and loops only. Loop bodies come from the
+  natural loops of the first conversion, since the structure did not change.
+- Blocks whose own text changed are patched in place. The main flow trees
+  that contain a block whose type or branches changed are rebuilt.
+- The code is patched by line ranges, found from the ``block_id`` of the
+  entries.
+
+Added or removed cells, reconnected edges and shape type changes fall back to
+a full conversion.
+
+    converter = IncrementalConverter()
+    converter.update('diagram.drawio')          # full conversion
+    result = converter.update('diagram.drawio') # after an edit
+    for patch in reversed(result.patches):
+        lines[patch.start:patch.stop] = patch.lines
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from bisect import insort
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Union
+
+import networkx as nx
+import numpy as np
+
+from src.parser.drawio_parser import parse_drawio_file
+from src.utils.matching import (classify_edge, classify_loop, innermost_loops, label_decision_edges,
+                                map_labels_to_edges, nearest_decisions)
+from src.generator.graph2block import G2BConverter
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from src.generator.compactBlocks import CompactBlock
+from src.generator.codeSink import CodeSink
+from src.pipeline import DEBUGGER_PRELUDE, entry_lines, find_starting_node
+
+LOOP_TYPES = ('repeat_loop', 'for_each_loop')
+# Index of the first generated line in code with the debugger (the prelude comes first)
+FIRST_LINE = DEBUGGER_PRELUDE.count('\n') + 1
+
+
+@dataclass
+class CodePatch:
+    """Replaces lines ``start:stop`` of the previous code (``code.split('\\n')``) with ``lines``."""
+    start: int
+    stop: int
+    lines: List[str]
+
+
+@dataclass
+class UpdateResult:
+    """
+    What an update did. ``mode`` is 'full', 'incremental' or 'unchanged'.
+    Patches are sorted and do not overlap; apply them last to first.
+    """
+    mode: str
+    patches: List[CodePatch] = field(default_factory=list)
+    changed_nodes: int = 0
+    changed_edges: int = 0
+    rebuilt_trees: int = 0
+    patched_blocks: int = 0
+
+
+class _Tree:
+    """Block tree of one main flow node and the entries and lines generated from it."""
+    __slots__ = ('root', 'block', 'nodes', 'entries', 'lines', 'header_index', 'blocks_by_node', 'line_count')
+
+    def __init__(self, converter: G2BConverter, cgm: CodeGenerationManager, root: str, debugger: bool = True):
+        self.root = root
+        self.nodes: Set[str] = set()
+        self.block: CompactBlock = converter.process_node(root, self.nodes, compact=True)[0]
+        self.entries = []
+        self.lines = []
+        self.header_index: Dict[int, int] = {}
+        self.blocks_by_node: Dict[str, List[CompactBlock]] = defaultdict(list)
+        for block, entry in cgm.walk_block(self.block):
+            if block is not None:
+                self.header_index[id(block)] = len(self.entries)
+                if block.block_id != '-1':
+                    self.blocks_by_node[block.block_id].append(block)
+            self.entries.append(entry)
+            self.lines.append(entry_lines(entry, debugger))
+        self.line_count = sum(len(lines) for lines in self.lines)
+
+
+def _node_hash(data: Dict) -> int:
+    geometry = data.get('geometry')
+    return hash((data['type'], data['label'], tuple(geometry.values()) if geometry else None))
+
+
+def _edge_hash(data: Dict) -> int:
+    return hash(data.get('style', ''))
+
+
+class IncrementalConverter:
+    """
+    Converts one diagram again and again, redoing only the work an edit
+    requires. See the module documentation.
+
+    Args:
+        debugger: generate the ``custom_debugger()`` calls and their prelude,
+            False for release code, see ``pipeline.iter_code``.
+    """
+
+    def __init__(self, page: Optional[Union[int, str]] = None, streaming: bool = False, debugger: bool = True):
+        self.page = page
+        self.streaming = streaming
+        self.debugger = debugger
+        # Index of the first generated line in the code
+        self._first_line = FIRST_LINE if debugger else 0
+        self.graph: Optional[nx.DiGraph] = None
+        self.last_result: Optional[UpdateResult] = None
+        self._cgm = CodeGenerationManager()
+
+    # Public API
+
+    def update(self, source: Union[Path, str, BinaryIO]) -> UpdateResult:
+        """Parses the diagram again and brings the code up to date."""
+        if isinstance(source, (str, Path)):
+            source = Path(source).expanduser().resolve()
+        new_graph = parse_drawio_file(source, streaming=self.streaming, page=self.page)
+        try:
+            if (self.graph is None or list(new_graph.nodes) != self._node_order
+                    or list(new_graph.edges) != self._edge_order):
+                result = self._full(new_graph)
+            else:
+                result = self._incremental(new_graph)
+        except Exception:
+            # The state may be half updated: start over next time
+            self.graph = None
+            raise
+        self.last_result = result
+        return result
+
+    @property
+    def code(self) -> str:
+        return ''.join(self.iter_code())
+
+    def iter_code(self) -> Iterator[str]:
+        """Yields the code in chunks, like ``pipeline.iter_code``."""
+        if self.debugger:
+            yield DEBUGGER_PRELUDE
+        separator = '\n' if self.debugger else ''
+        empty = True
+        for tree in self._trees:
+            for lines in tree.lines:
+                for line in lines:
+                    empty = False
+                    yield separator + line
+                    separator = '\n'
+        if empty and self.debugger:
+            yield '\n'
+
+    def write(self, target):
+        """Writes the code to a path, file or socket, see ``CodeSink``."""
+        with CodeSink(target) as sink:
+            sink.write_all(self.iter_code())
+
+    @property
+    def entries(self) -> List[List]:
+        return [entry for tree in self._trees for entry in tree.entries]
+
+    def line_ranges(self, block_id: str) -> List[range]:
+        """Line ranges (in ``code.split('\\n')``) of the entries tagged with ``block_id``."""
+        ranges = []
+        line = self._first_line
+        for tree in self._trees:
+            for entry, lines in zip(tree.entries, tree.lines):
+                if entry[0] == block_id:
+                    ranges.append(range(line, line + len(lines)))
+                line += len(lines)
+        return ranges
+
+    # Full conversion
+
+    def _full(self, graph: nx.DiGraph) -> UpdateResult:
+        nodes = graph.nodes
+        self._node_order = list(nodes)
+        self._edge_order = list(graph.edges)
+        self._node_hashes = {node_id: _node_hash(data) for node_id, data in nodes.items()}
+        self._edge_hashes = {(source, target): _edge_hash(data) for source, target, data in graph.edges(data=True)}
+        self._base_types = {node_id: data['type'] for node_id, data in nodes.items()}
+
+        map_labels_to_edges(graph)
+        self.graph = graph
+        self._loop_bodies = innermost_loops(graph)
+
+        self._decision_ids = [n for n in self._node_order if self._base_types[n] == 'decision']
+        self._decision_index = {n: i for i, n in enumerate(self._decision_ids)}
+        self._decision_xy = np.array([(nodes[n]['geometry']['x'], nodes[n]['geometry']['y'])
+                                      for n in self._decision_ids], dtype=float).reshape(-1, 2)
+        self._text_ids = [n for n in self._node_order if self._base_types[n] == 'text']
+        self._text_index = {n: i for i, n in enumerate(self._text_ids)}
+        self._text_xy = np.array([(nodes[n]['geometry']['x'], nodes[n]['geometry']['y'])
+                                  for n in self._text_ids], dtype=float).reshape(-1, 2)
+        # Text indexes per decision, in node order
+        self._texts_of: Dict[str, List[int]] = defaultdict(list)
+        for i, text_id in enumerate(self._text_ids):
+            if nodes[text_id].get('decision') is not None:
+                self._texts_of[nodes[text_id]['decision']].append(i)
+
+        self._converter = G2BConverter(graph)
+        self._start = find_starting_node(graph)
+        self._build_trees(self._converter.main_flow(self._start))
+        return UpdateResult('full', [CodePatch(0, 0, self.code.split('\n'))],
+                            changed_nodes=len(self._node_order), changed_edges=len(self._edge_order),
+                            rebuilt_trees=len(self._trees))
+
+    def _build_trees(self, main_flow: List[str], reuse: Optional[Dict[str, _Tree]] = None):
+        reuse = reuse or {}
+        self._main_flow = main_flow
+        self._trees = [reuse.get(root) or _Tree(self._converter, self._cgm, root, self.debugger)
+                       for root in main_flow]
+        self._node_trees: Dict[str, Set[int]] = defaultdict(set)
+        for k, tree in enumerate(self._trees):
+            for node_id in tree.nodes:
+                self._node_trees[node_id].add(k)
+
+    # Incremental update
+
+    def _signature(self, node_id):
+        """Everything the block trees depend on for one node."""
+        graph = self.graph
+        data = graph.nodes[node_id]
+        return (data['type'], data['label'],
+                tuple((target, edge.get('label'), edge.get('role')) for target, edge in graph[node_id].items()))
+
+    def _incremental(self, new_graph: nx.DiGraph) -> UpdateResult:
+        graph = self.graph
+        nodes = graph.nodes
+        base = self._base_types
+
+        changed_nodes = [n for n, data in new_graph.nodes(data=True) if _node_hash(data) != self._node_hashes[n]]
+        changed_edges = [(s, t) for s, t, data in new_graph.edges(data=True)
+                         if _edge_hash(data) != self._edge_hashes[(s, t)]]
+        if not changed_nodes and not changed_edges:
+            return UpdateResult('unchanged')
+        if any(new_graph.nodes[n]['type'] != base[n] for n in changed_nodes):
+            return self._full(new_graph)
+
+        # Geometry and styles first: they decide which decisions and loops are affected
+        relabelled = []
+        moved = []
+        for node_id in changed_nodes:
+            data = new_graph.nodes[node_id]
+            if data['label'] != nodes[node_id]['label']:
+                relabelled.append(node_id)
+            if data['geometry'] != nodes[node_id]['geometry']:
+                moved.append(node_id)
+                nodes[node_id]['geometry'] = data['geometry']
+            self._node_hashes[node_id] = _node_hash(data)
+        for source, target in changed_edges:
+            graph.edges[source, target]['style'] = new_graph.edges[source, target]['style']
+            self._edge_hashes[(source, target)] = _edge_hash(new_graph.edges[source, target])
+
+        decisions, loops = self._affected(relabelled, moved, changed_edges)
+
+        # Then labels, matching and roles, remembering what the block trees saw before
+        touched = set(relabelled) | decisions | loops
+        before = {node_id: self._signature(node_id) for node_id in touched if base[node_id] != 'text'}
+        for node_id in relabelled:
+            nodes[node_id]['label'] = new_graph.nodes[node_id]['label']
+        if decisions:
+            ordered = sorted(decisions, key=self._decision_index.__getitem__)
+            text_ids = [self._text_ids[i] for i in sorted(i for d in ordered for i in self._texts_of.get(d, ()))]
+            label_decision_edges(graph, ordered, text_ids)
+            for decision in ordered:
+                nodes[decision]['type'] = 'decision'
+                classify_loop(graph, decision, self._loop_bodies)
+        for node_id in decisions | loops:
+            for target, data in graph[node_id].items():
+                classify_edge(graph, node_id, target, data)
+
+        structural = []
+        content = []
+        for node_id, signature in before.items():
+            after = self._signature(node_id)
+            if after == signature:
+                continue
+            if after[0] == signature[0] and after[2] == signature[2]:
+                content.append(node_id)
+            else:
+                structural.append(node_id)
+
+        result = UpdateResult('incremental', changed_nodes=len(changed_nodes), changed_edges=len(changed_edges))
+        self._patch(structural, content, result)
+        return result
+
+    def _affected(self, relabelled, moved, changed_edges):
+        """Decisions whose labels and loops whose roles may have changed."""
+        graph = self.graph
+        nodes = graph.nodes
+        base = self._base_types
+        decisions = set()
+        loops = set()
+
+        for node_id in relabelled:
+            if base[node_id] == 'text' and nodes[node_id].get('decision') is not None:
+                decisions.add(nodes[node_id]['decision'])
+
+        reassign = set()
+        moved_decisions = []
+        for node_id in moved:
+            geometry = nodes[node_id]['geometry']
+            if base[node_id] == 'text':
+                self._text_xy[self._text_index[node_id]] = (geometry['x'], geometry['y'])
+                reassign.add(self._text_index[node_id])
+            elif base[node_id] == 'decision':
+                self._decision_xy[self._decision_index[node_id]] = (geometry['x'], geometry['y'])
+                moved_decisions.append(node_id)
+                decisions.add(node_id)
+            elif base[node_id] in LOOP_TYPES:
+                loops.add(node_id)
+            # Exit points fall back to the relative position of the target
+            for predecessor in graph.predecessors(node_id):
+                if base[predecessor] == 'decision':
+                    decisions.add(predecessor)
+                elif base[predecessor] in LOOP_TYPES:
+                    loops.add(predecessor)
+
+        if moved_decisions and len(self._text_ids):
+            # Texts that may now be closest to a moved decision, or lost theirs
+            assigned = np.array([self._decision_index.get(nodes[t].get('decision'), 0) for t in self._text_ids])
+            current = np.linalg.norm(self._text_xy - self._decision_xy[assigned], axis=1)
+            for decision in moved_decisions:
+                index = self._decision_index[decision]
+                distance = np.linalg.norm(self._text_xy - self._decision_xy[index], axis=1)
+                reassign.update(np.flatnonzero((assigned == index) | (distance <= current)).tolist())
+
+        if reassign and self._decision_ids:
+            indexes = sorted(reassign)
+            nearest = nearest_decisions(self._text_xy[indexes], self._decision_xy)
+            for text_index, decision_index in zip(indexes, nearest.tolist()):
+                text_id = self._text_ids[text_index]
+                old = nodes[text_id].get('decision')
+                new = self._decision_ids[decision_index]
+                decisions.add(new)
+                if old != new:
+                    if old is not None:
+                        decisions.add(old)
+                        self._texts_of[old].remove(text_index)
+                    insort(self._texts_of[new], text_index)
+                    nodes[text_id]['decision'] = new
+
+        for source, target in changed_edges:
+            if base[source] == 'decision':
+                decisions.add(source)
+            elif base[source] in LOOP_TYPES:
+                loops.add(source)
+        return decisions, loops
+
+    def _patch(self, structural: List[str], content: List[str], result: UpdateResult):
+        old_trees = self._trees
+        old_starts = []
+        line = self._first_line
+        for tree in old_trees:
+            old_starts.append(line)
+            line += tree.line_count
+        old_end = line
+
+        main_flow_nodes = set(self._main_flow) | {self._start}
+        rebuild = set()
+        for node_id in structural:
+            rebuild |= self._node_trees.get(node_id, set())
+
+        if any(node_id in main_flow_nodes for node_id in structural):
+            # The main flow itself may have changed: keep the trees that are still valid
+            main_flow = self._converter.main_flow(self._start)
+            keep = {tree.root: tree for k, tree in enumerate(old_trees) if k not in rebuild}
+            self._build_trees(main_flow, keep)
+            first = 0
+            while (first < min(len(old_trees), len(self._trees))
+                   and self._trees[first] is old_trees[first]):
+                first += 1
+            result.rebuilt_trees = sum(1 for tree in self._trees if tree.root not in keep)
+            if first < len(old_trees) or first < len(self._trees):
+                lines = [line for tree in self._trees[first:] for lines in tree.lines for line in lines]
+                start = old_starts[first] if first < len(old_trees) else old_end
+                result.patches.append(CodePatch(start, old_end, lines))
+            # Relabelled blocks of the kept trees still need their text
+            # Trees from ``first`` on are covered by the patch above; the kept
+            # trees before it are still where they were in the old code
+            rebuilt = {k for k, tree in enumerate(self._trees) if tree.root not in keep}
+            self._patch_content(content, rebuilt | set(range(first, len(self._trees))), old_starts, result)
+            result.patches.sort(key=lambda patch: patch.start)
+            return
+
+        patches = []
+        for k in sorted(rebuild):
+            tree = _Tree(self._converter, self._cgm, self._main_flow[k], self.debugger)
+            for node_id in old_trees[k].nodes:
+                self._node_trees[node_id].discard(k)
+            for node_id in tree.nodes:
+                self._node_trees[node_id].add(k)
+            patches.append(CodePatch(old_starts[k], old_starts[k] + old_trees[k].line_count,
+                                     [line for lines in tree.lines for line in lines]))
+            self._trees[k] = tree
+        result.rebuilt_trees = len(rebuild)
+        result.patches.extend(patches)
+        self._patch_content(content, rebuild, old_starts, result)
+        result.patches.sort(key=lambda patch: patch.start)
+
+    def _patch_content(self, content: List[str], skip: Set[int], old_starts: Optional[List[int]],
+                       result: UpdateResult):
+        """
+        Updates the text of relabelled blocks in the trees not in ``skip`` and,
+        if ``old_starts`` is given, records a patch for each changed entry.
+        Patches are in the coordinates of the old code, so the line offsets of
+        a tree's entries are taken before its first entry changes.
+        """
+        # Old line offsets of the entries of each tree touched so far
+        old_offsets: Dict[int, List[int]] = {}
+        for node_id in content:
+            text = self._converter.create_compact_block(node_id).text
+            for k in self._node_trees.get(node_id, ()):
+                if k in skip:
+                    continue
+                tree = self._trees[k]
+                for block in tree.blocks_by_node.get(node_id, ()):
+                    block.text = text
+                    i = tree.header_index[id(block)]
+                    entry = self._cgm.entry(block, tree.entries[i][1])
+                    lines = entry_lines(entry, self.debugger)
+                    if old_starts is not None:
+                        offsets = old_offsets.get(k)
+                        if offsets is None:
+                            offsets = old_offsets[k] = list(accumulate((len(old) for old in tree.lines),
+                                                                       initial=old_starts[k]))
+                        result.patches.append(CodePatch(offsets[i], offsets[i + 1], lines))
+                    tree.line_count += len(lines) - len(tree.lines[i])
+                    tree.entries[i] = entry
+                    tree.lines[i] = lines
+                    result.patched_blocks += 1
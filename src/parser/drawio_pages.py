@@ -0,0 +1,193 @@
+import binascii
+import xml.etree.ElementTree as ET
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+from urllib.parse import unquote_to_bytes
+
+import networkx as nx
+
+from src.parser.drawio_parser import build_graph_from_events, detach_processed
+
+# Base64 characters decoded per step; a multiple of 4 so chunks decode on their own
+B64_CHUNK = 64 * 1024
+# Upper bound on the inflated bytes handed to the XML parser at once
+INFLATE_CHUNK = 256 * 1024
+
+
+@dataclass
+class DrawioPage:
+    """
+    A ``<diagram>`` page of a draw.io file. Only metadata is kept; the cells
+    are read when the page graph is requested.
+    """
+    index: int
+    name: Optional[str]
+    page_id: Optional[str]
+    compressed: bool
+    # base64 text of a compressed page, None for plain XML pages
+    payload: Optional[str] = None
+
+
+class DrawioDocument:
+    """
+    Lazy reader for multi-page and compressed draw.io files.
+
+    The file is scanned once for its pages; a page is decoded and turned into
+    a graph only when ``graph`` is called for it. Compressed pages
+    (base64 + raw deflate + URL-encoded ``mxGraphModel``) are inflated in
+    chunks and fed to an incremental XML parser, so the decompressed XML is
+    never held in memory as a whole.
+    """
+
+    def __init__(self, file_path: Union[Path, str]):
+        self.file_path = file_path
+        self._pages: Optional[List[DrawioPage]] = None
+        self._bare_model = False
+
+    @property
+    def pages(self) -> List[DrawioPage]:
+        if self._pages is None:
+            self._pages = self._scan_pages()
+        return self._pages
+
+    @property
+    def page_names(self) -> List[Optional[str]]:
+        return [page.name for page in self.pages]
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __iter__(self) -> Iterator[nx.DiGraph]:
+        for page in self.pages:
+            yield self.graph(page.index)
+
+    def get_page(self, page: Union[int, str] = 0) -> DrawioPage:
+        """Finds a page by index or by name."""
+        if isinstance(page, int):
+            return self.pages[page]
+        for candidate in self.pages:
+            if candidate.name == page:
+                return candidate
+        raise KeyError(f'No page named {page!r}, available pages: {self.page_names}')
+
+    def graph(self, page: Union[int, str] = 0) -> nx.DiGraph:
+        """
+        Decodes a single page and constructs its graph.
+
+        Returns:
+            graph (nx.DiGraph): The graph of the page, with the same node and
+            edge attributes as ``parse_drawio_file``.
+        """
+        page = self.get_page(page)
+        if page.compressed:
+            events = detach_processed(iter_compressed_page_events(page.payload))
+        else:
+            events = self._iter_plain_page_events(page.index)
+        return build_graph_from_events(events)
+
+    def _iterparse(self):
+        if hasattr(self.file_path, 'seek'):
+            self.file_path.seek(0)
+        return ET.iterparse(self.file_path, events=('start', 'end'))
+
+    def _scan_pages(self) -> List[DrawioPage]:
+        pages = []
+        root_tag = None
+        for event, elem in detach_processed(self._iterparse()):
+            if root_tag is None:
+                # The first event is the start of the document element
+                root_tag = elem.tag
+            if event != 'end' or elem.tag != 'diagram':
+                continue
+            payload = (elem.text or '').strip()
+            compressed = len(elem) == 0 and bool(payload)
+            pages.append(DrawioPage(index=len(pages), name=elem.get('name'), page_id=elem.get('id'),
+                                    compressed=compressed, payload=payload if compressed else None))
+        self._bare_model = not pages and root_tag == 'mxGraphModel'
+        if self._bare_model:
+            # A bare <mxGraphModel> document is a single unnamed page
+            pages.append(DrawioPage(index=0, name=None, page_id=None, compressed=False))
+        return pages
+
+    def _iter_plain_page_events(self, index: int) -> Iterator:
+        """Yields the events inside the ``index``-th diagram and stops reading after it."""
+        events = detach_processed(self._iterparse())
+        if self._bare_model:
+            yield from events
+            return
+        diagram_index = -1
+        for event, elem in events:
+            if elem.tag == 'diagram':
+                if event == 'start':
+                    diagram_index += 1
+                elif diagram_index == index:
+                    return
+                continue
+            if diagram_index == index:
+                yield event, elem
+
+
+def iter_compressed_page_events(payload: str) -> Iterator:
+    """
+    Decodes a compressed page chunk by chunk and yields the XML parser events
+    of its ``mxGraphModel``.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    for chunk in iter_inflated_xml(payload):
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def iter_inflated_xml(payload: str) -> Iterator[bytes]:
+    """
+    Yields the XML bytes of a compressed page: base64 decoding, raw inflate
+    and URL decoding are all applied incrementally.
+    """
+    url_encoded = None
+    # Incomplete %XX escape carried over to the next chunk
+    pending = b''
+    for data in _iter_inflated(payload):
+        if url_encoded is None:
+            url_encoded = not data.lstrip().startswith(b'<')
+        if not url_encoded:
+            yield data
+            continue
+        data = pending + data
+        cut = data.rfind(b'%', max(0, len(data) - 2))
+        if cut != -1:
+            data, pending = data[:cut], data[cut:]
+        else:
+            pending = b''
+        yield unquote_to_bytes(data)
+    if pending:
+        yield unquote_to_bytes(pending)
+
+
+def _iter_inflated(payload: str) -> Iterator[bytes]:
+    """Base64-decodes and inflates the payload, at most INFLATE_CHUNK bytes at a time."""
+    payload = ''.join(payload.split())
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    for start in range(0, len(payload), B64_CHUNK):
+        data = binascii.a2b_base64(payload[start:start + B64_CHUNK])
+        while data:
+            chunk = inflater.decompress(data, INFLATE_CHUNK)
+            data = inflater.unconsumed_tail
+            if chunk:
+                yield chunk
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+
+def parse_drawio_page(file_path: Union[Path, str], page: Union[int, str] = 0) -> nx.DiGraph:
+    """
+    Parses a single page of a draw.io file, selected by index or by name.
+
+    Returns:
+        graph (nx.DiGraph): The constructed graph with nodes and edges.
+    """
+    return DrawioDocument(file_path).graph(page)
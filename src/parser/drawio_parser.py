@@ -1,17 +1,42 @@
 # src/parser.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 import xml.etree.ElementTree as ET
-from typing import Dict, Tuple
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 import networkx as nx
 from pathlib import Path
 
-def parse_drawio_file(file_path: Path) -> nx.DiGraph:
+from src.parser.style import intern, style_node_type
+
+# Elements draw.io wraps a cell in when it has properties (a tooltip,
+# placeholders...); the wrapper holds the id and the label of the cell
+WRAPPER_TAGS = ('object', 'UserObject')
+
+
+def parse_drawio_file(file_path: Path, streaming: bool = False,
+                      page: Optional[Union[int, str]] = None) -> nx.DiGraph:
     """
     Parses the draw.io file and constructs a graph.
 
+    Args:
+        file_path (Path): Path to the draw.io file (or an open binary file object).
+        streaming (bool): Build the graph while reading with ``iterparse`` instead
+            of loading the whole XML tree first. See ``stream_drawio_file``.
+        page (int | str): Only parse this page, selected by index or name.
+            Compressed pages are supported. By default the uncompressed cells of
+            all pages are merged into one graph.
+
     Returns:
         graph (nx.DiGraph): The constructed graph with nodes and edges.
     """
+    if page is not None:
+        from src.parser.drawio_pages import parse_drawio_page
+        return parse_drawio_page(file_path, page)
+    if streaming:
+        return stream_drawio_file(file_path)
+
     tree = ET.parse(file_path)
     root = tree.getroot()
 
@@ -20,82 +45,154 @@ def parse_drawio_file(file_path: Path) -> nx.DiGraph:
     # Extract cells from the XML
     cells = root.findall(".//mxCell")
 
-    # Maps cell IDs to their data
-    cell_data = {}
-
+    geometry = None
+    wrappers = None
     for cell in cells:
-        cell_id = cell.get('id')
-        if not cell_id:
-            continue
+        wrapper = None
+        if 'id' not in cell.attrib:
+            if wrappers is None:
+                wrappers = {wrapper.find('mxCell'): wrapper for tag in WRAPPER_TAGS for wrapper in root.iter(tag)}
+            wrapper = wrappers.get(cell)
+        geometry = add_cell_to_graph(graph, cell, geometry, wrapper)
+
+    return graph
 
-        # Get node or edge attributes
-        value = cell.get('value', '').strip()
-        style = cell.get('style', '')
-        vertex = cell.get('vertex') == '1'
-        edge = cell.get('edge') == '1'
-        geometry_elem = cell.find('mxGeometry')
-        if geometry_elem is not None:
-            geometry = {
-                'x': float(geometry_elem.get('x', '0')),
-                'y': float(geometry_elem.get('y', '0')),
-                'width': float(geometry_elem.get('width', '0')),
-                'height': float(geometry_elem.get('height', '0')),
-        }
-        
-
-        if vertex:
-            node_type = detect_node_type(cell)
-            if node_type == "input_output":
-                if ':' in value:
-                    node_type = "input"
-                else:
-                    node_type = "output"
-            graph.add_node(cell_id, type=node_type, label=value, geometry=geometry)
-        elif edge:
-            source = cell.get('source')
-            target = cell.get('target')
-            if source and target:
-                
-                
-                graph.add_edge(source, target,style=style)
 
+def stream_drawio_file(file_path: Path) -> nx.DiGraph:
+    """
+    Parses the draw.io file incrementally and constructs a graph.
+
+    Cells are added to the graph as soon as their closing tag is read and are
+    then dropped from the XML tree, so peak memory stays close to the size of
+    the resulting graph instead of the size of the document.
+
+    Returns:
+        graph (nx.DiGraph): The constructed graph with nodes and edges.
+    """
+    events = ET.iterparse(file_path, events=('start', 'end'))
+    return build_graph_from_events(detach_processed(events))
+
+
+def build_graph_from_events(events: Iterable) -> nx.DiGraph:
+    """
+    Constructs a graph from ``(event, element)`` pairs as produced by
+    ``ET.iterparse`` or ``ET.XMLPullParser``.
+
+    Returns:
+        graph (nx.DiGraph): The constructed graph with nodes and edges.
+    """
+    graph = nx.DiGraph()
+    geometry = None
+    # Wrapper of the cells being read, its attributes are known from its start event
+    wrapper = None
+    for event, elem in events:
+        if elem.tag == 'mxCell':
+            if event == 'end':
+                geometry = add_cell_to_graph(graph, elem, geometry, wrapper)
+        elif elem.tag in WRAPPER_TAGS:
+            wrapper = elem if event == 'start' else None
     return graph
 
 
+def detach_processed(events: Iterable, tags=('mxCell', 'diagram')) -> Iterator:
+    """
+    Passes ``(event, element)`` pairs through and, once the consumer is done
+    with the end event of an element listed in ``tags``, clears it and detaches
+    it from its parent. Requires both 'start' and 'end' events.
+    """
+    # Open elements, used to detach finished ones from their parent
+    parents = []
+    for event, elem in events:
+        if event == 'start':
+            parents.append(elem)
+            yield event, elem
+            continue
+        parents.pop()
+        yield event, elem
+        if elem.tag in tags:
+            elem.clear()
+            if parents:
+                # Everything before this element has been processed already
+                del parents[-1][:]
+
+
+def add_cell_to_graph(graph: nx.DiGraph, cell, geometry: Optional[Dict] = None, wrapper=None) -> Optional[Dict]:
+    """
+    Adds a single ``mxCell`` element to the graph as a node or an edge.
+
+    Args:
+        graph (nx.DiGraph): Graph being built.
+        cell: The ``mxCell`` element.
+        geometry (dict): Geometry of the previously read cell, reused when this
+            cell has no ``mxGeometry`` child.
+        wrapper: The ``object`` or ``UserObject`` element around the cell, if
+            any. Its ``id`` and ``label`` are used when the cell has no id.
+
+    Returns:
+        geometry (dict): The geometry in effect after reading this cell.
+    """
+    cell_id = cell.get('id')
+    label = cell.get('value', '')
+    if not cell_id and wrapper is not None:
+        cell_id = wrapper.get('id')
+        label = wrapper.get('label', '')
+    if not cell_id:
+        return geometry
+
+    # Get node or edge attributes
+    value = label.strip()
+    # Interned so that cells with the same style share one string (and style cache entry)
+    style = intern(cell.get('style', ''))
+    vertex = cell.get('vertex') == '1'
+    edge = cell.get('edge') == '1'
+    geometry_elem = cell.find('mxGeometry')
+    if geometry_elem is not None:
+        geometry = {
+            'x': float(geometry_elem.get('x', '0')),
+            'y': float(geometry_elem.get('y', '0')),
+            'width': float(geometry_elem.get('width', '0')),
+            'height': float(geometry_elem.get('height', '0')),
+        }
+
+    if vertex:
+        node_type = detect_node_type(cell, label)
+        if node_type == "input_output":
+            if ':' in value:
+                node_type = "input"
+            else:
+                node_type = "output"
+        graph.add_node(cell_id, type=node_type, label=value, geometry=geometry)
+    elif edge:
+        source = cell.get('source')
+        target = cell.get('target')
+        if source and target:
+            graph.add_edge(source, target, style=style)
+
+    return geometry
 
 
-def detect_node_type(cell) -> str:
+def detect_node_type(cell, label: Optional[str] = None) -> str:
     """
-    Determines the node type based on the style string.
+    Determines the node type based on the style string, see ``style.style_node_type``.
+    ``label`` is the label of a wrapped cell, the ``value`` of the cell by default.
 
     Returns:
         node_type (str): The type of the node.
     """
-    style = cell.get('style', '')
-    value = cell.get('value', '').strip()
-    if "shape=parallelogram" in style:
-        return "input_output"
-    elif "rhombus" in style:
-        return "decision"
-    elif "shape=hexagon" in style:
-        if 'repeat' in value.lower():
+    node_type = style_node_type(cell.get('style', ''))
+    if node_type == "hexagon":
+        value = (cell.get('value', '') if label is None else label).strip().lower()
+        if 'repeat' in value:
             return "repeat_loop"
-        elif 'for' in value.lower():
+        elif 'for' in value:
             return "for_each_loop"
         else:
             raise ValueError('in Hex block the only "repeat <x> times" or "for each <elem> in <some_array>" should appear')
-            
-    elif "rounded=1" in style:
-        return "terminator"
-    elif "ellipse" in style or "shape=ellipse" in style:
-        return "connector"
-    elif "text;" in style or ("strokeColor=none" in style and "fillColor=none" in style):
-        return "text"
-    return "process"  # Default type
+    return node_type
 
 if __name__ == "__main__":
     # Example usage
-    file_path = Path(r'C:\Users\orman\Documents\MimicHub\Pygorithm\tests\data\test.drawio')
+    file_path = Path(__file__).resolve().parents[2] / 'tests' / 'data' / 'test.drawio'
     graph = parse_drawio_file(file_path)
     print(graph.nodes(data=True))
     print(graph.edges(data=True))
\ No newline at end of file
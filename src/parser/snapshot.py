@@ -0,0 +1,331 @@
+"""
+Columnar snapshots of parsed diagrams.
+
+Parsing the XML is the slowest stage, and pickled ``nx.DiGraph`` objects are
+large and slow to load because every node carries its own dicts. A snapshot
+stores the parsed graph as a few numpy arrays in one file:
+
+    node ids, labels   string tables (byte offsets + UTF-8 data)
+    node types         int8 codes into the type names of the header
+    geometry           float64 array of (x, y, width, height)
+    edges              CSR arrays (indptr over sources, target indices),
+                       int32 codes into the edge styles of the header
+
+``load_snapshot`` memory-maps the file, so loading reads only the header and
+the arrays are paged in when used. ``GraphSnapshot.to_networkx`` rebuilds the
+graph ``parse_drawio_file`` returned, with the same node, successor and
+predecessor order, so downstream stages produce the same code:
+
+    save_snapshot(parse_drawio_file(path), 'diagram.f2c')
+    graph = load_snapshot('diagram.f2c').to_networkx()
+
+``parse_with_snapshot`` does both: it loads the snapshot when it was taken
+from the current version of the file and re-parses (and re-saves) otherwise.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+import json
+import mmap
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import networkx as nx
+import numpy as np
+
+from src import __version__
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser.style import intern
+from src.utils.csr_graph import insertion_order
+
+MAGIC = b'F2CSNAP\x01'
+# Magic and header length
+PREAMBLE = struct.Struct('<8sQ')
+# Arrays start on cache line boundaries
+ALIGNMENT = 64
+
+NODE_ATTRIBUTES = frozenset(('type', 'label', 'geometry'))
+GEOMETRY_KEYS = ('x', 'y', 'width', 'height')
+# Bits of the node flags
+HAS_ATTRIBUTES = 1
+HAS_GEOMETRY = 2
+
+
+class StringTable:
+    """Read-only sequence of strings stored as byte offsets into UTF-8 data."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str]) -> 'StringTable':
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def tolist(self) -> List[str]:
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[start:stop].decode('utf-8') for start, stop in zip(offsets, offsets[1:])]
+
+
+class GraphSnapshot:
+    """
+    Columnar, read-only copy of a parsed graph, see the module docstring.
+    Nodes are numbered in graph order; ``successors(i)`` are node numbers.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], node_types: List[str], edge_styles: List[str],
+                 source: Optional[Dict] = None):
+        self.arrays = arrays
+        self.node_types = node_types
+        self.edge_styles = edge_styles
+        self.source = source
+        self.node_ids = StringTable(arrays['node_id_offsets'], arrays['node_id_data'])
+        self.labels = StringTable(arrays['label_offsets'], arrays['label_data'])
+        self.types = arrays['types']
+        self.flags = arrays['flags']
+        self.geometry = arrays['geometry']
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.styles = arrays['styles']
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.types)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    def successors(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def node_type(self, i: int) -> Optional[str]:
+        return self.node_types[self.types[i]] if self.flags[i] & HAS_ATTRIBUTES else None
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph, source: Optional[Dict] = None) -> 'GraphSnapshot':
+        """
+        Takes a snapshot of a graph as returned by ``parse_drawio_file``.
+
+        Raises:
+            ValueError: If the graph has attributes the parser does not set
+                (e.g. after ``map_labels_to_edges`` annotated it).
+        """
+        index = {}
+        for i, node_id in enumerate(graph):
+            if not isinstance(node_id, str):
+                raise ValueError(f"Node ids must be strings, got {node_id!r}")
+            index[node_id] = i
+        n_nodes = len(index)
+
+        type_codes = {}
+        types = np.zeros(n_nodes, dtype=np.int8)
+        flags = np.zeros(n_nodes, dtype=np.uint8)
+        geometry = np.zeros((n_nodes, len(GEOMETRY_KEYS)), dtype=np.float64)
+        labels = []
+        for i, (node_id, data) in enumerate(graph.nodes(data=True)):
+            if not data:
+                labels.append('')
+                continue
+            if data.keys() != NODE_ATTRIBUTES:
+                raise ValueError(f"Node {node_id} has attributes {sorted(data)}, "
+                                 f"only parsed graphs ({sorted(NODE_ATTRIBUTES)}) can be snapshotted")
+            types[i] = type_codes.setdefault(data['type'], len(type_codes))
+            flags[i] = HAS_ATTRIBUTES
+            labels.append(data['label'])
+            if data['geometry'] is not None:
+                flags[i] |= HAS_GEOMETRY
+                geometry[i] = [data['geometry'][key] for key in GEOMETRY_KEYS]
+        if len(type_codes) > np.iinfo(np.int8).max:
+            raise ValueError(f"Too many node types ({len(type_codes)})")
+
+        style_codes = {}
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        indices = []
+        styles = []
+        for i, (node_id, successors) in enumerate(graph.succ.items()):
+            for target, data in successors.items():
+                if data.keys() - {'style'}:
+                    raise ValueError(f"Edge {node_id} -> {target} has attributes {sorted(data)}, "
+                                     "only parsed graphs ('style') can be snapshotted")
+                indices.append(index[target])
+                styles.append(style_codes.setdefault(data['style'], len(style_codes)) if data else -1)
+            indptr[i + 1] = len(indices)
+
+        node_ids = StringTable.from_strings(list(index))
+        label_table = StringTable.from_strings(labels)
+        arrays = {
+            'node_id_offsets': node_ids.offsets,
+            'node_id_data': node_ids.data,
+            'label_offsets': label_table.offsets,
+            'label_data': label_table.data,
+            'types': types,
+            'flags': flags,
+            'geometry': geometry,
+            'indptr': indptr,
+            'indices': np.array(indices, dtype=np.int64),
+            'styles': np.array(styles, dtype=np.int32),
+            'edge_ranks': _insertion_ranks(graph, index, indptr),
+        }
+        return cls(arrays, list(type_codes), list(style_codes), source)
+
+    def to_networkx(self) -> nx.DiGraph:
+        """Rebuilds the parsed graph, see ``from_networkx``."""
+        graph = nx.DiGraph()
+        node_ids = self.node_ids.tolist()
+        labels = self.labels.tolist()
+        node_types = [intern(node_type) for node_type in self.node_types]
+        flags = self.flags.tolist()
+        types = self.types.tolist()
+        geometry = self.geometry.tolist()
+        graph.add_nodes_from(
+            (node_id, {'type': node_types[types[i]], 'label': labels[i],
+                       'geometry': dict(zip(GEOMETRY_KEYS, geometry[i])) if flags[i] & HAS_GEOMETRY else None}
+             if flags[i] & HAS_ATTRIBUTES else {})
+            for i, node_id in enumerate(node_ids))
+
+        styles = [intern(style) for style in self.edge_styles]
+        sources = np.repeat(np.arange(self.number_of_nodes), np.diff(self.indptr))
+        order = np.argsort(self.arrays['edge_ranks'], kind='stable')
+        graph.add_edges_from(
+            (node_ids[source], node_ids[target], {'style': styles[style]} if style >= 0 else {})
+            for source, target, style in zip(sources[order].tolist(), self.indices[order].tolist(),
+                                             self.styles[order].tolist()))
+        return graph
+
+    def save(self, path: Union[Path, str]):
+        """Writes the snapshot to ``path`` (atomically, through a temporary file)."""
+        path = Path(path)
+        layout = {}
+        offset = 0
+        for name, array in self.arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _aligned(offset + array.nbytes)
+        header = json.dumps({
+            'version': __version__,
+            'source': self.source,
+            'node_types': self.node_types,
+            'edge_styles': self.edge_styles,
+            'arrays': layout,
+        }).encode('utf-8')
+        data_start = _aligned(PREAMBLE.size + len(header))
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(PREAMBLE.pack(MAGIC, len(header)))
+                f.write(header)
+                for name, array in self.arrays.items():
+                    f.seek(data_start + layout[name]['offset'])
+                    f.write(np.ascontiguousarray(array).tobytes())
+                # Pad, so that the last (possibly empty) array lies inside the file
+                f.truncate(data_start + offset)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: Union[Path, str], use_mmap: bool = True) -> 'GraphSnapshot':
+        """
+        Loads a snapshot. With ``use_mmap`` the arrays are read-only views of
+        the memory-mapped file, otherwise the file is read into memory.
+
+        Raises:
+            ValueError: If the file is not a snapshot.
+        """
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        if len(buffer) < PREAMBLE.size:
+            raise ValueError(f"{path} is not a flow2code snapshot")
+        magic, header_size = PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a flow2code snapshot")
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_size]).decode('utf-8'))
+        data_start = _aligned(PREAMBLE.size + header_size)
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=data_start + spec['offset']).reshape(spec['shape'])
+        return cls(arrays, header['node_types'], header['edge_styles'], header['source'])
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _insertion_ranks(graph: nx.DiGraph, index: Dict[str, int], indptr: np.ndarray) -> np.ndarray:
+    """
+    Ranks the edges (in successor order) so that adding them in rank order
+    restores both the successor and the predecessor order of ``graph``.
+    """
+    position = {}
+    for source, successors in graph.succ.items():
+        for target in successors:
+            position[source, target] = len(position)
+    pred_edges = np.array([position[source, target] for target, predecessors in graph.pred.items()
+                           for source in predecessors], dtype=np.int64)
+    pred_indptr = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum([len(predecessors) for predecessors in graph.pred.values()], out=pred_indptr[1:])
+    ranks = np.empty(len(pred_edges), dtype=np.int64)
+    ranks[insertion_order(indptr, pred_indptr, pred_edges)] = np.arange(len(pred_edges))
+    return ranks
+
+
+def save_snapshot(graph: nx.DiGraph, path: Union[Path, str], source: Optional[Dict] = None) -> GraphSnapshot:
+    snapshot = GraphSnapshot.from_networkx(graph, source)
+    snapshot.save(path)
+    return snapshot
+
+
+def load_snapshot(path: Union[Path, str], use_mmap: bool = True) -> GraphSnapshot:
+    return GraphSnapshot.load(path, use_mmap)
+
+
+def source_stamp(file_path: Union[Path, str], page: Optional[Union[int, str]] = None) -> Dict:
+    """Identifies the version of a diagram a snapshot was taken from."""
+    stat = os.stat(file_path)
+    return {'path': str(Path(file_path).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'page': page, 'version': __version__}
+
+
+def parse_with_snapshot(file_path: Union[Path, str], snapshot_path: Union[Path, str],
+                        page: Optional[Union[int, str]] = None, streaming: bool = False) -> nx.DiGraph:
+    """
+    Returns the graph of ``file_path`` from the snapshot at ``snapshot_path``
+    if it was taken from the same file (path, size, modification time), page
+    and flow2code version. Otherwise parses the file (see ``parse_drawio_file``)
+    and saves a new snapshot.
+    """
+    stamp = source_stamp(file_path, page)
+    try:
+        snapshot = load_snapshot(snapshot_path)
+    except (FileNotFoundError, ValueError):
+        snapshot = None
+    if snapshot is not None and snapshot.source == stamp:
+        return snapshot.to_networkx()
+    graph = parse_drawio_file(Path(file_path), streaming=streaming, page=page)
+    save_snapshot(graph, snapshot_path, stamp)
+    return graph
@@ -0,0 +1,91 @@
+"""
+Cached parsing of draw.io style strings.
+
+A diagram uses a handful of distinct styles for thousands of cells, so every
+function here works on the style string alone and is memoized with an LRU
+cache. The parser interns style strings, so all cells with the same style
+share one string object. Cache lookups then compare identical objects, and
+the graph keeps a single copy of every style.
+
+    parse_style('rhombus;whiteSpace=wrap;exitX=1;')
+    # -> mappingproxy({'rhombus': '', 'whiteSpace': 'wrap', 'exitX': '1'})
+"""
+import sys
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+STYLE_CACHE_SIZE = 4096
+
+intern = sys.intern
+
+EMPTY_STYLE: Mapping[str, str] = MappingProxyType({})
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def parse_style(style: str) -> Mapping[str, str]:
+    """
+    Parses ``key=value;flag;...`` into a read-only mapping. Flags (items
+    without '=', like the shape name in ``rhombus;``) map to ''. If a key
+    appears twice, the last value wins.
+    """
+    if not style:
+        return EMPTY_STYLE
+    items = {}
+    for item in style.split(';'):
+        if item:
+            key, _, value = item.partition('=')
+            items[intern(key)] = intern(value)
+    return MappingProxyType(items)
+
+
+def set_style_value(style: str, key: str, value: str) -> str:
+    """``style`` with ``key`` set to ``value``, in place if the key is there and appended otherwise."""
+    items = [item for item in style.split(';') if item]
+    prefix = key + '='
+    for index, item in enumerate(items):
+        if item.startswith(prefix) or item == key:
+            items[index] = prefix + value
+            break
+    else:
+        items.append(prefix + value)
+    return ';'.join(items) + ';'
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def style_node_type(style: str) -> str:
+    """
+    Node type implied by a vertex style: 'input_output', 'decision',
+    'hexagon', 'terminator', 'connector', 'text' or 'process'. Hexagons and
+    parallelograms are told apart further by their label, see
+    ``drawio_parser.detect_node_type``.
+
+    The checks match substrings of the whole style, as draw.io styles are not
+    always clean key/value lists.
+    """
+    if "shape=parallelogram" in style:
+        return "input_output"
+    elif "rhombus" in style:
+        return "decision"
+    elif "shape=hexagon" in style:
+        return "hexagon"
+    elif "rounded=1" in style:
+        return "terminator"
+    elif "ellipse" in style or "shape=ellipse" in style:
+        return "connector"
+    elif "text;" in style or ("strokeColor=none" in style and "fillColor=none" in style):
+        return "text"
+    return "process"
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def exit_point(style: str) -> Tuple[float, float]:
+    """``(exitX, exitY)`` of an edge style, (0.5, 0.5) when not set."""
+    items = parse_style(style)
+    return float(items.get('exitX', 0.5)), float(items.get('exitY', 0.5))
+
+
+def cache_info() -> dict:
+    """Hit and miss counts of the style caches."""
+    return {function.__name__: function.cache_info()._asdict()
+            for function in (parse_style, style_node_type, exit_point)}
@@ -1,4 +1,17 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Iterable, List, Optional, Tuple
+
 import networkx as nx
+import numpy as np
+
+from src.utils.csr_graph import CSRGraph
+from src.utils.graph_analysis import natural_loops
 
 # Validation rules for each block type
 BLOCK_RULES = {
@@ -10,108 +23,276 @@ BLOCK_RULES = {
     "connector": {"inputs": "any", "outputs": 1},       # Merging flows
 }
 
+# Block types that explicitly start a loop
+LOOP_TYPES = {"loop", "while_loop", "repeat_loop", "for_each_loop"}
+
+# What a rule reads: one node, one edge, or the whole graph
+NODE = "node"
+EDGE = "edge"
+GLOBAL = "global"
+
+# Nodes or edges checked per task
+CHUNK_SIZE = 4096
+
 
-def validate_graph(graph, nodes):
+@dataclass(frozen=True)
+class Rule:
     """
-    Validates the graph structure, ensuring all nodes and edges comply with flowchart rules.
-    Returns a list of validation errors.
+    A validation rule. Node and edge rules give either ``check``, called for
+    one item, or ``vectorized``, called for a range of items:
+
+        NODE    check(context, node_id, data)          -> messages
+        EDGE    check(context, source, target, data)   -> messages
+        NODE or EDGE  vectorized(context, start, stop) -> (position, message) pairs,
+                where position indexes ``context.node_ids`` or ``context.edges``
+        GLOBAL  check(context)                         -> messages
+
+    Node and edge rules are run in chunks, possibly in parallel; their errors
+    are reported in node (edge) order, and in rule order for the same item.
+    Global rules run once, after them.
     """
-    errors = []
+    name: str
+    scope: str
+    check: Optional[Callable] = None
+    vectorized: Optional[Callable] = None
 
-    # Validate nodes
-    errors.extend(validate_nodes(graph, nodes))
 
-    # Validate edges
-    errors.extend(validate_edges(graph, nodes))
+# Rules run by ``validate_graph``, in order. Plugins add theirs with ``register_rule``.
+RULES: List[Rule] = []
 
-    # Validate loops
-    errors.extend(validate_loops(graph, nodes))
 
-    # Check for disconnected components
-    if not nx.is_weakly_connected(graph):
-        errors.append("The graph has disconnected components. Ensure all blocks are connected.")
+def register_rule(rule: Rule, rules: Optional[List[Rule]] = None) -> Rule:
+    (RULES if rules is None else rules).append(rule)
+    return rule
 
-    return errors
 
+def rule(scope: str, name: Optional[str] = None, vectorized: bool = False):
+    """Decorator registering a function as a rule, see ``Rule``."""
+    def decorator(function):
+        register_rule(Rule(name or function.__name__, scope,
+                           check=None if vectorized else function,
+                           vectorized=function if vectorized else None))
+        return function
+    return decorator
 
-def validate_nodes(graph, nodes):
+
+class ValidationContext:
     """
-    Validates individual nodes for compliance with block type rules.
+    What rules read: the graph, the node data (``nodes``, which may be a
+    separate dict) and arrays computed once and shared by all rules.
     """
-    errors = []
 
-    for node_id, data in nodes.items():
-        node_type = data.get("type", "unknown")
-        rules = BLOCK_RULES.get(node_type, None)
+    def __init__(self, graph, nodes, block_rules=None):
+        self.graph = graph
+        self.nodes = nodes
+        self.block_rules = BLOCK_RULES if block_rules is None else block_rules
+        self.node_ids = list(nodes)
+        self.edges = list(graph.edges(data=True))
+
+    @cached_property
+    def node_types(self) -> np.ndarray:
+        types = np.empty(len(self.node_ids), dtype=object)
+        types[:] = [self.nodes[node_id].get("type", "unknown") for node_id in self.node_ids]
+        return types
+
+    @cached_property
+    def _degrees(self) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(self.graph, CSRGraph):
+            index = self.graph.index
+            positions = np.array([index[node_id] for node_id in self.node_ids], dtype=np.intp)
+            return self.graph.in_degrees[positions], self.graph.out_degrees[positions]
+        index = {node_id: i for i, node_id in enumerate(self.graph)}
+        ends = np.array([(index[source], index[target]) for source, target in self.graph.edges],
+                        dtype=np.intp).reshape(-1, 2)
+        out_degrees = np.bincount(ends[:, 0], minlength=len(index))
+        in_degrees = np.bincount(ends[:, 1], minlength=len(index))
+        positions = np.array([index[node_id] for node_id in self.node_ids], dtype=np.intp)
+        return in_degrees[positions], out_degrees[positions]
+
+    @property
+    def in_degrees(self) -> np.ndarray:
+        """In-degree of every node of ``node_ids``."""
+        return self._degrees[0]
+
+    @property
+    def out_degrees(self) -> np.ndarray:
+        return self._degrees[1]
+
+
+def validate_graph(graph, nodes, rules: Optional[List[Rule]] = None, max_errors: Optional[int] = None,
+                   fail_fast: bool = False, workers: Optional[int] = None, block_rules=None):
+    """
+    Validates the graph structure, ensuring all nodes and edges comply with flowchart rules.
+    Returns a list of validation errors.
+
+    Args:
+        rules: rules to run, ``RULES`` by default.
+        max_errors: stop once this many errors were found and return only those.
+        fail_fast: stop at the first error (``max_errors=1``).
+        workers: check node and edge chunks in this many threads.
+        block_rules: degree rules per block type, ``BLOCK_RULES`` by default.
+    """
+    if fail_fast:
+        max_errors = 1
+    context = ValidationContext(graph, nodes, block_rules)
+    return run_rules(context, RULES if rules is None else rules, max_errors, workers)
+
 
-        if not rules:
-            errors.append(f"Unknown node type: {node_type} (Node ID: {node_id})")
+def run_rules(context: ValidationContext, rules: Iterable[Rule], max_errors: Optional[int] = None,
+              workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> List[str]:
+    """Runs node rules, then edge rules, then global rules, see ``validate_graph``."""
+    rules = list(rules)
+    errors = []
+    for scope, items in ((NODE, context.node_ids), (EDGE, context.edges)):
+        scoped = [rule for rule in rules if rule.scope == scope]
+        if not scoped or not items:
             continue
+        starts = range(0, len(items), chunk_size)
+        check = lambda start: _check_chunk(context, scoped, scope, start, min(start + chunk_size, len(items)))
+        executor = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 and len(starts) > 1 else None
+        try:
+            for chunk_errors in (executor.map(check, starts) if executor else map(check, starts)):
+                errors.extend(chunk_errors)
+                if max_errors is not None and len(errors) >= max_errors:
+                    return errors[:max_errors]
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    for rule in rules:
+        if rule.scope == GLOBAL:
+            errors.extend(rule.check(context))
+            if max_errors is not None and len(errors) >= max_errors:
+                return errors[:max_errors]
+    return errors
 
-        # Validate input and output connections
-        in_degree = graph.in_degree(node_id)
-        out_degree = graph.out_degree(node_id)
 
-        if rules["inputs"] != "any" and in_degree != rules["inputs"]:
-            errors.append(f"Node {node_id} ({node_type}) has invalid inputs: expected {rules['inputs']}, found {in_degree}")
+def _check_chunk(context: ValidationContext, rules: List[Rule], scope: str, start: int, stop: int) -> List[str]:
+    found = []
+    for rule in rules:
+        if rule.vectorized is not None:
+            found.extend(rule.vectorized(context, start, stop))
+        elif scope == NODE:
+            nodes = context.nodes
+            for position in range(start, stop):
+                node_id = context.node_ids[position]
+                found.extend((position, message) for message in rule.check(context, node_id, nodes[node_id]))
+        else:
+            for position in range(start, stop):
+                source, target, data = context.edges[position]
+                found.extend((position, message) for message in rule.check(context, source, target, data))
+    # Stable: errors of one item keep the rule order
+    found.sort(key=lambda error: error[0])
+    return [message for _, message in found]
+
+
+@rule(NODE, "block_degrees", vectorized=True)
+def check_block_degrees(context: ValidationContext, start: int, stop: int):
+    """Block types and their number of inputs and outputs, see ``BLOCK_RULES``."""
+    types = context.node_types[start:stop]
+    in_degrees = context.in_degrees[start:stop]
+    out_degrees = context.out_degrees[start:stop]
+    node_ids = context.node_ids
+    block_rules = context.block_rules
+    found = []
+
+    known = np.zeros(len(types), dtype=bool)
+    for node_type, rules in block_rules.items():
+        of_type = types == node_type
+        known |= of_type
+        # Inputs before outputs, so a stable sort keeps that order for each node
+        for key, degrees in (("inputs", in_degrees), ("outputs", out_degrees)):
+            if rules[key] == "any":
+                continue
+            for i in np.flatnonzero(of_type & (degrees != rules[key])).tolist():
+                found.append((start + i, f"Node {node_ids[start + i]} ({node_type}) has invalid {key}: "
+                                         f"expected {rules[key]}, found {degrees[i]}"))
+    for i in np.flatnonzero(~known).tolist():
+        found.append((start + i, f"Unknown node type: {types[i]} (Node ID: {node_ids[start + i]})"))
+    return found
+
+
+@rule(EDGE, "decision_labels")
+def check_decision_labels(context: ValidationContext, source, target, edge_data):
+    """Edges of decision nodes are labelled 'Yes' or 'No'."""
+    if context.nodes[source]["type"] == "decision":
+        label = edge_data.get("label", "").lower()
+        if label not in {"yes", "no"}:
+            yield f"Decision node {source} has an edge without a valid label ('Yes' or 'No')."
+
+
+@rule(EDGE, "connector_sources")
+def check_connector_sources(context: ValidationContext, source, target, edge_data):
+    """Only decisions and loops lead into connectors."""
+    source_type = context.nodes[source]["type"]
+    target_type = context.nodes[target]["type"]
+    # Validate edge connections (e.g., no direct connection to connectors without reason)
+    if target_type == "connector" and source_type not in {"decision", "loop"}:
+        yield f"Edge from {source} ({source_type}) to {target} ({target_type}) is invalid."
+
+
+@rule(GLOBAL, "loops")
+def check_loops(context: ValidationContext):
+    return validate_loops(context.graph, context.nodes)
+
+
+@rule(GLOBAL, "connected")
+def check_connected(context: ValidationContext):
+    # Check for disconnected components
+    graph = context.graph
+    if not (graph.is_weakly_connected() if isinstance(graph, CSRGraph) else nx.is_weakly_connected(graph)):
+        yield "The graph has disconnected components. Ensure all blocks are connected."
 
-        if rules["outputs"] != "any" and out_degree != rules["outputs"]:
-            errors.append(f"Node {node_id} ({node_type}) has invalid outputs: expected {rules['outputs']}, found {out_degree}")
 
-    return errors
+def validate_nodes(graph, nodes):
+    """
+    Validates individual nodes for compliance with block type rules.
+    """
+    return run_rules(ValidationContext(graph, nodes), [rule for rule in RULES if rule.scope == NODE])
 
 
 def validate_edges(graph, nodes):
     """
     Validates edges, ensuring they have proper labels and connect valid node types.
     """
-    errors = []
-
-    for source, target, edge_data in graph.edges(data=True):
-        source_type = nodes[source]["type"]
-        target_type = nodes[target]["type"]
-
-        # Validate edge labels for decision nodes
-        if source_type == "decision":
-            label = edge_data.get("label", "").lower()
-            if label not in {"yes", "no"}:
-                errors.append(f"Decision node {source} has an edge without a valid label ('Yes' or 'No').")
-
-        # Validate edge connections (e.g., no direct connection to connectors without reason)
-        if target_type == "connector" and source_type not in {"decision", "loop"}:
-            errors.append(f"Edge from {source} ({source_type}) to {target} ({target_type}) is invalid.")
-
-    return errors
+    return run_rules(ValidationContext(graph, nodes), [rule for rule in RULES if rule.scope == EDGE])
 
 
 def detect_loops(graph, nodes):
     """
-    Detects loops in the graph based on cycles and decision blocks.
-    Marks nodes and edges as part of loops if detected.
+    Detects natural loops from SCCs, DFS back edges and dominators (see
+    ``src.utils.graph_analysis.natural_loops``), in time linear in the size
+    of the graph. Self-loops are ignored.
+    Marks the nodes of every loop body and the edges inside it as part of a loop.
+
+    Returns:
+        One dict per loop with its ``header``, ``back_edges`` and ``body``
+        (header first), outermost loops first, and the loop-closing edges of
+        cycles that have more than one entry.
     """
-    loops = []  # List to store detected loops
-    cycles = list(nx.simple_cycles(graph))  # Detect cycles in the graph
-
-    for cycle in cycles:
-        if len(cycle) < 2:
+    analysis = natural_loops(graph)
+    loops = []
+    marked = set()
+    for loop in analysis.loops.values():
+        if len(loop.body) < 2:
             continue  # Skip trivial cycles (e.g., self-loops)
+        loops.append({"header": loop.header, "back_edges": loop.back_edges, "body": loop.body})
 
-        # Check if the entry point of the cycle is a decision block
-        entry_node = cycle[0]
-        if nodes[entry_node]["type"] == "decision":
-            loops.append(cycle)
-
-            # Mark all nodes in the cycle as part of a loop
-            for node in cycle:
-                nodes[node]["is_loop"] = True
-
-            # Mark edges in the cycle as part of the loop
-            for i in range(len(cycle)):
-                source = cycle[i]
-                target = cycle[(i + 1) % len(cycle)]  # Wrap around for the last edge
-                graph.edges[source, target]["is_loop"] = True
+        # Outer loops come first, so each node is marked with the largest
+        # body it belongs to and never revisited for the loops nested in it
+        unmarked = [node for node in loop.body if node not in marked]
+        if not unmarked:
+            continue
+        body = set(loop.body)
+        for source in unmarked:
+            # Mark the node and the edges inside the loop body, including the back edges
+            nodes[source]["is_loop"] = True
+            for target in graph.successors(source):
+                if target in body:
+                    graph.edges[source, target]["is_loop"] = True
+        marked.update(unmarked)
 
-    return loops
+    return loops, analysis.irreducible_edges
 
 
 def validate_loops(graph, nodes):
@@ -121,13 +302,13 @@ def validate_loops(graph, nodes):
     errors = []
 
     # Detect and mark loops
-    loops = detect_loops(graph, nodes)
+    loops, irreducible_edges = detect_loops(graph, nodes)
 
     for loop in loops:
-        entry_node = loop[0]
+        entry_node = loop["header"]
 
         # Hexagonal loop validation
-        if nodes[entry_node]["type"] == "loop":
+        if nodes[entry_node]["type"] in LOOP_TYPES:
             continue  # Explicit loop blocks are valid by default
 
         # Decision-based loop validation
@@ -139,7 +320,24 @@ def validate_loops(graph, nodes):
             ]
             if not returning_edges:
                 errors.append(f"Loop starting at decision node {entry_node} has no valid return edge.")
-        else:
+        elif not _has_exit_condition(graph, nodes, loop["body"]):
             errors.append(f"Loop detected but entry node {entry_node} is not a valid loop or decision block.")
 
+    for source, target in irreducible_edges:
+        errors.append(f"Edge from {source} to {target} closes a cycle with more than one entry; "
+                      f"loops must be entered through a single block.")
+
     return errors
+
+
+def _has_exit_condition(graph, nodes, body):
+    """
+    True if a decision or loop block in ``body`` can leave the loop, as in a
+    repeat-until loop whose condition sits at the bottom.
+    """
+    members = set(body)
+    for node in body:
+        if nodes[node]["type"] in LOOP_TYPES or nodes[node]["type"] == "decision":
+            if any(successor not in members for successor in graph.successors(node)):
+                return True
+    return False
@@ -0,0 +1,306 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import ast
+import re
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from types import CodeType
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union
+
+import networkx as nx
+
+from src.parser.drawio_parser import parse_drawio_file
+from src.utils.matching import map_labels_to_edges, classify_loops, classify_edges
+from src.generator.graph2block import G2BConverter
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from src.generator.astEmitter import build_module
+from src.generator.blockModel import Block
+from src.generator.compactBlocks import CompactBlock, count_blocks
+from src.generator.codeSink import CodeSink
+from src.profiling import NULL_PROFILER
+
+
+DEBUGGER_PRELUDE = '''
+from prompt_toolkit import PromptSession
+from prompt_toolkit.patch_stdout import patch_stdout
+def custom_debugger():
+    session = PromptSession()
+    with patch_stdout():
+        print(globals())
+        session.prompt("Debugging... Press Enter to continue.")
+    '''
+
+# File name of programs compiled by ``compile_graph``, shown in their tracebacks
+PROGRAM_FILENAME = '<flow2code>'
+
+
+# First words of the lines no ``custom_debugger()`` call is put before: 'pass',
+# compound statement headers, and the clauses continuing them ('else',
+# 'except'...), which must directly follow the previous block
+UNINSTRUMENTED_KEYWORDS = frozenset(['pass', 'if', 'elif', 'else', 'with', 'while', 'for', 'try', 'except',
+                                     'finally'])
+_FIRST_WORD = re.compile(r'\s*(\w*)')
+
+
+def convert_to_code(nested_list, debugger: bool = True):
+    return ''.join(iter_code(nested_list, debugger))
+
+
+def iter_code(entries: Iterable[List], debugger: bool = True) -> Iterator[str]:
+    """
+    Yields the generated program in chunks (the debugger prelude, then one
+    chunk per line) while consuming ``entries`` lazily.
+
+    Without ``debugger`` (release code) there is no prelude and no
+    ``custom_debugger()`` call, and the first line of code is line 1.
+    """
+    if debugger:
+        yield DEBUGGER_PRELUDE
+    separator = '\n' if debugger else ''
+    empty = True
+    for item in entries:
+        for line in entry_lines(item, debugger):
+            empty = False
+            yield separator + line
+            separator = '\n'
+    if empty and debugger:
+        yield '\n'
+
+
+def entry_lines(item: List, debugger: bool = True) -> List[str]:
+    """
+    Lines of code generated for one ``[block_id, indent, code]`` entry.
+    With ``debugger``, a ``custom_debugger()`` call comes before each line
+    whose first word is not in ``UNINSTRUMENTED_KEYWORDS``.
+    """
+    indent = '    ' * item[1]
+    code_content = item[2][0].split('\n')
+    if not debugger:
+        return [indent + line for line in code_content]
+    lines = []
+    for line in code_content:
+        match = _FIRST_WORD.match(line)
+        if match.group(1) not in UNINSTRUMENTED_KEYWORDS:
+            # At the indentation of the line, which may be inside the block's own code
+            lines.append(indent + line[:match.start(1)] + 'custom_debugger()')
+        lines.append(indent + line)
+    return lines
+
+
+def convert_to_module(blocks: Iterable, debugger: bool = True) -> ast.Module:
+    """The AST of the program ``convert_to_code`` writes for ``blocks``, see ``build_module``."""
+    if not debugger:
+        return build_module(blocks, '', partial(entry_lines, debugger=False))
+    return build_module(blocks, DEBUGGER_PRELUDE, entry_lines)
+
+
+def find_starting_node(graph):
+    # Manual in-degree calculation
+    in_degree_count = {node: 0 for node in graph.nodes}
+    # Iterate over the edges to calculate in-degrees
+    for from_node, to_node in graph.edges:
+        in_degree_count[to_node] += 1
+    # Find all nodes with no incoming edges (in-degree 0)
+    starting_nodes = [node for node, in_degree in in_degree_count.items() if in_degree == 0]
+    # Refine to select a unique starting node
+    if not starting_nodes:
+        raise ValueError("No starting node found with in-degree 0")
+    # Choose the node with the smallest identifier
+    if len(starting_nodes) >= 1:
+        starting_nodes = starting_nodes[0]
+    return starting_nodes
+
+
+@dataclass
+class Conversion:
+    """
+    Intermediate and final results of converting one diagram.
+    ``blocks`` are the compact blocks the code was generated from, see
+    ``block_models`` for the pydantic models.
+    """
+    graph: nx.DiGraph
+    blocks: List[CompactBlock]
+    entries: List[List]
+    code: str
+
+    def block_models(self) -> List[Block]:
+        return [block.to_model() if block is not None else None for block in self.blocks]
+
+
+def build_blocks(graph: nx.DiGraph, profiler=NULL_PROFILER) -> List[CompactBlock]:
+    """
+    Runs label matching and block building on a parsed graph.
+    The graph is annotated in place (edge labels and roles, loop types).
+    """
+    with profiler.span('map_labels_to_edges') as span:
+        span.count_graph(graph)
+        map_labels_to_edges(graph, classify=False)
+    with profiler.span('classify_loops'):
+        classify_loops(graph)
+    with profiler.span('classify_edges'):
+        classify_edges(graph)
+    with profiler.span('graph_to_blocks') as span:
+        blocks = graph_to_blocks(graph)
+        if profiler.enabled:
+            span.count(blocks=count_blocks(blocks))
+    return blocks
+
+
+def graph_to_blocks(graph: nx.DiGraph) -> List[CompactBlock]:
+    """Builds one compact block tree per main flow node of an annotated graph."""
+    converter = G2BConverter(graph)
+    starting_node = find_starting_node(graph)
+    blocks = []
+    for block in converter.graph_to_blocks(starting_node, compact=True):
+        while isinstance(block, list):
+            block = block[0]
+            if block is None:
+                break
+        blocks.append(block)
+    return blocks
+
+
+@dataclass
+class CompiledProgram:
+    """
+    A diagram compiled to a code object without generating its source text.
+    ``source`` produces the text from the AST when it is needed.
+    """
+    graph: nx.DiGraph
+    blocks: List[CompactBlock]
+    module: ast.Module
+    code: CodeType
+
+    def source(self) -> str:
+        return ast.unparse(self.module)
+
+
+def code_generator(blocks: List[CompactBlock]) -> CodeGenerationManager:
+    cgm = CodeGenerationManager()
+    for block in blocks:
+        cgm.add_block(block)
+    return cgm
+
+
+def convert_graph(graph: nx.DiGraph, profiler=NULL_PROFILER, debugger: bool = True) -> Conversion:
+    """
+    Runs label matching, block building and code generation on a parsed graph.
+    The graph is annotated in place (edge labels and roles, loop types).
+    Stages are measured with ``profiler`` (see ``src.profiling``).
+    Without ``debugger`` the code is release code, see ``iter_code``.
+    """
+    blocks = build_blocks(graph, profiler)
+    with profiler.span('process_blocks') as span:
+        entries = code_generator(blocks).process_blocks()
+        span.count(entries=len(entries))
+    with profiler.span('emit') as span:
+        code = convert_to_code(entries, debugger)
+        span.count(chars=len(code))
+    return Conversion(graph=graph, blocks=blocks, entries=entries, code=code)
+
+
+def compile_graph(graph: nx.DiGraph, profiler=NULL_PROFILER, filename: str = PROGRAM_FILENAME,
+                  debugger: bool = True) -> CompiledProgram:
+    """
+    Runs label matching and block building on a parsed graph, then builds the
+    AST of the program and compiles it, see ``convert_to_module``.
+    """
+    blocks = build_blocks(graph, profiler)
+    with profiler.span('build_ast'):
+        module = convert_to_module(blocks, debugger)
+    with profiler.span('compile'):
+        code = compile(module, filename, 'exec')
+    return CompiledProgram(graph=graph, blocks=blocks, module=module, code=code)
+
+
+def write_graph(graph: nx.DiGraph, sink: CodeSink, profiler=NULL_PROFILER, debugger: bool = True):
+    """
+    Converts a parsed graph and streams the code into ``sink`` while the block
+    tree is walked, without building the entries or the code in memory.
+    Block processing and writing interleave, so they are measured as one 'emit' stage.
+    """
+    blocks = build_blocks(graph, profiler)
+    with profiler.span('emit') as span:
+        written = sink.written
+        sink.write_all(iter_code(code_generator(blocks).iter_entries(), debugger))
+        sink.flush()
+        span.count(chars=sink.written - written)
+
+
+def parse_source(source: Union[Path, str, BinaryIO], page: Optional[Union[int, str]] = None,
+                 streaming: bool = False, snapshot: Optional[Union[Path, str]] = None) -> nx.DiGraph:
+    """
+    Parses a draw.io diagram given as a path or an open binary file. With
+    ``snapshot``, a path is loaded from that snapshot file when it is up to
+    date and the snapshot is refreshed otherwise, see ``src.parser.snapshot``.
+    """
+    if isinstance(source, (str, Path)):
+        # Ensure file path is absolute and expand user path if any
+        source = Path(source).expanduser().resolve()
+        if snapshot is not None:
+            from src.parser.snapshot import parse_with_snapshot
+            return parse_with_snapshot(source, snapshot, page=page, streaming=streaming)
+    return parse_drawio_file(source, streaming=streaming, page=page)
+
+
+def convert_source(source: Union[Path, str, BinaryIO], page: Optional[Union[int, str]] = None,
+                   streaming: bool = False, profiler=NULL_PROFILER,
+                   snapshot: Optional[Union[Path, str]] = None, debugger: bool = True) -> Conversion:
+    """
+    Parses and converts a draw.io diagram given as a path or an open binary file.
+    """
+    with profiler.span('parse_drawio_file') as span:
+        graph = parse_source(source, page=page, streaming=streaming, snapshot=snapshot)
+        span.count_graph(graph)
+    return convert_graph(graph, profiler, debugger)
+
+
+def compile_source(source: Union[Path, str, BinaryIO], page: Optional[Union[int, str]] = None,
+                   streaming: bool = False, profiler=NULL_PROFILER,
+                   snapshot: Optional[Union[Path, str]] = None, debugger: bool = True) -> CompiledProgram:
+    """
+    Parses a draw.io diagram given as a path or an open binary file and
+    compiles it, see ``compile_graph``.
+    """
+    with profiler.span('parse_drawio_file') as span:
+        graph = parse_source(source, page=page, streaming=streaming, snapshot=snapshot)
+        span.count_graph(graph)
+    return compile_graph(graph, profiler, debugger=debugger)
+
+
+def convert_file(file_path: Union[Path, str], page: Optional[Union[int, str]] = None,
+                 streaming: bool = False, profiler=NULL_PROFILER,
+                 snapshot: Optional[Union[Path, str]] = None, debugger: bool = True) -> str:
+    """
+    Converts a draw.io file into Python source code.
+
+    Args:
+        file_path: Path to the draw.io file.
+        page: Only convert this page (index or name), see ``parse_drawio_file``.
+        streaming: Use the streaming XML parser.
+        profiler: Records a span per stage, see ``src.profiling``.
+        snapshot: Parse through this snapshot file, see ``parse_source``.
+        debugger: Put ``custom_debugger()`` calls in the code, see ``entry_lines``.
+
+    Returns:
+        The generated Python code.
+    """
+    return convert_source(file_path, page=page, streaming=streaming, profiler=profiler, snapshot=snapshot,
+                          debugger=debugger).code
+
+
+def write_file(file_path: Union[Path, str, BinaryIO], target, page: Optional[Union[int, str]] = None,
+               streaming: bool = False, profiler=NULL_PROFILER, snapshot: Optional[Union[Path, str]] = None,
+               debugger: bool = True):
+    """
+    Converts a draw.io file and writes the code to ``target`` (a path, a text
+    or binary file, or a socket) through a ``CodeSink``.
+    """
+    with profiler.span('parse_drawio_file') as span:
+        graph = parse_source(file_path, page=page, streaming=streaming, snapshot=snapshot)
+        span.count_graph(graph)
+    with CodeSink(target) as sink:
+        write_graph(graph, sink, profiler, debugger)
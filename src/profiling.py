@@ -0,0 +1,220 @@
+"""
+Per-stage instrumentation of the conversion pipeline.
+
+A ``Profiler`` records named spans. Each span stores its wall time, its CPU
+time, the memory allocated while it ran (with ``tracemalloc``) and counts
+such as nodes, edges or blocks. The pipeline opens one span per stage:
+``parse_drawio_file``, ``map_labels_to_edges``, ``classify_loops``,
+``classify_edges``, ``graph_to_blocks``, ``process_blocks`` and ``emit``.
+
+    profiler = Profiler()
+    code = convert_file('diagram.drawio', profiler=profiler)
+    profiler.write_json('timings.json')
+    profiler.write_chrome_trace('trace.json')  # chrome://tracing or https://ui.perfetto.dev
+
+With ``profile=True`` every top-level span also runs under ``cProfile``, and
+``dump_profile`` writes the statistics of the slowest one.
+"""
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """
+    One measured stage. Times are in seconds, ``start`` is relative to the
+    creation of the profiler. Memory is in bytes: ``allocated`` is the net
+    growth of traced memory, ``peak_allocated`` the highest point above the
+    start. Both are None when memory is not traced.
+    """
+    name: str
+    start: float = 0.0
+    wall: float = 0.0
+    cpu: float = 0.0
+    allocated: Optional[int] = None
+    peak_allocated: Optional[int] = None
+    depth: int = 0
+    thread: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, **counts: int):
+        """Adds counts (``nodes=...``, ``blocks=...``) to the span."""
+        self.counts.update(counts)
+
+    def count_graph(self, graph):
+        self.counts['nodes'] = graph.number_of_nodes()
+        self.counts['edges'] = graph.number_of_edges()
+
+    def to_json(self) -> Dict:
+        return {'name': self.name, 'start': self.start, 'wall': self.wall, 'cpu': self.cpu,
+                'allocated': self.allocated, 'peak_allocated': self.peak_allocated, 'depth': self.depth,
+                'thread': self.thread, 'counts': self.counts}
+
+
+class Profiler:
+    """
+    Collects spans, see the module documentation.
+
+    Args:
+        trace_memory: measure allocations with ``tracemalloc``. Tracing is
+            started if needed, and stopped by ``close`` if it was started here.
+        profile: run top-level spans under ``cProfile``.
+    """
+    enabled = True
+
+    def __init__(self, trace_memory: bool = True, profile: bool = False):
+        self.spans: List[Span] = []
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._profiled: Optional[tuple] = None  # Slowest profiled span and its profile
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def _stack(self) -> List:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **counts: int) -> Iterator[Span]:
+        """Measures the body of the ``with`` statement as a span called ``name``."""
+        stack = self._stack()
+        span = Span(name, depth=len(stack), thread=threading.get_ident(), counts=dict(counts))
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        # Peaks are global: fold the parent's peak so far into it before resetting it for this span
+        if tracing:
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        frame = [span, 0]
+        stack.append(frame)
+        profile = cProfile.Profile() if self.profile and span.depth == 0 else None
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield span
+        finally:
+            if profile is not None:
+                profile.disable()
+            span.cpu = time.process_time() - cpu_start
+            end = time.perf_counter()
+            span.start = start - self._origin
+            span.wall = end - start
+            stack.pop()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame[1])
+                span.allocated = current - memory_start
+                span.peak_allocated = peak - memory_start
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+                tracemalloc.reset_peak()
+            if profile is not None and (self._profiled is None or span.wall > self._profiled[0].wall):
+                self._profiled = (span, profile)
+            self.spans.append(span)
+            logger.debug('%s: %.3f ms wall, %.3f ms CPU %s', name, span.wall * 1000, span.cpu * 1000, span.counts)
+
+    def slowest(self, depth: Optional[int] = 0) -> Optional[Span]:
+        """The span with the longest wall time (among spans at ``depth``, None for all)."""
+        spans = [span for span in self.spans if depth is None or span.depth == depth]
+        return max(spans, key=lambda span: span.wall, default=None)
+
+    def close(self):
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Export
+
+    def to_json(self) -> Dict:
+        spans = sorted(self.spans, key=lambda span: span.start)
+        return {'wall': sum(span.wall for span in spans if span.depth == 0),
+                'cpu': sum(span.cpu for span in spans if span.depth == 0),
+                'spans': [span.to_json() for span in spans]}
+
+    def to_chrome_trace(self) -> Dict:
+        """Spans as complete ('X') events of the Chrome trace event format, in microseconds."""
+        pid = os.getpid()
+        events = []
+        for span in sorted(self.spans, key=lambda span: span.start):
+            args = dict(span.counts, cpu_us=round(span.cpu * 1e6, 3))
+            if span.allocated is not None:
+                args.update(allocated=span.allocated, peak_allocated=span.peak_allocated)
+            events.append({'name': span.name, 'cat': 'flow2code', 'ph': 'X', 'pid': pid, 'tid': span.thread,
+                           'ts': round(span.start * 1e6, 3), 'dur': round(span.wall * 1e6, 3), 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_json(self, file_path: Union[Path, str]):
+        Path(file_path).write_text(json.dumps(self.to_json(), indent=2), encoding='utf-8')
+
+    def write_chrome_trace(self, file_path: Union[Path, str]):
+        Path(file_path).write_text(json.dumps(self.to_chrome_trace()), encoding='utf-8')
+
+    def dump_profile(self, file_path: Union[Path, str]) -> Optional[str]:
+        """
+        Writes the ``cProfile`` statistics of the slowest top-level span (for
+        ``pstats`` or snakeviz) and returns its name, or None if nothing was profiled.
+        """
+        if self._profiled is None:
+            return None
+        span, profile = self._profiled
+        profile.dump_stats(str(file_path))
+        return span.name
+
+    def report(self) -> str:
+        """Plain text table of the spans."""
+        lines = [f"{'stage':<24} {'wall ms':>10} {'cpu ms':>10} {'alloc KiB':>10} {'peak KiB':>10}  counts"]
+        for span in sorted(self.spans, key=lambda span: span.start):
+            memory = ('' if span.allocated is None else
+                      f'{span.allocated / 1024:>10.1f} {span.peak_allocated / 1024:>10.1f}')
+            counts = ' '.join(f'{key}={value}' for key, value in span.counts.items())
+            lines.append(f"{'  ' * span.depth + span.name:<24} {span.wall * 1000:>10.3f} {span.cpu * 1000:>10.3f} "
+                         f"{memory:>21}  {counts}")
+        return '\n'.join(lines)
+
+
+class _NullSpan(Span):
+    def count(self, **counts: int):
+        pass
+
+    def count_graph(self, graph):
+        pass
+
+
+class NullProfiler:
+    """Profiler that measures nothing, used when no profiler is given."""
+    enabled = False
+    spans = ()
+    _span = _NullSpan('null')
+
+    @contextmanager
+    def span(self, name: str, **counts: int) -> Iterator[Span]:
+        yield self._span
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,250 @@
+"""
+Runs generated programs, with their lines mapped back to diagram blocks.
+
+A ``Program`` is the code of a diagram compiled together with the block id
+of every line. It runs in one of three modes:
+
+- ``release``: the code has no instrumentation and runs at full speed.
+- ``trace``: the same code runs under a ``Tracer``, which counts how often
+  each block runs and how long it takes, and pauses only at breakpoints.
+- ``debug``: the code calls ``custom_debugger()`` before its statements,
+  as converted code always did.
+
+    program = load_program('diagram.drawio')
+    tracer = Tracer(program, breakpoints=['7'])
+    tracer.run()
+    print(tracer.report())
+
+The tracer uses ``sys.settrace`` and only traces frames running the
+program's code: functions the program calls, in Python or not, run
+untraced and their time counts for the block that called them.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import builtins
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from src.pipeline import (DEBUGGER_PRELUDE, PROGRAM_FILENAME, build_blocks, code_generator, convert_to_code,
+                          entry_lines, parse_source)
+
+RELEASE = 'release'
+TRACE = 'trace'
+DEBUG = 'debug'
+MODES = (RELEASE, TRACE, DEBUG)
+
+# What a breakpoint handler returns
+CONTINUE = 'continue'
+STEP = 'step'
+QUIT = 'quit'
+
+
+class StopProgram(Exception):
+    """Raised in the program when a breakpoint handler asks to quit."""
+
+
+@dataclass
+class Program:
+    """
+    Compiled code of a diagram. ``lines`` maps every line of code to the id
+    of the block it was generated from, ``starts`` the first line of each
+    block (a decision or loop header, or the code of a block) to its id, and
+    ``labels`` each id to the code of its block.
+    """
+    code: CodeType
+    source: str
+    lines: Dict[int, str]
+    starts: Dict[int, str]
+    labels: Dict[str, str]
+    debugger: bool = False
+
+
+def build_program(entries: Iterable[List], debugger: bool = False, filename: str = PROGRAM_FILENAME) -> Program:
+    """Compiles the code of ``[block_id, indent, code]`` entries, see ``Program``."""
+    entries = list(entries)
+    source = convert_to_code(entries, debugger)
+    lines = {}
+    starts = {}
+    labels = {}
+    line = DEBUGGER_PRELUDE.count('\n') + 2 if debugger else 1
+    for block_id, indent, code in entries:
+        count = len(entry_lines([block_id, indent, code], debugger))
+        # '-1' are the 'pass' lines no diagram block made, and 'else:' lines never run
+        if block_id != '-1' and code[0] != 'else:':
+            starts[line] = block_id
+            labels.setdefault(block_id, code[0])
+            for number in range(line, line + count):
+                lines[number] = block_id
+        line += count
+    return Program(code=compile(source, filename, 'exec'), source=source, lines=lines, starts=starts,
+                   labels=labels, debugger=debugger)
+
+
+def load_program(source: Union[Path, str, BinaryIO], page: Optional[Union[int, str]] = None,
+                 streaming: bool = False, debugger: bool = False,
+                 snapshot: Optional[Union[Path, str]] = None) -> Program:
+    """Parses and converts a draw.io diagram into a ``Program``, see ``build_program``."""
+    blocks = build_blocks(parse_source(source, page=page, streaming=streaming, snapshot=snapshot))
+    return build_program(code_generator(blocks).iter_entries(), debugger)
+
+
+def new_namespace() -> Dict:
+    """Globals a program runs in, as if it were run as a script."""
+    return {'__name__': '__main__', '__builtins__': builtins}
+
+
+def run_program(program: Program, namespace: Optional[Dict] = None) -> Dict:
+    """Runs the program without tracing and returns its globals."""
+    namespace = new_namespace() if namespace is None else namespace
+    exec(program.code, namespace)
+    return namespace
+
+
+@dataclass
+class BlockStats:
+    """How often a block started running, and the seconds spent in its lines."""
+    block_id: str
+    label: str
+    hits: int = 0
+    seconds: float = 0.0
+
+    def to_json(self) -> Dict:
+        return {'block_id': self.block_id, 'label': self.label, 'hits': self.hits, 'seconds': self.seconds}
+
+
+BreakHandler = Callable[[str, FrameType], str]
+
+
+class Tracer:
+    """
+    Runs a ``Program`` under ``sys.settrace``, see the module documentation.
+
+    A block is hit each time its first line runs, so a loop header counts
+    every test of the loop condition. The time between one traced line and
+    the next goes to the block of the first, and includes the calls made
+    there and the overhead of tracing.
+
+    When a block in ``breakpoints`` is hit, ``on_break(block_id, frame)`` is
+    called before it runs and returns ``CONTINUE``, ``STEP`` (pause at the
+    next block) or ``QUIT`` (stop the program with ``StopProgram``). The
+    default handler asks on the terminal, see ``prompt_break``.
+    """
+
+    def __init__(self, program: Program, breakpoints: Iterable[str] = (), on_break: Optional[BreakHandler] = None,
+                 clock: Callable[[], int] = time.perf_counter_ns):
+        self.program = program
+        self.breakpoints = set(breakpoints)
+        unknown = self.breakpoints.difference(program.labels)
+        if unknown:
+            raise ValueError(f"No block with id {', '.join(sorted(unknown))} in the program")
+        self.on_break = on_break or prompt_break
+        self.clock = clock
+        self.stats = {block_id: BlockStats(block_id, label) for block_id, label in program.labels.items()}
+        self._codes = set(_code_objects(program.code))
+        self._stepping = False
+        self._block: Optional[BlockStats] = None
+        self._since = 0
+
+    def run(self, namespace: Optional[Dict] = None) -> Dict:
+        """Runs the program once and returns its globals; stats add up over runs."""
+        namespace = new_namespace() if namespace is None else namespace
+        self._stepping = False
+        self._block = None
+        previous = sys.gettrace()
+        sys.settrace(self._trace_call)
+        try:
+            exec(self.program.code, namespace)
+        finally:
+            sys.settrace(previous)
+            self._stop()
+        return namespace
+
+    def _trace_call(self, frame: FrameType, event: str, arg):
+        if frame.f_code in self._codes:
+            return self._trace_line
+        return None
+
+    def _trace_line(self, frame: FrameType, event: str, arg):
+        if event == 'line':
+            now = self.clock()
+            if self._block is not None:
+                self._block.seconds += (now - self._since) / 1e9
+            block_id = self.program.lines.get(frame.f_lineno)
+            self._block = self.stats[block_id] if block_id is not None else None
+            # Comprehensions run in frames of their own: only the program's frame starts blocks
+            if frame.f_code is self.program.code and frame.f_lineno in self.program.starts:
+                self._block.hits += 1
+                if self._stepping or block_id in self.breakpoints:
+                    self._pause(block_id, frame)
+            self._since = self.clock()
+        elif event == 'return' and frame.f_code is self.program.code:
+            self._stop()
+        return self._trace_line
+
+    def _pause(self, block_id: str, frame: FrameType):
+        command = self.on_break(block_id, frame)
+        if command == QUIT:
+            raise StopProgram(f'Stopped at block {block_id}')
+        self._stepping = command == STEP
+
+    def _stop(self):
+        if self._block is not None:
+            self._block.seconds += (self.clock() - self._since) / 1e9
+            self._block = None
+
+    def report(self) -> str:
+        """Plain text table of the blocks that ran, slowest first."""
+        lines = [f"{'block':<24} {'hits':>10} {'total ms':>10} {'per hit us':>11}  code"]
+        for stats in sorted(self.stats.values(), key=lambda stats: -stats.seconds):
+            if stats.hits or stats.seconds:
+                per_hit = stats.seconds / stats.hits * 1e6 if stats.hits else 0.0
+                lines.append(f'{stats.block_id:<24} {stats.hits:>10} {stats.seconds * 1000:>10.3f} '
+                             f'{per_hit:>11.2f}  {stats.label}')
+        return '\n'.join(lines)
+
+    def to_json(self) -> List[Dict]:
+        return [stats.to_json() for stats in self.stats.values()]
+
+    def write_json(self, path: Union[Path, str]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+
+def _code_objects(code: CodeType) -> Iterator[CodeType]:
+    """``code`` and the code objects nested in it (comprehensions, functions)."""
+    yield code
+    for constant in code.co_consts:
+        if isinstance(constant, CodeType):
+            yield from _code_objects(constant)
+
+
+def prompt_break(block_id: str, frame: FrameType) -> str:
+    """
+    Breakpoint handler asking what to do on the terminal: Enter or 'c'
+    continues, 's' steps to the next block, 'q' quits, and anything else is
+    evaluated in the program and printed.
+    """
+    variables = {name: value for name, value in frame.f_globals.items()
+                 if not name.startswith('__') and not callable(value)}
+    print(f'Block {block_id}: {variables}', file=sys.stderr)
+    while True:
+        try:
+            answer = input('(flow2code) [c]ontinue, [s]tep, [q]uit or an expression: ').strip()
+        except EOFError:
+            return QUIT
+        if answer in ('', 'c'):
+            return CONTINUE
+        if answer == 's':
+            return STEP
+        if answer == 'q':
+            return QUIT
+        try:
+            print(repr(eval(answer, frame.f_globals, frame.f_locals)), file=sys.stderr)
+        except Exception as exc:
+            print(f'{type(exc).__name__}: {exc}', file=sys.stderr)
@@ -0,0 +1,446 @@
+"""
+Conversion service: converts diagrams sent as bytes without blocking the event loop.
+
+``ConversionService`` is the asyncio API for embedding flow2code in a server:
+
+    async with ConversionService(workers=4) as service:
+        code = await service.convert(diagram_bytes, timeout=5)
+
+Requests wait in a bounded queue; ``convert`` blocks while the queue is full,
+so callers are slowed down instead of piling up work. Conversions run in a
+pool of worker processes. Whenever a worker is free it takes its share of
+the queued requests, up to ``batch_size``, as one batch, so under load
+requests travel to the workers in batches instead of one by one. A request that times out or
+is cancelled is dropped from the queue; if its batch is already running, its
+result is discarded.
+
+Every request takes its deadline to the worker. The worker skips requests
+that are already late and, where it can (SIGALRM, in the worker processes on
+Unix), stops a conversion when its deadline passes, so one slow diagram does
+not hold up the requests batched with it. A worker that has not answered
+once every request of its batch is late is stuck where the deadline cannot
+stop it: its process is terminated and a new one takes its place.
+
+The service can also be run as a small HTTP server, on a TCP port or a Unix
+socket:
+
+    POST /convert[?page=NAME]   body: the .drawio file -> 200 text/x-python with the code
+    GET /status                 -> 200 application/json with the service counters
+
+Conversion errors answer 422, timeouts 504 and a full queue 503.
+
+    python -m src.service --port 8080 --workers 4 --timeout 10
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.batch import add_release_argument, parse_page
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_TIMEOUT = 30.0
+# Seconds a worker may take past the last deadline of its batch before it is replaced
+RECYCLE_GRACE = 1.0
+MAX_BODY_BYTES = 64 * 2 ** 20
+
+
+class ConversionError(Exception):
+    """A diagram could not be converted; the message is the error raised in the worker."""
+
+
+class ServiceBusy(Exception):
+    """The request queue is full (only raised when ``convert`` is told not to wait)."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised in a conversion when the deadline of its request passes, see ``deadline_alarm``."""
+
+
+# Worker side
+
+@contextmanager
+def deadline_alarm(deadline: Optional[float]):
+    """
+    Raises ``DeadlineExceeded`` in the code run in this context when
+    ``deadline`` (a ``time.time()``) passes. This needs SIGALRM and the main
+    thread, as in the worker processes on Unix; elsewhere nothing happens.
+    """
+    if (deadline is None or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise DeadlineExceeded('The deadline of the request passed')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 1e-3))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def convert_batch(requests: List[Tuple[bytes, Optional[str], Optional[float]]],
+                  debugger: bool = True) -> List[Tuple[Optional[bool], str]]:
+    """
+    Converts ``(data, page, deadline)`` requests one after the other, with the
+    ``custom_debugger()`` calls and their prelude unless ``debugger`` is False.
+    Requests whose deadline (a ``time.time()``, or None) has passed are
+    skipped or stopped, see ``deadline_alarm``.
+
+    Returns:
+        ``(True, code)``, ``(False, error)`` or, for late requests,
+        ``(None, '')`` per request, in order.
+    """
+    from src.pipeline import convert_source
+
+    results = []
+    for data, page, deadline in requests:
+        if deadline is not None and time.time() >= deadline:
+            results.append((None, ''))
+            continue
+        try:
+            with deadline_alarm(deadline):
+                results.append((True, convert_source(io.BytesIO(data), page=page, debugger=debugger).code))
+        except DeadlineExceeded:
+            results.append((None, ''))
+        except Exception as exc:
+            results.append((False, f'{type(exc).__name__}: {exc}'))
+    return results
+
+
+def terminate_executor(executor: Executor):
+    """Stops a pool at once, killing the processes of a process pool whatever they run."""
+    if isinstance(executor, ProcessPoolExecutor):
+        # ProcessPoolExecutor only waits for running calls, so end its processes directly
+        for process in list(executor._processes.values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Request:
+    __slots__ = ('data', 'page', 'deadline', 'future')
+
+    def __init__(self, data: bytes, page, deadline: Optional[float], future: asyncio.Future):
+        self.data = data
+        self.page = page
+        self.deadline = deadline
+        self.future = future
+
+
+class ConversionService:
+    """
+    Converts diagrams in worker processes, see the module documentation.
+
+    Args:
+        workers: number of worker processes, 0 to convert in a thread of this process.
+        queue_size: number of requests that may wait for a worker.
+        batch_size: largest number of requests sent to a worker at once.
+        timeout: default seconds a request may take, queueing included; None waits forever.
+        debugger: generate the ``custom_debugger()`` calls and their prelude,
+            False for release code.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 debugger: bool = True):
+        if workers == 0:
+            self.workers = 1
+            self._new_executor = lambda: ThreadPoolExecutor(max_workers=1)
+        else:
+            self.workers = workers or os.cpu_count() or 1
+            self._new_executor = lambda: ProcessPoolExecutor(max_workers=1)
+        # Single-worker executors, so a stuck worker can be replaced on its own
+        self._executors: List[Executor] = [self._new_executor() for _ in range(self.workers)]
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.debugger = debugger
+        self.counters = {'converted': 0, 'failed': 0, 'timed_out': 0, 'rejected': 0, 'batches': 0, 'recycled': 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._idle_workers: Optional[asyncio.Queue] = None
+        self._batches = set()
+        self._servers = []
+
+    # Life cycle
+
+    async def start(self):
+        if self._dispatcher is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._idle_workers = asyncio.Queue()
+            for worker in range(self.workers):
+                self._idle_workers.put_nowait(worker)
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def close(self):
+        """Stops serving, fails the queued requests and shuts the workers down."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+            for task in self._batches:
+                task.cancel()
+            await asyncio.gather(*self._batches, return_exceptions=True)
+            while not self._queue.empty():
+                request = self._queue.get_nowait()
+                if not request.future.done():
+                    request.future.set_exception(ConversionError('The service was closed'))
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # Requests
+
+    async def convert(self, data: bytes, page=None, timeout: Optional[float] = None, wait: bool = True) -> str:
+        """
+        Converts a diagram given as the bytes of a .drawio file.
+
+        Args:
+            page: only convert this page (index or name), see ``parse_drawio_file``.
+            timeout: seconds to wait for the code, queueing included, instead of ``self.timeout``.
+            wait: wait for room in the queue; raise ``ServiceBusy`` when it is full otherwise.
+
+        Raises:
+            ConversionError: the diagram could not be converted.
+            asyncio.TimeoutError: the code was not ready in time.
+        """
+        if self._dispatcher is None:
+            raise RuntimeError('The service is not started')
+        if timeout is None:
+            timeout = self.timeout
+        request = _Request(data, page, None if timeout is None else time.time() + timeout,
+                           asyncio.get_running_loop().create_future())
+        if not wait:
+            try:
+                self._queue.put_nowait(request)
+            except asyncio.QueueFull:
+                self.counters['rejected'] += 1
+                raise ServiceBusy('The request queue is full') from None
+        try:
+            return await asyncio.wait_for(self._submit(request, wait), timeout)
+        except asyncio.TimeoutError:
+            self.counters['timed_out'] += 1
+            raise
+
+    async def _submit(self, request: _Request, put: bool) -> str:
+        if put:
+            await self._queue.put(request)
+        # Cancelling this (a timeout or the caller) cancels the future, so the request is skipped
+        return await request.future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            worker = await self._idle_workers.get()
+            batch = [await self._queue.get()]
+            # Split what is queued evenly, so no worker idles while another has a long batch
+            size = min(self.batch_size, -(-(self._queue.qsize() + 1) // self.workers))
+            while len(batch) < size:
+                batch.append(self._queue.get_nowait())
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                self._idle_workers.put_nowait(worker)
+                continue
+            self.counters['batches'] += 1
+            task = loop.create_task(self._run_batch(loop, worker, batch))
+            task.add_done_callback(self._batches.discard)
+            self._batches.add(task)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, worker: int, batch: List[_Request]):
+        deadlines = [request.deadline for request in batch]
+        limit = None if None in deadlines else max(deadlines) - time.time() + RECYCLE_GRACE
+        try:
+            results = await asyncio.wait_for(
+                loop.run_in_executor(self._executors[worker], convert_batch,
+                                     [(request.data, request.page, request.deadline) for request in batch],
+                                     self.debugger),
+                limit)
+        except asyncio.TimeoutError:
+            logger.warning('Worker %d is stuck on a batch of %d requests past their deadline, replacing it',
+                           worker, len(batch))
+            self.counters['recycled'] += 1
+            terminate_executor(self._executors[worker])
+            self._executors[worker] = self._new_executor()
+            results = [(None, '')] * len(batch)
+        except asyncio.CancelledError:
+            results = [(False, 'The service was closed')] * len(batch)
+        except Exception as exc:
+            # The worker died or the pool was shut down
+            logger.warning('Batch of %d requests failed: %s', len(batch), exc)
+            results = [(False, f'{type(exc).__name__}: {exc}')] * len(batch)
+        finally:
+            self._idle_workers.put_nowait(worker)
+        for request, (ok, result) in zip(batch, results):
+            if ok is None:
+                # Late: the caller has timed out or is about to
+                if not request.future.done():
+                    request.future.set_exception(asyncio.TimeoutError())
+                continue
+            self.counters['converted' if ok else 'failed'] += 1
+            if not request.future.done():
+                if ok:
+                    request.future.set_result(result)
+                else:
+                    request.future.set_exception(ConversionError(result))
+
+    def status(self) -> Dict:
+        return {'workers': self.workers, 'queued': self._queue.qsize() if self._queue is not None else 0,
+                'running_batches': len(self._batches), **self.counters}
+
+    # HTTP server
+
+    async def serve(self, socket_path=None, host: str = '127.0.0.1', port: Optional[int] = None):
+        """Starts the service and serves HTTP on a Unix socket and/or a TCP port."""
+        await self.start()
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._servers.append(await asyncio.start_unix_server(self._serve_client, path=str(socket_path)))
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._serve_client, host, port))
+
+    def ports(self) -> List[int]:
+        """TCP ports served on, useful with ``port=0``."""
+        return [sock.getsockname()[1] for server in self._servers for sock in server.sockets
+                if isinstance(sock.getsockname(), tuple)]
+
+    async def handle_http(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        """Answers one HTTP request with ``(status, content type, body)``."""
+        url = urlsplit(target)
+        if url.path == '/status' and method == 'GET':
+            return 200, 'application/json', json.dumps(self.status()).encode()
+        if url.path != '/convert':
+            return 404, 'text/plain', b'Not found\n'
+        if method != 'POST':
+            return 405, 'text/plain', b'Use POST\n'
+        page = parse_page(parse_qs(url.query).get('page', [None])[0])
+        start = time.perf_counter()
+        try:
+            code = await self.convert(body, page=page, wait=False)
+        except ServiceBusy as exc:
+            return 503, 'text/plain', f'{exc}\n'.encode()
+        except asyncio.TimeoutError:
+            return 504, 'text/plain', b'Conversion timed out\n'
+        except ConversionError as exc:
+            return 422, 'text/plain', f'{exc}\n'.encode()
+        logger.info('Converted %d bytes in %.3fs', len(body), time.perf_counter() - start)
+        return 200, 'text/x-python; charset=utf-8', code.encode()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    status, content_type, body = 400, 'text/plain', b'Bad request\n'
+                    headers['connection'] = 'close'
+                else:
+                    if length > MAX_BODY_BYTES:
+                        status, content_type, body = 413, 'text/plain', b'Diagram too large\n'
+                        headers['connection'] = 'close'
+                    else:
+                        status, content_type, body = await self.handle_http(method, target,
+                                                                             await reader.readexactly(length))
+                close = headers.get('connection', '').lower() == 'close'
+                writer.write(f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n'
+                             f'Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+                             f'Connection: {"close" if close else "keep-alive"}\r\n\r\n'.encode() + body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, socket_path=None, host: str = '127.0.0.1', port: Optional[int] = None):
+        await self.serve(socket_path, host, port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.close()
+
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 422: 'Unprocessable Entity', 503: 'Service Unavailable',
+                504: 'Gateway Timeout'}
+
+
+def build_arg_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.ArgumentParser:
+    if parser is None:
+        parser = argparse.ArgumentParser(prog='flow2code-serve', description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=None, help='serve HTTP on this Unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='address to serve HTTP on with --port')
+    parser.add_argument('--port', type=int, default=None, help='serve HTTP on this TCP port')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: CPU count, 0 converts in-process)')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='requests that may wait for a worker before new ones are refused')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='largest number of requests sent to a worker at once')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds a conversion may take')
+    add_release_argument(parser)
+    return parser
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.socket is None and args.port is None:
+        print('Give --socket and/or --port to serve on', file=sys.stderr)
+        return 2
+    service = ConversionService(workers=args.workers, queue_size=args.queue_size, batch_size=args.batch_size,
+                                timeout=args.timeout, debugger=not args.release)
+    try:
+        asyncio.run(service.run(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    return run(build_arg_parser().parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,509 @@
+"""
+Array-backed directed graph for the conversion pipeline.
+
+``CSRGraph`` numbers nodes 0..n-1 in graph order and stores the adjacency as
+CSR arrays (``indptr``, ``indices``: successors grouped by source) and CSC
+arrays (``pred_indptr``, ``pred_edges``: edge numbers grouped by target).
+Edges are numbered in CSR order. Node and edge attributes are stored as one
+column (a list indexed by node or edge number) per attribute.
+
+The structure is fixed once built; attributes can change. For the stages
+that traverse the graph (label matching, loop and edge classification,
+validation, block building) it implements the part of the ``nx.DiGraph``
+API they use, keyed by the original node ids and in the same order as the
+graph it was built from, so they run on it unchanged:
+
+    graph = CSRGraph.from_networkx(parse_drawio_file(path))
+    code = convert_graph(graph).code
+
+Whole-graph questions are answered from the arrays instead (``in_degrees``,
+``out_degrees``, ``type_codes``, ``is_weakly_connected``).
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from collections import deque
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+class _Missing:
+    def __repr__(self):
+        return 'MISSING'
+
+
+# Value of an attribute a node or edge does not have
+MISSING = _Missing()
+
+
+class AttributeTable:
+    """Attribute columns of ``size`` nodes or edges."""
+
+    __slots__ = ('columns', 'size', 'views')
+
+    def __init__(self, size: int, columns: Optional[Dict[str, list]] = None):
+        self.size = size
+        self.columns: Dict[str, list] = columns if columns is not None else {}
+        # Views are created on first use and kept, see ``view``
+        self.views: List[Optional['AttributeView']] = [None] * size
+
+    def column(self, key: str) -> list:
+        """The column of ``key``, created (with every value MISSING) if needed."""
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = [MISSING] * self.size
+        return column
+
+    def view(self, i: int) -> 'AttributeView':
+        view = self.views[i]
+        if view is None:
+            view = self.views[i] = AttributeView(self, i)
+        return view
+
+    def row(self, i: int) -> dict:
+        return {key: column[i] for key, column in self.columns.items() if column[i] is not MISSING}
+
+
+class AttributeView(MutableMapping):
+    """The attributes of one node or edge, read from and written to the columns."""
+
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table: AttributeTable, i: int):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, key):
+        value = self._table.columns[key][self._i]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        column = self._table.columns.get(key)
+        if column is None:
+            return default
+        value = column[self._i]
+        return default if value is MISSING else value
+
+    def __contains__(self, key):
+        column = self._table.columns.get(key)
+        return column is not None and column[self._i] is not MISSING
+
+    def __setitem__(self, key, value):
+        self._table.column(key)[self._i] = value
+
+    def __delitem__(self, key):
+        column = self._table.columns.get(key)
+        if column is None or column[self._i] is MISSING:
+            raise KeyError(key)
+        column[self._i] = MISSING
+
+    def __iter__(self):
+        i = self._i
+        return iter([key for key, column in self._table.columns.items() if column[i] is not MISSING])
+
+    def __len__(self):
+        i = self._i
+        return sum(1 for column in self._table.columns.values() if column[i] is not MISSING)
+
+    def __repr__(self):
+        return repr(self._table.row(self._i))
+
+
+class NodeView(Mapping):
+    """``graph.nodes``: node id -> attributes, callable like ``nx.DiGraph.nodes``."""
+
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph: 'CSRGraph'):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        graph = self._graph
+        i = graph.index[node]
+        # AttributeTable.view, inlined: this is the most frequent call of the pipeline
+        view = graph.node_attributes.views[i]
+        return view if view is not None else graph.node_attributes.view(i)
+
+    def __iter__(self):
+        return iter(self._graph.ids)
+
+    def __len__(self):
+        return len(self._graph.ids)
+
+    def __contains__(self, node):
+        return node in self._graph.index
+
+    def __call__(self, data=False, default=None):
+        if data is False:
+            return iter(self._graph.ids)
+        table = self._graph.node_attributes
+        if data is True:
+            return ((node, table.view(i)) for i, node in enumerate(self._graph.ids))
+        column = table.columns.get(data, ())
+        return ((node, column[i] if column and column[i] is not MISSING else default)
+                for i, node in enumerate(self._graph.ids))
+
+    def data(self, data=True, default=None):
+        return self(data, default)
+
+
+class EdgeView:
+    """``graph.edges``: ``(source, target)`` -> attributes, callable like ``nx.DiGraph.edges``."""
+
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph: 'CSRGraph'):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        graph = self._graph
+        e = graph.edge_numbers[edge[0], edge[1]]
+        view = graph.edge_attributes.views[e]
+        return view if view is not None else graph.edge_attributes.view(e)
+
+    def __iter__(self):
+        return iter(self._graph.edge_list)
+
+    def __len__(self):
+        return len(self._graph.edge_list)
+
+    def __contains__(self, edge):
+        return (edge[0], edge[1]) in self._graph.edge_numbers
+
+    def __call__(self, data=False, default=None):
+        edge_list = self._graph.edge_list
+        if data is False:
+            return iter(edge_list)
+        table = self._graph.edge_attributes
+        if data is True:
+            return ((source, target, table.view(e)) for e, (source, target) in enumerate(edge_list))
+        column = table.columns.get(data, ())
+        return ((source, target, column[e] if column and column[e] is not MISSING else default)
+                for e, (source, target) in enumerate(edge_list))
+
+    def data(self, data=True, default=None):
+        return self(data, default)
+
+
+class AdjacencyView(Mapping):
+    """``graph[node]``: successor id -> attributes of the edge."""
+
+    __slots__ = ('_graph', '_i')
+
+    def __init__(self, graph: 'CSRGraph', i: int):
+        self._graph = graph
+        self._i = i
+
+    def __getitem__(self, successor):
+        graph = self._graph
+        return graph.edge_attributes.view(graph.edge_numbers[graph.ids[self._i], successor])
+
+    def __iter__(self):
+        return iter(self._graph.successor_ids[self._i])
+
+    def __len__(self):
+        return len(self._graph.successor_ids[self._i])
+
+    def items(self):
+        graph = self._graph
+        table = graph.edge_attributes
+        start = graph.edge_starts[self._i]
+        return [(successor, table.view(start + k)) for k, successor in enumerate(graph.successor_ids[self._i])]
+
+
+class IndexGraph:
+    """
+    The node numbers 0..n-1 of a ``CSRGraph`` with the traversal API of
+    ``nx.DiGraph`` (iteration, ``successors``, ``predecessors``, ``has_edge``).
+    Algorithms that only traverse run noticeably faster on it than on string
+    ids, see ``CSRGraph.index_graph``.
+    """
+
+    __slots__ = ('successor_lists', 'predecessor_lists', '_sources', '_targets', '_edges')
+
+    def __init__(self, graph: 'CSRGraph'):
+        targets = graph.indices.tolist()
+        indptr = graph.indptr.tolist()
+        self.successor_lists = [tuple(targets[start:stop]) for start, stop in zip(indptr, indptr[1:])]
+        pred_sources = graph.sources[graph.pred_edges].tolist()
+        pred_indptr = graph.pred_indptr.tolist()
+        self.predecessor_lists = [tuple(pred_sources[start:stop]) for start, stop in zip(pred_indptr, pred_indptr[1:])]
+        self._sources = graph.sources
+        self._targets = graph.indices
+        self._edges = None
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.successor_lists)))
+
+    def __len__(self) -> int:
+        return len(self.successor_lists)
+
+    def successors(self, i: int) -> Iterator[int]:
+        return iter(self.successor_lists[i])
+
+    def predecessors(self, i: int) -> Iterator[int]:
+        return iter(self.predecessor_lists[i])
+
+    def has_edge(self, source: int, target: int) -> bool:
+        if self._edges is None:
+            self._edges = set(zip(self._sources.tolist(), self._targets.tolist()))
+        return (source, target) in self._edges
+
+
+class CSRGraph:
+    """
+    Directed graph with CSR/CSC adjacency and columnar attributes, see the
+    module docstring. Build it with ``from_networkx`` or ``from_snapshot``.
+    """
+
+    def __init__(self, ids: Sequence[Hashable], indptr: np.ndarray, indices: np.ndarray,
+                 pred_edges: Optional[np.ndarray] = None, node_columns: Optional[Dict[str, list]] = None,
+                 edge_columns: Optional[Dict[str, list]] = None):
+        """
+        Args:
+            ids: Node ids, in node order.
+            indptr, indices: CSR adjacency, the successors of node ``i`` are
+                ``indices[indptr[i]:indptr[i + 1]]``.
+            pred_edges: Edge numbers grouped by target, in predecessor order.
+                By default the predecessors of a node are in source order.
+            node_columns, edge_columns: Attribute columns, see ``AttributeTable``.
+        """
+        self.ids: List[Hashable] = list(ids)
+        self.index: Dict[Hashable, int] = {node: i for i, node in enumerate(self.ids)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        n_nodes, n_edges = len(self.ids), len(self.indices)
+        self.sources = np.repeat(np.arange(n_nodes, dtype=np.int64), np.diff(self.indptr))
+        if pred_edges is None:
+            pred_edges = np.argsort(self.indices, kind='stable')
+        self.pred_edges = np.asarray(pred_edges, dtype=np.int64)
+        self.pred_indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=n_nodes), out=self.pred_indptr[1:])
+
+        self.node_attributes = AttributeTable(n_nodes, node_columns)
+        self.edge_attributes = AttributeTable(n_edges, edge_columns)
+        self.graph = {}
+
+        # Python-level adjacency for the nx-compatible API
+        ids = self.ids
+        sources = self.sources.tolist()
+        targets = self.indices.tolist()
+        self.edge_list: List[Tuple[Hashable, Hashable]] = [(ids[s], ids[t]) for s, t in zip(sources, targets)]
+        self.edge_numbers: Dict[Tuple[Hashable, Hashable], int] = {edge: e for e, edge in enumerate(self.edge_list)}
+        self.edge_starts: List[int] = self.indptr[:-1].tolist()
+        indptr_list = self.indptr.tolist()
+        self.successor_ids: List[Tuple] = [tuple(ids[t] for t in targets[start:stop])
+                                           for start, stop in zip(indptr_list, indptr_list[1:])]
+        pred_sources = self.sources[self.pred_edges].tolist()
+        pred_indptr = self.pred_indptr.tolist()
+        self.predecessor_ids: List[Tuple] = [tuple(ids[s] for s in pred_sources[start:stop])
+                                             for start, stop in zip(pred_indptr, pred_indptr[1:])]
+
+        self.nodes = NodeView(self)
+        self.edges = EdgeView(self)
+        self._index_graph: Optional[IndexGraph] = None
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph) -> 'CSRGraph':
+        """Copies the structure, order and attributes of ``graph``."""
+        ids = list(graph)
+        index = {node: i for i, node in enumerate(ids)}
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        indices = []
+        edge_numbers = {}
+        edge_rows = []
+        for i, (source, successors) in enumerate(graph.succ.items()):
+            for target, data in successors.items():
+                edge_numbers[source, target] = len(indices)
+                indices.append(index[target])
+                edge_rows.append(data)
+            indptr[i + 1] = len(indices)
+        pred_edges = [edge_numbers[source, target] for target, predecessors in graph.pred.items()
+                      for source in predecessors]
+        return cls(ids, indptr, np.array(indices, dtype=np.int64), np.array(pred_edges, dtype=np.int64),
+                   _columns([data for _, data in graph.nodes(data=True)]), _columns(edge_rows))
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> 'CSRGraph':
+        """Builds the graph straight from the arrays of a ``src.parser.snapshot.GraphSnapshot``."""
+        from src.parser.snapshot import HAS_ATTRIBUTES, HAS_GEOMETRY, GEOMETRY_KEYS
+        from src.parser.style import intern
+
+        flags = snapshot.flags.tolist()
+        node_types = [intern(node_type) for node_type in snapshot.node_types]
+        types = snapshot.types.tolist()
+        geometry = snapshot.geometry.tolist()
+        labels = snapshot.labels.tolist()
+        node_columns = {
+            'type': [node_types[code] if flag & HAS_ATTRIBUTES else MISSING for code, flag in zip(types, flags)],
+            'label': [label if flag & HAS_ATTRIBUTES else MISSING for label, flag in zip(labels, flags)],
+            'geometry': [(dict(zip(GEOMETRY_KEYS, row)) if flag & HAS_GEOMETRY else None)
+                         if flag & HAS_ATTRIBUTES else MISSING for row, flag in zip(geometry, flags)],
+        }
+        styles = [intern(style) for style in snapshot.edge_styles]
+        edge_columns = {'style': [styles[code] if code >= 0 else MISSING for code in snapshot.styles.tolist()]}
+
+        # Predecessor order: edges by target, then by insertion rank
+        ranks = np.asarray(snapshot.arrays['edge_ranks'])
+        pred_edges = np.lexsort((ranks, snapshot.indices))
+        return cls(snapshot.node_ids.tolist(), snapshot.indptr, snapshot.indices, pred_edges,
+                   node_columns, edge_columns)
+
+    def to_networkx(self) -> nx.DiGraph:
+        """A ``nx.DiGraph`` with the same nodes, edges, order and attributes."""
+        graph = nx.DiGraph()
+        graph.graph.update(self.graph)
+        node_table = self.node_attributes
+        graph.add_nodes_from((node, node_table.row(i)) for i, node in enumerate(self.ids))
+        edge_table = self.edge_attributes
+        edge_list = self.edge_list
+        graph.add_edges_from((*edge_list[e], edge_table.row(e))
+                             for e in insertion_order(self.indptr, self.pred_indptr, self.pred_edges).tolist())
+        return graph
+
+    # nx.DiGraph API used by the pipeline
+
+    def __iter__(self) -> Iterator:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node) -> bool:
+        return node in self.index
+
+    def __getitem__(self, node) -> AdjacencyView:
+        return AdjacencyView(self, self.index[node])
+
+    def successors(self, node) -> Iterator:
+        return iter(self.successor_ids[self.index[node]])
+
+    neighbors = successors
+
+    def predecessors(self, node) -> Iterator:
+        return iter(self.predecessor_ids[self.index[node]])
+
+    def has_node(self, node) -> bool:
+        return node in self.index
+
+    def has_edge(self, source, target) -> bool:
+        return (source, target) in self.edge_numbers
+
+    def is_directed(self) -> bool:
+        return True
+
+    def number_of_nodes(self) -> int:
+        return len(self.ids)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    # Array API
+
+    def index_graph(self) -> IndexGraph:
+        """
+        The graph over node numbers, built once. ``src.utils.graph_analysis``
+        runs its algorithms on it and keys the results by node id again.
+        """
+        if self._index_graph is None:
+            self._index_graph = IndexGraph(self)
+        return self._index_graph
+
+    @property
+    def out_degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @property
+    def in_degrees(self) -> np.ndarray:
+        return np.diff(self.pred_indptr)
+
+    def successor_indices(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def predecessor_indices(self, i: int) -> np.ndarray:
+        return self.sources[self.pred_edges[self.pred_indptr[i]:self.pred_indptr[i + 1]]]
+
+    def type_codes(self, key: str = 'type') -> Tuple[np.ndarray, List]:
+        """
+        The values of a node attribute as integer codes and the list of
+        distinct values they index (MISSING included if some nodes lack it).
+        """
+        values = {}
+        codes = np.fromiter((values.setdefault(value, len(values)) for value in self.node_attributes.column(key)),
+                            dtype=np.int64, count=len(self.ids))
+        return codes, list(values)
+
+    def is_weakly_connected(self) -> bool:
+        """Like ``nx.is_weakly_connected`` (which raises on an empty graph)."""
+        n_nodes = len(self.ids)
+        if n_nodes == 0:
+            raise nx.NetworkXPointlessConcept("Connectivity is undefined for the null graph.")
+        # Every node takes the smallest label of its neighbours, and labels
+        # jump along their own labels, until nothing changes
+        labels = np.arange(n_nodes)
+        sources, targets = self.sources, self.indices
+        while True:
+            previous = labels.copy()
+            np.minimum.at(labels, sources, labels[targets])
+            np.minimum.at(labels, targets, labels[sources])
+            labels = labels[labels]
+            if np.array_equal(labels, previous):
+                return bool((labels == 0).all())
+
+
+def insertion_order(indptr: np.ndarray, pred_indptr: np.ndarray, pred_edges: np.ndarray) -> np.ndarray:
+    """
+    Edge numbers in an order that restores both the successor order (CSR)
+    and the predecessor order (``pred_edges``) when the edges are added to a
+    ``nx.DiGraph`` one by one. Edges wait for the previous edge of their
+    source and the previous edge into their target; any topological order
+    of these constraints works.
+    """
+    n_edges = len(pred_edges)
+    next_in_source = list(range(1, n_edges + 1))
+    for end in indptr[1:].tolist():
+        if end:
+            next_in_source[end - 1] = -1
+    next_in_target = [-1] * n_edges
+    pred_edges = pred_edges.tolist()
+    pred_indptr = pred_indptr.tolist()
+    for start, stop in zip(pred_indptr, pred_indptr[1:]):
+        for k in range(start, stop - 1):
+            next_in_target[pred_edges[k]] = pred_edges[k + 1]
+
+    waiting = [0] * n_edges
+    for following in next_in_source:
+        if following >= 0:
+            waiting[following] += 1
+    for following in next_in_target:
+        if following >= 0:
+            waiting[following] += 1
+    ready = deque(edge for edge in range(n_edges) if not waiting[edge])
+    order = []
+    while ready:
+        edge = ready.popleft()
+        order.append(edge)
+        for following in (next_in_source[edge], next_in_target[edge]):
+            if following >= 0:
+                waiting[following] -= 1
+                if not waiting[following]:
+                    ready.append(following)
+    return np.array(order, dtype=np.int64)
+
+
+def _columns(rows: List[dict]) -> Dict[str, list]:
+    """Attribute columns of a list of attribute dicts."""
+    columns: Dict[str, list] = {}
+    for i, row in enumerate(rows):
+        for key, value in row.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [MISSING] * len(rows)
+            column[i] = value
+    return columns
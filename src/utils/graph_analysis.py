@@ -0,0 +1,348 @@
+"""
+Iterative graph analysis for flowchart graphs.
+
+Everything here works on any object with the ``nx.DiGraph`` traversal API
+(iteration over nodes, ``successors`` and ``predecessors``) and uses explicit
+stacks, so deep diagrams never hit the recursion limit.
+
+Graphs that number their nodes (``CSRGraph``, which has ``index_graph`` and
+``ids``) are analysed over the node numbers, which is faster than hashing
+ids; ``natural_loops`` keys its results by id again.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Virtual root that precedes every entry node, so graphs with several entries
+# (or unreachable cycles) have a single dominator tree
+VIRTUAL_ROOT = object()
+
+
+def strongly_connected_components(graph, successors: Optional[Callable[[Hashable], Iterable]] = None
+                                  ) -> Dict[Hashable, int]:
+    """
+    Tarjan's algorithm without recursion.
+
+    Args:
+        successors: Replaces ``graph.successors``, e.g. to leave out some edges.
+
+    Returns:
+        The component number of every node. Components are numbered in
+        reverse topological order of the condensation: edges between
+        components always go from a higher to a lower number.
+    """
+    if successors is None:
+        successors = graph.successors
+    index = {}
+    low = {}
+    component = {}
+    stack = []
+    on_stack = set()
+    counter = 0
+    n_components = 0
+
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, pending = work[-1]
+            for successor in pending:
+                if successor not in index:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(successors(successor))))
+                    break
+                if successor in on_stack and index[successor] < low[node]:
+                    low[node] = index[successor]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component[member] = n_components
+                        if member == node:
+                            break
+                    n_components += 1
+    return component
+
+
+def cyclic_nodes(graph, component: Optional[Dict[Hashable, int]] = None) -> set:
+    """Nodes that lie on at least one cycle (non-trivial SCCs and self-loops)."""
+    if component is None:
+        component = strongly_connected_components(graph)
+    sizes = {}
+    for number in component.values():
+        sizes[number] = sizes.get(number, 0) + 1
+    return {node for node, number in component.items()
+            if sizes[number] > 1 or graph.has_edge(node, node)}
+
+
+@dataclass
+class DepthFirstSearch:
+    """Result of ``depth_first_search``."""
+    roots: List[Hashable] = field(default_factory=list)
+    preorder: Dict[Hashable, int] = field(default_factory=dict)
+    postorder: List[Hashable] = field(default_factory=list)
+    # Edges to a node that is still on the DFS stack (loop-closing edges)
+    retreating_edges: List[Tuple[Hashable, Hashable]] = field(default_factory=list)
+
+
+def depth_first_search(graph, roots: Optional[List[Hashable]] = None) -> DepthFirstSearch:
+    """
+    Iterative DFS that numbers nodes and classifies retreating edges.
+
+    The search starts from ``roots`` (by default the nodes without incoming
+    edges, in graph order); nodes that are still unvisited afterwards, such as
+    cycles without an entry, start additional trees and are added to
+    ``roots``.
+    """
+    if roots is None:
+        roots = [node for node in graph if not any(True for _ in graph.predecessors(node))]
+    result = DepthFirstSearch()
+    preorder = result.preorder
+    finished = set()
+
+    def search(root):
+        result.roots.append(root)
+        preorder[root] = len(preorder)
+        work = [(root, iter(graph.successors(root)))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in preorder:
+                    preorder[successor] = len(preorder)
+                    work.append((successor, iter(graph.successors(successor))))
+                    break
+                if successor not in finished:
+                    result.retreating_edges.append((node, successor))
+            else:
+                work.pop()
+                finished.add(node)
+                result.postorder.append(node)
+
+    for root in roots:
+        if root not in preorder:
+            search(root)
+    for node in graph:
+        if node not in preorder:
+            search(node)
+    return result
+
+
+def immediate_dominators(graph, dfs: Optional[DepthFirstSearch] = None) -> Dict[Hashable, Optional[Hashable]]:
+    """
+    Cooper, Harvey and Kennedy's iterative dominator algorithm over a virtual
+    root joined to every DFS root.
+
+    Returns:
+        The immediate dominator of every node; DFS roots map to None.
+    """
+    if dfs is None:
+        dfs = depth_first_search(graph)
+    order = {node: number for number, node in enumerate(dfs.postorder)}
+    order[VIRTUAL_ROOT] = len(order)
+    roots = set(dfs.roots)
+    idom = {VIRTUAL_ROOT: VIRTUAL_ROOT}
+
+    def intersect(a, b):
+        while a is not b and a != b:
+            while order[a] < order[b]:
+                a = idom[a]
+            while order[b] < order[a]:
+                b = idom[b]
+        return a
+
+    reverse_postorder = dfs.postorder[::-1]
+    changed = True
+    while changed:
+        changed = False
+        for node in reverse_postorder:
+            new_idom = VIRTUAL_ROOT if node in roots else None
+            for predecessor in graph.predecessors(node):
+                if predecessor in idom:
+                    new_idom = predecessor if new_idom is None else intersect(predecessor, new_idom)
+            if idom.get(node) != new_idom:
+                idom[node] = new_idom
+                changed = True
+
+    del idom[VIRTUAL_ROOT]
+    return {node: (None if parent is VIRTUAL_ROOT else parent) for node, parent in idom.items()}
+
+
+class DominatorTree:
+    """Answers "does a dominate b" in constant time from DFS intervals of the dominator tree."""
+
+    def __init__(self, idom: Dict[Hashable, Optional[Hashable]]):
+        self.idom = idom
+        children: Dict[Hashable, List[Hashable]] = {}
+        tree_roots = []
+        for node, parent in idom.items():
+            if parent is None:
+                tree_roots.append(node)
+            else:
+                children.setdefault(parent, []).append(node)
+        self._enter: Dict[Hashable, int] = {}
+        self._exit: Dict[Hashable, int] = {}
+        clock = 0
+        for root in tree_roots:
+            work = [(root, iter(children.get(root, ())))]
+            self._enter[root] = clock
+            clock += 1
+            while work:
+                node, pending = work[-1]
+                child = next(pending, None)
+                if child is None:
+                    work.pop()
+                    self._exit[node] = clock
+                    clock += 1
+                else:
+                    self._enter[child] = clock
+                    clock += 1
+                    work.append((child, iter(children.get(child, ()))))
+
+    def dominates(self, a: Hashable, b: Hashable) -> bool:
+        return self._enter[a] <= self._enter[b] and self._exit[b] <= self._exit[a]
+
+
+class ReversedGraph:
+    """View of a graph with every edge reversed, as far as the analyses here need it."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __iter__(self):
+        return iter(self.graph)
+
+    def successors(self, node: Hashable) -> Iterable:
+        return self.graph.predecessors(node)
+
+    def predecessors(self, node: Hashable) -> Iterable:
+        return self.graph.successors(node)
+
+
+def immediate_post_dominators(graph) -> Dict[Hashable, Optional[Hashable]]:
+    """
+    The immediate post-dominator of every node: the first node that every
+    path from it to a node without successors goes through, such as the
+    node where the branches of a decision join again. Nodes whose paths have
+    no such node in common (branches ending separately) map to None.
+    """
+    return immediate_dominators(ReversedGraph(graph))
+
+
+@dataclass
+class NaturalLoop:
+    header: Hashable
+    back_edges: List[Tuple[Hashable, Hashable]]
+    # Header first, then the other body nodes in DFS preorder
+    body: List[Hashable]
+    # Headers of the loops directly nested in this one
+    children: List[Hashable] = field(default_factory=list)
+
+
+@dataclass
+class LoopAnalysis:
+    loops: Dict[Hashable, NaturalLoop] = field(default_factory=dict)
+    # Loop-closing edges whose target does not dominate their source
+    irreducible_edges: List[Tuple[Hashable, Hashable]] = field(default_factory=list)
+
+
+def natural_loops(graph) -> LoopAnalysis:
+    """
+    Finds every natural loop once, keyed by its header.
+
+    Retreating edges of a DFS whose target dominates their source are back
+    edges; all back edges into one header form one loop. Loop bodies are
+    collected innermost first while inner loops are collapsed into their
+    header with a union-find (Tarjan's loop nesting forest), so every edge is
+    walked a constant number of times regardless of the nesting depth. Only
+    writing out the bodies costs more, in proportion to their size.
+
+    Graphs without cycles are recognised from their SCCs and skip the
+    dominator computation entirely.
+    """
+    if hasattr(graph, 'index_graph'):
+        return _relabel_loops(natural_loops(graph.index_graph()), graph.ids)
+    analysis = LoopAnalysis()
+    if not cyclic_nodes(graph):
+        return analysis
+
+    dfs = depth_first_search(graph)
+    dominators = DominatorTree(immediate_dominators(graph, dfs))
+
+    tails: Dict[Hashable, List[Hashable]] = {}
+    for source, target in dfs.retreating_edges:
+        if dominators.dominates(target, source):
+            tails.setdefault(target, []).append(source)
+        else:
+            analysis.irreducible_edges.append((source, target))
+
+    parent: Dict[Hashable, Hashable] = {}
+
+    def find(node):
+        root = node
+        while root in parent:
+            root = parent[root]
+        while node in parent and parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    preorder = dfs.preorder
+    members: Dict[Hashable, List[Hashable]] = {}
+    # Deeper headers come later in preorder, so this visits inner loops first
+    for header in sorted(tails, key=preorder.__getitem__, reverse=True):
+        seen = {header}
+        collected = []
+        work = [find(tail) for tail in tails[header]]
+        while work:
+            node = work.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            collected.append(node)
+            for predecessor in graph.predecessors(node):
+                representative = find(predecessor)
+                if representative not in seen:
+                    work.append(representative)
+        for node in collected:
+            parent[node] = header
+        members[header] = collected
+
+    for header in sorted(tails, key=preorder.__getitem__, reverse=True):
+        body = [header]
+        children = []
+        for node in members[header]:
+            if node in analysis.loops:
+                children.append(node)
+                body.extend(analysis.loops[node].body)
+            else:
+                body.append(node)
+        body[1:] = sorted(body[1:], key=preorder.__getitem__)
+        analysis.loops[header] = NaturalLoop(header=header, back_edges=[(tail, header) for tail in tails[header]],
+                                             body=body, children=sorted(children, key=preorder.__getitem__))
+    # Outermost loops first
+    analysis.loops = {header: analysis.loops[header] for header in sorted(analysis.loops, key=preorder.__getitem__)}
+    return analysis
+
+
+def _relabel_loops(analysis: LoopAnalysis, ids: List[Hashable]) -> LoopAnalysis:
+    """Replaces the node numbers of a ``LoopAnalysis`` by the node ids."""
+    loops = {}
+    for header, loop in analysis.loops.items():
+        loops[ids[header]] = NaturalLoop(header=ids[header],
+                                         back_edges=[(ids[tail], ids[target]) for tail, target in loop.back_edges],
+                                         body=[ids[node] for node in loop.body],
+                                         children=[ids[child] for child in loop.children])
+    return LoopAnalysis(loops=loops,
+                        irreducible_edges=[(ids[source], ids[target]) for source, target in analysis.irreducible_edges])
@@ -3,13 +3,14 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 import numpy as np
 from src.parser.drawio_parser import parse_drawio_file
+from src.parser.style import exit_point
+from src.utils.spatial import SpatialIndex
+from src.utils.graph_analysis import natural_loops
 
 import math
+from typing import Dict, Hashable, Set
 import logging
-import coloredlogs
-# Configure logging
 logger = logging.getLogger(__name__)
-coloredlogs.install(level='DEBUG', fmt='%(hostname)s %(name)s[%(process)d] %(levelname)s %(message)s')
 
 def convert_x_value(value):
     if value > 0:
@@ -26,63 +27,135 @@ def convert_y_value(value):
         return 0.5
     else:  # value < 0
         return 0
-def map_labels_to_edges(graph) -> None:
+# Upper bound on the size of a text-by-decision distance matrix computed at once
+DISTANCE_CHUNK = 1 << 22
+# Above this many text/decision pairs, texts are matched through a SpatialIndex
+BRUTE_FORCE_PAIRS = 1 << 16
+
+
+def map_labels_to_edges(graph, classify: bool = True) -> None:
+    """
+    Labels every outgoing edge of a decision node with the text of the
+    nearest label block, then classifies loops and edge roles (unless
+    ``classify`` is False; call ``classify_loops`` and ``classify_edges``
+    afterwards in that case).
+
+    Each text block is first assigned to its nearest decision node (stored as
+    the ``decision`` attribute of the text node). Every decision edge then
+    takes the label of the nearest text block assigned to its decision,
+    measured from the edge's exit point. Small diagrams use packed coordinate
+    arrays with a bulk argmin, large ones a ``SpatialIndex`` over the
+    decisions; either way ties go to the earlier node, as before.
+    """
+    nodes = graph.nodes
+    decision_ids = [node_id for node_id, data in nodes.items() if data["type"] == "decision"]
+    text_ids = [node_id for node_id, data in nodes.items() if data["type"] == "text"]
+
+    if text_ids and decision_ids and len(text_ids) * len(decision_ids) <= BRUTE_FORCE_PAIRS:
+        nearest = nearest_decisions(
+            np.array([(nodes[t]['geometry']['x'], nodes[t]['geometry']['y']) for t in text_ids], dtype=float),
+            np.array([(nodes[d]['geometry']['x'], nodes[d]['geometry']['y']) for d in decision_ids], dtype=float))
+        for text_id, decision_index in zip(text_ids, nearest.tolist()):
+            nodes[text_id]['decision'] = decision_ids[decision_index]
+    elif text_ids and decision_ids:
+        index = SpatialIndex((d, 'decision', nodes[d]['geometry']['x'], nodes[d]['geometry']['y'])
+                             for d in decision_ids)
+        for text_id in text_ids:
+            geometry = nodes[text_id]['geometry']
+            nodes[text_id]['decision'] = index.nearest(geometry['x'], geometry['y'])[0][0]
+
+    label_decision_edges(graph, decision_ids, text_ids)
+    if classify:
+        classify_loops(graph)
+        classify_edges(graph)
+
+
+def nearest_decisions(text_xy: np.ndarray, decision_xy: np.ndarray) -> np.ndarray:
+    """
+    Returns, for every text position, the index of the nearest decision
+    position (first one on ties). Rows are processed in chunks so the
+    distance matrix stays bounded on huge diagrams.
+    """
+    nearest = np.empty(len(text_xy), dtype=np.intp)
+    step = max(1, DISTANCE_CHUNK // max(1, len(decision_xy)))
+    for start in range(0, len(text_xy), step):
+        delta = text_xy[start:start + step, None, :] - decision_xy[None, :, :]
+        distances = np.sqrt(np.einsum('tdk,tdk->td', delta, delta))
+        nearest[start:start + step] = np.argmin(distances, axis=1)
+    return nearest
+
+
+def label_decision_edges(graph, decision_ids, text_ids) -> None:
+    """
+    Sets the ``label`` of every decision edge to the nearest text block of
+    that decision. Text blocks of one decision are deduplicated by label (the
+    last block with a given label wins), as the candidates are labels.
+    """
     nodes = graph.nodes
     edges = graph.edges
-    decision_nodes = {node_id: data for node_id, data in nodes.items() if data["type"] == "decision"}
-    text_blocks = {node_id: data for node_id, data in nodes.items() if data["type"] == "text"}
-    decision_nodes_neighbours = {node_id: list(graph.neighbors(node_id)) for node_id in decision_nodes}
+    decision_index = {node_id: i for i, node_id in enumerate(decision_ids)}
 
-    
-    #sellect two nearest to target text_blocks
-    for block in text_blocks:
-        dec_candidates = {
-            dec_node:np.linalg.norm(
-                np.asanyarray(
-                    [nodes[dec_node]['geometry']['x'],
-                     nodes[dec_node]['geometry']['y']]
-                    )-np.asanyarray(
-                        [text_blocks[block]['geometry']['x'],
-                         text_blocks[block]['geometry']['y']]
-                        )) for dec_node in decision_nodes}
-        text_blocks[block]['decision'] = list(sorted(dec_candidates.items(),key=lambda item:item[1]))[0][0]
-    
-    
-    
-    for src in decision_nodes_neighbours:
-        src_edges = {}
-        for trgt in decision_nodes_neighbours[src]:
+    # Candidate labels per decision, in first-seen order, with the centre of the last block
+    candidate_position = {}
+    candidate_decision = []
+    candidate_label = []
+    candidate_center = []
+    for text_id in text_ids:
+        data = nodes[text_id]
+        if data.get('decision') not in decision_index:
+            continue
+        key = (decision_index[data['decision']], data['label'])
+        geometry = data['geometry']
+        center = (geometry['x'] + 0.5 * geometry['width'], geometry['y'] + 0.5 * geometry['height'])
+        if key in candidate_position:
+            candidate_center[candidate_position[key]] = center
+        else:
+            candidate_position[key] = len(candidate_label)
+            candidate_decision.append(key[0])
+            candidate_label.append(key[1])
+            candidate_center.append(center)
+
+    edge_list = []
+    edge_decision = []
+    exit_points = []
+    for src in decision_ids:
+        for trgt in graph.neighbors(src):
             edge = extract_edge_exit_point(edges[(src, trgt)])
-            
-            if edge == {'exitX':0.5, 'exitY':0.5}:
-                src_pos = np.asanyarray([nodes[src]['geometry']['x'],nodes[src]['geometry']['y']])
-                trgt_pos = np.asanyarray([nodes[trgt]['geometry']['x'],nodes[trgt]['geometry']['y']])
-                vec = src_pos - trgt_pos
-                edge = {'exitX':convert_x_value(vec[0]), 'exitY':convert_y_value(vec[1])}
-            src_edges[trgt] = edge
-        
-        src_text_blocks = {text_blocks[block]['label']:text_blocks[block] for block in text_blocks if text_blocks[block]['decision'] == src}
-        src_edges = {trgt:relative2absolute(src_edges[trgt],decision_nodes[src]) for trgt in src_edges}
-        already_used_labels = set()
-        for trgt in src_edges:
-            distances = {block:np.linalg.norm(
-                np.asanyarray(
-                    [
-                        src_text_blocks[block]['geometry']['x']+0.5*src_text_blocks[block]['geometry']['width'],
-                        src_text_blocks[block]['geometry']['y']+0.5*src_text_blocks[block]['geometry']['height'],
-                        ]
-                    )-np.asanyarray(
-                        [
-                            src_edges[trgt]['exitX'], 
-                            src_edges[trgt]['exitY']
-                            ]
-                        )) for block in src_text_blocks}
-            #src_text_blocks.sort(key=lambda block: np.linalg.norm(np.asanyarray([block['geometry']['x'], block['geometry']['y']])-np.asanyarray([decision_nodes[src]['geometry']['x'], decision_nodes[src]['geometry']['y']])))
-
-            graph.edges[(src, trgt)]['label'] = min(distances, key=distances.get)
-            #print(f'Edge {src}->{trgt} label: {graph.edges[(src, trgt)]["label"]}')
-    classify_loops(graph)
-    classify_edges(graph)
+            if edge == {'exitX': 0.5, 'exitY': 0.5}:
+                vec = (nodes[src]['geometry']['x'] - nodes[trgt]['geometry']['x'],
+                       nodes[src]['geometry']['y'] - nodes[trgt]['geometry']['y'])
+                edge = {'exitX': convert_x_value(vec[0]), 'exitY': convert_y_value(vec[1])}
+            edge = relative2absolute(edge, nodes[src])
+            edge_list.append((src, trgt))
+            edge_decision.append(decision_index[src])
+            exit_points.append((edge['exitX'], edge['exitY']))
+    if not edge_list:
+        return
+
+    edge_decision = np.array(edge_decision, dtype=np.intp)
+    counts = np.bincount(np.array(candidate_decision, dtype=np.intp), minlength=len(decision_ids))
+    missing = np.flatnonzero(counts[edge_decision] == 0)
+    if len(missing):
+        src = edge_list[missing[0]][0]
+        raise ValueError(f"Decision node {src} has no text block to label its edges")
+
+    # Candidates grouped by decision, keeping their first-seen order inside a group
+    order = np.argsort(np.array(candidate_decision, dtype=np.intp), kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    centers = np.array(candidate_center, dtype=float)[order]
+
+    width = int(counts.max())
+    slots = np.arange(width)
+    edge_counts = counts[edge_decision][:, None]
+    candidates = offsets[edge_decision][:, None] + np.minimum(slots[None, :], edge_counts - 1)
+    delta = centers[candidates] - np.array(exit_points, dtype=float)[:, None, :]
+    distances = np.sqrt(np.einsum('eck,eck->ec', delta, delta))
+    distances[slots[None, :] >= edge_counts] = np.inf
+    chosen = order[candidates[np.arange(len(edge_list)), np.argmin(distances, axis=1)]]
+
+    for (src, trgt), candidate in zip(edge_list, chosen.tolist()):
+        edges[(src, trgt)]['label'] = candidate_label[candidate]
+
 
 def relative2absolute(edge,node):
     edge = {'exitX': edge['exitX']*node['geometry']['width'] + node['geometry']['x'], 'exitY': edge['exitY']*node['geometry']['height'] + node['geometry']['y']}
@@ -93,111 +166,114 @@ def extract_edge_exit_point(cell):
     """
     Extracts the exitX and exitY attributes from a cell's style.
     """
-    style = cell.get('style', '')
-    exitX, exitY = 0.5, 0.5  # Defaults
-    for item in style.split(';'):
-        if item.startswith('exitX='):
-            exitX = float(item.split('=')[1])
-        elif item.startswith('exitY='):
-            exitY = float(item.split('=')[1])
+    exitX, exitY = exit_point(cell.get('style', ''))
     return {'exitX': exitX, 'exitY': exitY}
 
+
 def classify_edges(graph):
-    for edge in graph.edges(data=True):
-        source, target, data = edge
-        source_node = graph.nodes[source]
-        target_node = graph.nodes[target]
-        
-        if source_node['type'] in ('repeat_loop', 'for_each_loop'):
-            # Try to use exitX and exitY
-            exit_point = extract_edge_exit_point(data)
-            if exit_point.get('exitX') is not None and exit_point.get('exitY') is not None:
-                if exit_point['exitX'] == 0.5 and exit_point['exitY'] == 1:
-                    data['role'] = 'body'
-                elif exit_point['exitX'] == 1 and exit_point['exitY'] == 0.5:
-                    data['role'] = 'exit'
-                else:
-                    # Fallback to relative position
-                    source_geom = source_node.get('geometry', {})
-                    target_geom = target_node.get('geometry', {})
-                    source_x = source_geom.get('x', 0)
-                    source_y = source_geom.get('y', 0)
-                    target_x = target_geom.get('x', 0)
-                    target_y = target_geom.get('y', 0)
-                    
-                    if target_y > source_y and abs(target_x - source_x) < target_geom.get('width', 0) / 2:
-                        data['role'] = 'body'  # Below the source (vertical alignment)
-                    elif target_x > source_x and abs(target_y - source_y) < target_geom.get('height', 0) / 2:
-                        data['role'] = 'exit'  # To the right of the source (horizontal alignment)
-                    else:
-                        data['role'] = 'unknown'
-
-        elif source_node['type'] == 'process':
-            data['role'] = 'u_def'
-        elif source_node['type'] == 'while_loop':
-            if data['label'].lower() in ('true', 'yes'):
+    for source, target, data in graph.edges(data=True):
+        classify_edge(graph, source, target, data)
+
+
+def classify_edge(graph, source, target, data):
+    """Sets the ``role`` of one edge from the type of its source."""
+    source_node = graph.nodes[source]
+    target_node = graph.nodes[target]
+    
+    if source_node['type'] in ('repeat_loop', 'for_each_loop'):
+        # Try to use exitX and exitY
+        exit_point = extract_edge_exit_point(data)
+        if exit_point.get('exitX') is not None and exit_point.get('exitY') is not None:
+            if exit_point['exitX'] == 0.5 and exit_point['exitY'] == 1:
                 data['role'] = 'body'
-            elif data['label'].lower() in ('false', 'no'):
+            elif exit_point['exitX'] == 1 and exit_point['exitY'] == 0.5:
                 data['role'] = 'exit'
             else:
-                data['role'] = 'unknown'
-        elif source_node['type'] == 'decision':
-            if data['label'].lower() in ('yes', 'true'):
-                data['role'] = 'true branch'
-            elif data['label'].lower() in ('no', 'false'):
-                data['role'] = 'false branch'
-            else:
-                data['role'] = 'unknown'
+                # Fallback to relative position
+                source_geom = source_node.get('geometry', {})
+                target_geom = target_node.get('geometry', {})
+                source_x = source_geom.get('x', 0)
+                source_y = source_geom.get('y', 0)
+                target_x = target_geom.get('x', 0)
+                target_y = target_geom.get('y', 0)
                 
+                if target_y > source_y and abs(target_x - source_x) < target_geom.get('width', 0) / 2:
+                    data['role'] = 'body'  # Below the source (vertical alignment)
+                elif target_x > source_x and abs(target_y - source_y) < target_geom.get('height', 0) / 2:
+                    data['role'] = 'exit'  # To the right of the source (horizontal alignment)
+                else:
+                    data['role'] = 'unknown'
 
-def dfs(graph, start_node,current_node,visited):
-        if current_node in visited:
-            return False  # Already visited
-        if current_node == start_node:
-            return True  # Cycle detected
-        visited.add(current_node)
-        for successor in graph.successors(current_node):
-            if dfs(graph,start_node,successor,visited):
-                return True
-        return False
-    
-def exits_loop(graph, start_node,current_node,visited):
-    if current_node in visited:
-        return False  # Avoid cycles in traversal
-    visited.add(current_node)
-    for successor in graph.successors(current_node):
-        if any([graph.nodes[sccsr]['type'] in ('repeat_loop','for_each_loop') for sccsr in graph.successors(start_node)]):
-            if graph.edges[(start_node, current_node)]['label'].lower() == 'no':
-                return True
-        if graph.nodes[current_node]['type'] in ['repeat_loop', 'while_loop', 'for_each_loop']:
-            if graph.edges[(current_node,successor)]['role'] == 'body':
-                continue
-        if successor == start_node:
-            return False  # False branch cannot loop back
-        if not exits_loop(graph, start_node,successor,visited):
-            return False
-    return True
+    elif source_node['type'] == 'process':
+        data['role'] = 'u_def'
+    elif source_node['type'] == 'while_loop':
+        if data['label'].lower() in ('true', 'yes'):
+            data['role'] = 'body'
+        elif data['label'].lower() in ('false', 'no'):
+            data['role'] = 'exit'
+        else:
+            data['role'] = 'unknown'
+    elif source_node['type'] == 'decision':
+        if data['label'].lower() in ('yes', 'true'):
+            data['role'] = 'true branch'
+        elif data['label'].lower() in ('no', 'false'):
+            data['role'] = 'false branch'
+        else:
+            data['role'] = 'unknown'
+            
 
 def classify_loops(graph):
-    for node in graph.nodes():
-        if graph.nodes[node]['type'] == 'decision':
-            true_branch = None
-            
-            for successor, edge_data in graph[node].items():
-                label = edge_data.get('label', '').lower()
-                if label in ['yes', 'true']:
-                    true_branch = successor
-                elif label in ['no', 'false']:
-                    false_branch = successor
-            visited = set()
-            if dfs(graph, node, true_branch, visited):
-                visited.clear()
-                if exits_loop(graph, node, false_branch, visited):
-                    graph.nodes[node]['type'] = 'while_loop'
-    
+    """
+    Turns decisions into while loops when their true branch leads back to the
+    decision and their false branch leaves the loop.
+
+    Both questions are answered from the natural loops of the graph, found
+    once, see ``src.utils.graph_analysis.natural_loops``: a decision is a
+    while loop when the innermost loop it lies on holds its true branch but
+    not its false branch. The loop is usually headed by the connector that
+    joins the loop back edge, not by the decision. Paths that only come back
+    through an enclosing loop, such as the body of a repeat or for-each loop,
+    do not count.
+    """
+    bodies = innermost_loops(graph)
+    for node, node_type in graph.nodes(data='type'):
+        if node_type == 'decision':
+            classify_loop(graph, node, bodies)
+
+
+def innermost_loops(graph) -> Dict[Hashable, Set[Hashable]]:
+    """The body of the innermost natural loop of every node that lies on a loop."""
+    bodies = {}
+    # Outermost loops come first, so inner loops overwrite them
+    for loop in natural_loops(graph).loops.values():
+        body = set(loop.body)
+        for node in loop.body:
+            bodies[node] = body
+    return bodies
+
+
+def classify_loop(graph, node, bodies):
+    """
+    Turns one decision into a while loop if it is one, see ``classify_loops``.
+    ``bodies`` is the ``innermost_loops`` of the graph.
+    """
+    true_branch = None
+    false_branch = None
+
+    for successor, edge_data in graph[node].items():
+        label = edge_data.get('label', '').lower()
+        if label in ['yes', 'true']:
+            true_branch = successor
+        elif label in ['no', 'false']:
+            false_branch = successor
+    body = bodies.get(node)
+    if true_branch is None or body is None or true_branch not in body:
+        return
+    if false_branch is not None and false_branch not in body:
+        graph.nodes[node]['type'] = 'while_loop'
             
 if __name__ == "__main__":
-    file_path = os.path.abspath(r'C:\Users\orman\Documents\MimicHub\Pygorithm\tests\data\test.drawio')
+    file_path = os.path.join(os.path.dirname(__file__), '../../tests/data/test.drawio')
     graph = parse_drawio_file(file_path)
     map_labels_to_edges(graph)
     print('here')
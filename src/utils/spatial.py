@@ -0,0 +1,191 @@
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Grid cells scanned per query before falling back to a vectorized scan of all points
+MAX_SCANNED_CELLS = 4096
+
+
+class SpatialIndex:
+    """
+    Uniform grid over diagram positions for nearest-neighbour queries.
+
+    Points are bucketed by grid cell, one grid per node type. ``nearest``
+    searches rings of cells around the query until no unvisited cell can hold
+    a closer point, so a query touches a handful of cells on typical diagrams
+    instead of every node. Results are ordered by distance, then by insertion
+    order, so ties resolve the same way as a linear scan over the nodes.
+    """
+
+    def __init__(self, points: Iterable[Tuple[Hashable, str, float, float]], cell_size: Optional[float] = None):
+        """
+        Args:
+            points: ``(node_id, node_type, x, y)`` tuples.
+            cell_size: Grid cell size; by default chosen so that a cell holds
+                about two points.
+        """
+        self._ids: List[Hashable] = []
+        self._xy: List[Tuple[float, float]] = []
+        by_type: Dict[str, List[int]] = defaultdict(list)
+        for node_id, node_type, x, y in points:
+            by_type[node_type].append(len(self._ids))
+            self._ids.append(node_id)
+            self._xy.append((float(x), float(y)))
+        self._coords = np.array(self._xy, dtype=float).reshape(-1, 2)
+
+        if cell_size is None:
+            cell_size = self._default_cell_size()
+        self.cell_size = cell_size
+        self._grids = {node_type: _Grid(indexes, self._xy, cell_size) for node_type, indexes in by_type.items()}
+
+    @classmethod
+    def from_graph(cls, graph, node_types: Optional[Iterable[str]] = None, anchor: str = 'corner',
+                   cell_size: Optional[float] = None) -> 'SpatialIndex':
+        """
+        Builds an index from the ``geometry`` dicts of the graph nodes.
+
+        Args:
+            node_types: Only index nodes of these types (all typed nodes by default).
+            anchor: ``'corner'`` indexes the top-left corner, ``'center'`` the centre.
+        """
+        node_types = set(node_types) if node_types is not None else None
+        points = []
+        for node_id, data in graph.nodes(data=True):
+            node_type = data.get('type')
+            geometry = data.get('geometry')
+            if node_type is None or geometry is None or (node_types is not None and node_type not in node_types):
+                continue
+            x, y = geometry['x'], geometry['y']
+            if anchor == 'center':
+                x, y = x + 0.5 * geometry['width'], y + 0.5 * geometry['height']
+            points.append((node_id, node_type, x, y))
+        return cls(points, cell_size=cell_size)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _default_cell_size(self) -> float:
+        if len(self._xy) < 2:
+            return 1.0
+        span = self._coords.max(axis=0) - self._coords.min(axis=0)
+        area = max(float(span[0]), 1.0) * max(float(span[1]), 1.0)
+        return max(math.sqrt(2.0 * area / len(self._xy)), 1.0)
+
+    def _grids_for(self, node_type: Optional[str]):
+        if node_type is None:
+            return list(self._grids.values())
+        grid = self._grids.get(node_type)
+        return [grid] if grid is not None else []
+
+    def nearest(self, x: float, y: float, k: int = 1, node_type: Optional[str] = None) -> List[Tuple[Hashable, float]]:
+        """
+        Returns up to ``k`` ``(node_id, distance)`` pairs closest to ``(x, y)``,
+        optionally restricted to one node type.
+        """
+        found = []
+        for grid in self._grids_for(node_type):
+            found.extend(grid.nearest(x, y, k, self._coords))
+        found.sort()
+        return [(self._ids[index], distance) for distance, index in found[:k]]
+
+    def within(self, x: float, y: float, radius: float,
+               node_type: Optional[str] = None) -> List[Tuple[Hashable, float]]:
+        """
+        Returns the ``(node_id, distance)`` pairs at most ``radius`` away from
+        ``(x, y)``, closest first, optionally restricted to one node type.
+        """
+        found = []
+        for grid in self._grids_for(node_type):
+            found.extend(grid.within(x, y, radius))
+        found.sort()
+        return [(self._ids[index], distance) for distance, index in found]
+
+
+class _Grid:
+    """Points of one node type bucketed by grid cell."""
+
+    def __init__(self, indexes: List[int], xy: List[Tuple[float, float]], cell_size: float):
+        self.indexes = np.array(indexes, dtype=np.intp)
+        self.xy = xy
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for index in indexes:
+            self.cells[self._cell(*xy[index])].append(index)
+        keys = list(self.cells) or [(0, 0)]
+        self.min_cell = (min(key[0] for key in keys), min(key[1] for key in keys))
+        self.max_cell = (max(key[0] for key in keys), max(key[1] for key in keys))
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _distance(self, index: int, x: float, y: float) -> float:
+        px, py = self.xy[index]
+        dx, dy = px - x, py - y
+        return math.sqrt(dx * dx + dy * dy)
+
+    def _ring(self, cx: int, cy: int, r: int):
+        """Cells at Chebyshev distance ``r`` from ``(cx, cy)`` that fall inside the occupied range."""
+        lo_x, lo_y = self.min_cell
+        hi_x, hi_y = self.max_cell
+        if r == 0:
+            yield cx, cy
+            return
+        for gx in range(max(cx - r, lo_x), min(cx + r, hi_x) + 1):
+            if cy - r >= lo_y:
+                yield gx, cy - r
+            if cy + r <= hi_y:
+                yield gx, cy + r
+        for gy in range(max(cy - r + 1, lo_y), min(cy + r - 1, hi_y) + 1):
+            if cx - r >= lo_x:
+                yield cx - r, gy
+            if cx + r <= hi_x:
+                yield cx + r, gy
+
+    def _max_ring(self, cx: int, cy: int) -> int:
+        return max(abs(cx - self.min_cell[0]), abs(cx - self.max_cell[0]),
+                   abs(cy - self.min_cell[1]), abs(cy - self.max_cell[1]))
+
+    def nearest(self, x: float, y: float, k: int, coords: np.ndarray) -> List[Tuple[float, int]]:
+        if not len(self.indexes) or k <= 0:
+            return []
+        cx, cy = self._cell(x, y)
+        max_ring = self._max_ring(cx, cy)
+        best: List[Tuple[float, int]] = []
+        scanned = 0
+        for r in range(max_ring + 1):
+            for cell in self._ring(cx, cy, r):
+                scanned += 1
+                for index in self.cells.get(cell, ()):
+                    best.append((self._distance(index, x, y), index))
+            if len(best) >= k:
+                best.sort()
+                del best[k:]
+                # Unvisited cells are at least r whole cells away
+                if best[-1][0] < r * self.cell_size:
+                    return best
+            if scanned > MAX_SCANNED_CELLS:
+                return self._scan(x, y, k, coords)
+        best.sort()
+        return best[:k]
+
+    def _scan(self, x: float, y: float, k: int, coords: np.ndarray) -> List[Tuple[float, int]]:
+        delta = coords[self.indexes] - np.array([x, y])
+        distances = np.sqrt(np.einsum('nk,nk->n', delta, delta))
+        order = np.lexsort((self.indexes, distances))[:k]
+        return [(float(distances[i]), int(self.indexes[i])) for i in order]
+
+    def within(self, x: float, y: float, radius: float) -> List[Tuple[float, int]]:
+        if not len(self.indexes) or radius < 0:
+            return []
+        lo_x, lo_y = self._cell(x - radius, y - radius)
+        hi_x, hi_y = self._cell(x + radius, y + radius)
+        found = []
+        for gx in range(max(lo_x, self.min_cell[0]), min(hi_x, self.max_cell[0]) + 1):
+            for gy in range(max(lo_y, self.min_cell[1]), min(hi_y, self.max_cell[1]) + 1):
+                for index in self.cells.get((gx, gy), ()):
+                    distance = self._distance(index, x, y)
+                    if distance <= radius:
+                        found.append((distance, index))
+        return found
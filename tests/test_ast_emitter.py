@@ -0,0 +1,64 @@
+import ast
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+import src.pipeline
+from benchmarks.bench_converter import nested_graph
+from src.cache import ConversionCache, code_from_pyc, code_to_pyc, compile_file_cached
+from src.pipeline import compile_source, convert_source, convert_to_code, convert_to_module, graph_to_blocks
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def lines(tree):
+    return [(type(node).__name__, node.lineno, node.end_lineno) for node in ast.walk(tree) if hasattr(node, "lineno")]
+
+
+@pytest.mark.parametrize("name", ["test.drawio", "simpleExample.drawio", "multiPage.drawio"])
+def test_module_matches_the_parsed_text(name):
+    conversion = convert_source(os.path.join(DATA_DIR, name))
+    program = compile_source(os.path.join(DATA_DIR, name))
+
+    expected = ast.parse(conversion.code)
+    assert ast.dump(program.module) == ast.dump(expected), "The AST should be the one of the generated text"
+    assert lines(program.module) == lines(expected), "Nodes should span the lines they span in the text"
+    assert program.code.co_code == compile(conversion.code, program.code.co_filename, "exec").co_code
+    assert ast.dump(ast.parse(program.source())) == ast.dump(program.module), "source() should unparse the AST"
+
+
+def test_module_of_deep_nesting():
+    # The text generator hits the tokenizer's indentation limit at 100 levels
+    graph = nested_graph(150)
+    module = convert_to_module(graph_to_blocks(graph))
+
+    depth, node = 0, next(node for node in module.body if isinstance(node, ast.If))
+    while isinstance(node, ast.If):
+        depth, node = depth + 1, node.body[-1] if node.body else None
+    assert depth == 150, "Every decision should become a nested If"
+    compile(module, "<deep>", "exec")
+
+
+def test_syntax_errors_name_the_block():
+    from src.generator.compactBlocks import CompactBlock, DECISION
+
+    with pytest.raises(SyntaxError, match=r"block d1"):
+        convert_to_module([CompactBlock.new(DECISION, "d1", "x >")])
+    with pytest.raises(SyntaxError, match=r"expected an indented block \(block d2\)"):
+        convert_to_module([CompactBlock.new(DECISION, "d2", "x > 1")])
+
+
+def test_bytecode_cache_hit_skips_compilation(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / "cache")
+    file_path = os.path.join(DATA_DIR, "test.drawio")
+
+    code = compile_file_cached(file_path, cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("A cache hit must not compile again.")
+    monkeypatch.setattr(src.pipeline, "compile_source", fail)
+    cached = compile_file_cached(file_path, cache)
+    assert cached.co_code == code.co_code and cached.co_consts == code.co_consts
+    assert code_from_pyc(b"\0\0\0\0" + code_to_pyc(code, bytes(8))[4:]) is None, \
+        "Code written by another Python version should be a miss"
@@ -0,0 +1,68 @@
+import json
+import shutil
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.batch import collect_inputs, main, run_batch
+from src.cache import ConversionCache
+from src.pipeline import convert_file
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def test_collect_inputs(tmp_path):
+    nested = tmp_path / "nested"
+    nested.mkdir()
+    shutil.copy(os.path.join(DATA_DIR, "test.drawio"), tmp_path / "a.drawio")
+    shutil.copy(os.path.join(DATA_DIR, "simpleExample.drawio"), nested / "b.drawio")
+
+    assert collect_inputs([str(tmp_path)]) == [(tmp_path / "a.drawio").resolve(), (nested / "b.drawio").resolve()]
+    assert collect_inputs([str(tmp_path / "*.drawio"), str(tmp_path / "a.drawio")]) == [(tmp_path / "a.drawio").resolve()]
+
+
+def test_batch_writes_code_and_summary(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, "test.drawio"), tmp_path / "bubble.drawio")
+    shutil.copy(os.path.join(DATA_DIR, "simpleExample.drawio"), tmp_path / "sum.drawio")
+    (tmp_path / "broken.drawio").write_text("<mxfile><diagram>", encoding="utf-8")
+    summary_path = tmp_path / "summary.json"
+
+    exit_code = main([str(tmp_path), "--workers", "2", "--summary", str(summary_path)])
+
+    assert exit_code == 1, "A failed conversion should make the batch fail."
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+    statuses = {os.path.basename(entry["input"]): entry["status"] for entry in summary["files"]}
+    assert statuses == {"broken.drawio": "failed", "bubble.drawio": "ok", "sum.drawio": "ok"}
+    assert all(entry["seconds"] >= 0 for entry in summary["files"])
+    assert "sum = a + b" in (tmp_path / "sum.py").read_text(encoding="utf-8")
+    assert not (tmp_path / "broken.py").exists()
+
+
+def test_batch_scans_the_cache_once(tmp_path, monkeypatch):
+    files = []
+    for i in range(4):
+        files.append(tmp_path / f"diagram{i}.drawio")
+        shutil.copy(os.path.join(DATA_DIR, "test.drawio"), files[-1])
+        files[-1].write_text(files[-1].read_text(encoding="utf-8") + f"<!-- {i} -->", encoding="utf-8")
+    scans = []
+    size = ConversionCache.size
+    monkeypatch.setattr(ConversionCache, "size", lambda self: scans.append(self) or size(self))
+
+    options = {"directory": tmp_path / "cache", "max_bytes": 2 ** 20, "store_artifacts": False}
+    summary = run_batch(files, workers=1, cache_options=options)
+
+    assert summary["succeeded"] == 4
+    assert len(scans) == 1, "The cache directory should be scanned once per worker, not once per file"
+
+
+def test_batch_release_code(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, "test.drawio"), tmp_path / "bubble.drawio")
+    summary_path = tmp_path / "summary.json"
+    expected = convert_file(tmp_path / "bubble.drawio", debugger=False)
+
+    for cache in ([], ["--cache-dir", str(tmp_path / "cache")]):
+        assert main([str(tmp_path / "bubble.drawio"), "--workers", "1", "--release", "--summary", str(summary_path),
+                     *cache]) == 0
+        assert (tmp_path / "bubble.py").read_text(encoding="utf-8") == expected, \
+            f"--release should write code without the debugger calls (cache: {bool(cache)})"
@@ -0,0 +1,62 @@
+import os
+import shutil
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+import src.pipeline
+from src.cache import ConversionCache, convert_file_cached
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def test_key_depends_on_content_and_options():
+    key = ConversionCache.make_key(b"<mxfile/>", {"page": None})
+
+    assert key == ConversionCache.make_key(b"<mxfile/>", {"page": None})
+    assert key != ConversionCache.make_key(b"<mxfile />", {"page": None})
+    assert key != ConversionCache.make_key(b"<mxfile/>", {"page": 1})
+
+
+def test_hit_skips_conversion(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / "cache")
+    file_path = os.path.join(DATA_DIR, "simpleExample.drawio")
+
+    code = convert_file_cached(file_path, cache, store_artifacts=True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("A cache hit must not convert again.")
+    monkeypatch.setattr(src.pipeline, "convert_source", fail)
+    assert convert_file_cached(file_path, cache) == code
+    with open(file_path, "rb") as f:
+        artifacts = cache.get_artifacts(cache.make_key(f.read(), {"page": None}))
+    assert set(artifacts) == {"graph", "blocks"}
+    assert artifacts["graph"].number_of_nodes() == 6
+
+
+def test_changed_diagram_misses(tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    file_path = tmp_path / "diagram.drawio"
+    shutil.copy(os.path.join(DATA_DIR, "simpleExample.drawio"), file_path)
+    convert_file_cached(file_path, cache)
+
+    file_path.write_text(file_path.read_text(encoding="utf-8").replace("sum = a + b", "sum = a - b"),
+                         encoding="utf-8")
+
+    assert "sum = a - b" in convert_file_cached(file_path, cache)
+
+
+def test_lru_eviction(tmp_path):
+    cache = ConversionCache(tmp_path / "cache", max_bytes=250)
+    cache.put("a" * 64, "x" * 100)
+    cache.put("b" * 64, "x" * 100)
+    os.utime(cache._path("a" * 64, ".py"), (1, 1))
+    os.utime(cache._path("b" * 64, ".py"), (2, 2))
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a" * 64) == "x" * 100
+
+    cache.put("c" * 64, "x" * 100)
+
+    assert cache.get("b" * 64) is None, "The least recently used entry should be evicted."
+    assert cache.get("a" * 64) is not None and cache.get("c" * 64) is not None
+    assert cache.size() <= 250
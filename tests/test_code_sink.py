@@ -0,0 +1,49 @@
+import io
+import os
+import socket
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.generator.codeSink import CodeSink
+from src.pipeline import convert_file, write_file
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+
+
+class RecordingFile(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+def test_streamed_code_matches_convert_file(tmp_path):
+    expected = convert_file(TEST_FILE)
+
+    text = io.StringIO()
+    write_file(TEST_FILE, text)
+    write_file(TEST_FILE, tmp_path / "out.py")
+
+    assert text.getvalue() == expected
+    assert (tmp_path / "out.py").read_text(encoding="utf-8") == expected
+
+
+def test_sink_writes_in_buffered_pieces():
+    target = RecordingFile()
+    with CodeSink(target, buffer_size=10) as sink:
+        for i in range(100):
+            sink.write(f"line {i}\n")
+        assert target.writes > 10, "Full buffers should reach the target before the sink is closed"
+
+    assert target.getvalue().decode() == "".join(f"line {i}\n" for i in range(100))
+
+
+def test_sink_sends_to_sockets():
+    receiver, sender = socket.socketpair()
+    with receiver, sender:
+        with CodeSink(sender) as sink:
+            sink.write("print('ä')\n")
+        assert receiver.recv(100) == "print('ä')\n".encode("utf-8")
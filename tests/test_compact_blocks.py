@@ -0,0 +1,58 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.parser.drawio_parser import parse_drawio_file
+from src.utils.matching import map_labels_to_edges
+from src.generator.graph2block import G2BConverter
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from src.generator.blockModel import IfStatement, RepeatLoop, WhileLoop
+from src.generator.compactBlocks import CompactBlock, DECISION, PROCESS
+from src.pipeline import convert_file, find_starting_node
+from benchmarks.bench_converter import nested_graph
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def entries(blocks):
+    cgm = CodeGenerationManager()
+    for block in blocks:
+        cgm.add_block(block)
+    return cgm.process_blocks()
+
+
+def test_models_and_compact_blocks_generate_the_same_code():
+    graph = parse_drawio_file(os.path.join(DATA, "test.drawio"))
+    map_labels_to_edges(graph)
+    converter = G2BConverter(graph)
+    start = find_starting_node(graph)
+
+    models = [block[0] for block in converter.graph_to_blocks(start)]
+    compact = [block[0] for block in converter.graph_to_blocks(start, compact=True)]
+
+    assert isinstance(models[2], RepeatLoop) and isinstance(compact[2], CompactBlock)
+    assert isinstance(models[2].body[2], WhileLoop)
+    assert entries(models) == entries(compact)
+    assert [CompactBlock.from_model(block.to_model()) for block in compact] == compact, "Round trip should be lossless"
+
+
+def test_compact_blocks_have_no_instance_dict():
+    block = CompactBlock.new(DECISION, "7", "x > 1")
+
+    assert not hasattr(block, "__dict__")
+    assert block.body == [] and block.orelse == []
+    assert isinstance(block.to_model(), IfStatement)
+
+
+def test_deep_trees_convert_without_recursion():
+    depth = sys.getrecursionlimit() * 2
+    root = G2BConverter(nested_graph(depth)).graph_to_blocks("start", compact=True)[0][0]
+
+    generated = entries([root])
+    assert len(generated) == 3 * depth + 1, \
+        "Every decision emits its condition, an else and the else branch, the last one a 'pass' before the else"
+    assert generated[depth - 1] == [f"d{depth - 1}", depth - 1, [f"if x > {depth - 1}:"]]
+    assert generated[-2:] == [["d0", 0, ["else:"]], ["p0", 1, ["x = 0"]]]
+    model = root.to_model()
+    assert CompactBlock.from_model(model).body[0].body[0].kind == DECISION
+    assert CompactBlock(PROCESS, text="pass").code == ["pass"]
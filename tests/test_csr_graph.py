@@ -0,0 +1,74 @@
+import copy
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+import numpy as np
+
+from benchmarks.bench_validator import nested_loop_graph
+from benchmarks.synthetic import write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser.snapshot import load_snapshot, save_snapshot
+from src.parser.validator import validate_graph
+from src.pipeline import convert_graph
+from src.utils.csr_graph import CSRGraph
+from src.utils.graph_analysis import natural_loops
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+
+
+def as_lists(graph):
+    return ([(node, dict(data)) for node, data in graph.nodes(data=True)],
+            [(source, target, dict(data)) for source, target, data in graph.edges(data=True)],
+            [list(graph.predecessors(node)) for node in graph])
+
+
+def test_networkx_round_trip_keeps_order_and_attributes():
+    graph = nx.DiGraph()
+    graph.add_edge('c', 'a', style='s1')
+    graph.add_node('a', type='process')
+    graph.add_edge('b', 'a')
+    graph.add_edge('a', 'b', label='Yes')
+    csr = CSRGraph.from_networkx(graph)
+
+    assert as_lists(csr) == as_lists(graph), "Nodes, edges and predecessors should keep their order"
+    assert as_lists(csr.to_networkx()) == as_lists(graph), "to_networkx should restore the graph"
+    assert list(csr['a'].items()) == [('b', {'label': 'Yes'})] and csr.has_edge('c', 'a')
+    assert csr.in_degrees.tolist() == [0, 2, 1] and csr.out_degrees.tolist() == [1, 1, 1]
+
+    csr.nodes['c']['type'] = 'terminator'
+    csr.edges['c', 'a']['role'] = 'exit'
+    del csr.edges['c', 'a']['style']
+    assert csr.nodes['c'] == {'type': 'terminator'} and 'type' not in csr.nodes['b']
+    assert list(csr.edges(data='role')) == [('c', 'a', 'exit'), ('a', 'b', None), ('b', 'a', None)]
+    assert csr.to_networkx().edges['c', 'a'] == {'role': 'exit'}, "Attribute changes should be kept"
+
+
+def test_pipeline_and_validation_run_on_csr_graphs(tmp_path):
+    for file_path in (TEST_FILE, write_synthetic_diagram(tmp_path / "mixed.drawio", 'mixed', 300)):
+        graph = parse_drawio_file(file_path)
+        save_snapshot(graph, tmp_path / "graph.f2c")
+        expected = convert_graph(copy.deepcopy(graph))
+        annotated = as_lists(expected.graph)
+        # Validation marks loops, so it runs on the annotated graph after the comparison
+        errors = validate_graph(expected.graph, expected.graph.nodes)
+        for csr in (CSRGraph.from_networkx(graph), CSRGraph.from_snapshot(load_snapshot(tmp_path / "graph.f2c"))):
+            assert convert_graph(csr).code == expected.code, "CSR graphs should convert to the same code"
+            assert as_lists(csr) == annotated, "CSR graphs should be annotated the same way"
+            assert validate_graph(csr, csr.nodes) == errors, "CSR graphs should give the same validation errors"
+
+
+def test_loops_and_connectivity_from_arrays():
+    graph, _ = nested_loop_graph(3, 4)
+    csr = CSRGraph.from_networkx(graph)
+    expected, found = natural_loops(graph), natural_loops(csr)
+
+    assert found.loops == expected.loops and found.irreducible_edges == expected.irreducible_edges, \
+        "Loops found over node numbers should be keyed by node id"
+    assert csr.is_weakly_connected()
+    graph.add_edge('x', 'y')
+    assert not CSRGraph.from_networkx(graph).is_weakly_connected(), "A separate edge should disconnect the graph"
+    codes, values = csr.type_codes()
+    assert [values[code] for code in codes.tolist()] == [data['type'] for _, data in csr.nodes(data=True)]
+    assert np.array_equal(csr.predecessor_indices(csr.index['end']), [csr.index['while0']])
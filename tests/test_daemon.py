@@ -0,0 +1,97 @@
+import asyncio
+import os
+import shutil
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.daemon import WatchDaemon, request
+from src.pipeline import convert_file
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+
+
+async def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the daemon"
+        await asyncio.sleep(0.01)
+
+
+def test_daemon_converts_changed_diagrams(tmp_path):
+    diagram = tmp_path / "diagram.drawio"
+    shutil.copy(TEST_FILE, diagram)
+    socket_path = tmp_path / "daemon.sock"
+
+    async def scenario():
+        daemon = WatchDaemon([tmp_path], workers=0, debounce=0.05, interval=0.02, use_inotify=False)
+        await daemon.start(socket_path)
+        try:
+            document = daemon.documents[diagram.resolve()]
+            assert document.version == 1, "Watched diagrams should be converted on start"
+            assert diagram.with_suffix('.py').read_text(encoding='utf-8') == convert_file(diagram), \
+                "The code should be written next to the diagram"
+
+            diagram.write_text(diagram.read_text(encoding='utf-8').replace('ln=len(data)', 'ln=len(data)+0'),
+                               encoding='utf-8')
+            await wait_for(lambda: document.version == 2)
+            assert document.mode == "incremental", "A relabelled block should be converted incrementally"
+
+            response = await asyncio.to_thread(request, {"op": "convert", "path": str(diagram)}, socket_path)
+            assert response["ok"] and response["version"] == 2, f"Unexpected response: {response}"
+            assert response["code"] == convert_file(diagram), "Served code should match a full conversion"
+            assert diagram.with_suffix('.py').read_text(encoding='utf-8') == response["code"], \
+                "The written code should be updated"
+
+            status = await asyncio.to_thread(request, {"op": "status"}, socket_path)
+            assert [entry["path"] for entry in status["documents"]] == [str(diagram.resolve())], \
+                "Status should list the watched diagram"
+        finally:
+            await daemon.close()
+
+    asyncio.run(scenario())
+
+
+def test_daemon_converts_in_worker_processes(tmp_path):
+    diagram = tmp_path / "diagram.drawio"
+    shutil.copy(TEST_FILE, diagram)
+
+    async def scenario():
+        daemon = WatchDaemon([diagram], workers=1, write_output=False, use_inotify=False)
+        await daemon.start()
+        try:
+            response = await daemon.handle_request({"op": "convert", "path": str(diagram)})
+        finally:
+            await daemon.close()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response["ok"] and response["code"] == convert_file(diagram), "Worker processes should convert diagrams"
+    assert not diagram.with_suffix('.py').exists(), "No code should be written with write_output=False"
+
+
+def test_daemon_release_code(tmp_path):
+    diagram = tmp_path / "diagram.drawio"
+    shutil.copy(TEST_FILE, diagram)
+
+    async def scenario():
+        daemon = WatchDaemon([diagram], workers=1, use_inotify=False, debugger=False)
+        await daemon.start()
+        await daemon.close()
+
+    asyncio.run(scenario())
+    assert diagram.with_suffix('.py').read_text(encoding='utf-8') == convert_file(diagram, debugger=False), \
+        "The daemon should write code without the debugger calls when asked to"
+
+def test_daemon_reports_errors(tmp_path):
+    async def scenario():
+        daemon = WatchDaemon([], workers=0, use_inotify=False)
+        try:
+            return (await daemon.handle_request({"op": "frobnicate"}),
+                    await daemon.handle_request({"op": "convert", "path": str(tmp_path / "missing.drawio")}))
+        finally:
+            await daemon.close()
+
+    unknown, missing = asyncio.run(scenario())
+    assert not unknown["ok"] and "frobnicate" in unknown["error"], "Unknown ops should be rejected"
+    assert not missing["ok"] and missing["error"], "Failed conversions should report their error"
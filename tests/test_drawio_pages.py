@@ -0,0 +1,56 @@
+import io
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser import drawio_pages
+from src.parser.drawio_pages import DrawioDocument
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def assert_same_graph(graph, expected):
+    assert list(graph.nodes(data=True)) == list(expected.nodes(data=True)), "Node attributes differ."
+    assert list(graph.edges(data=True)) == list(expected.edges(data=True)), "Edge attributes differ."
+
+
+def test_lists_pages_without_decoding():
+    document = DrawioDocument(os.path.join(DATA_DIR, "multiPage.drawio"))
+
+    assert document.page_names == ["Sum", "Plain sum", "Bubble sort"]
+    assert [page.compressed for page in document.pages] == [True, False, True]
+
+
+def test_pages_by_index_and_name():
+    document = DrawioDocument(os.path.join(DATA_DIR, "multiPage.drawio"))
+    simple = parse_drawio_file(os.path.join(DATA_DIR, "simpleExample.drawio"))
+    bubble = parse_drawio_file(os.path.join(DATA_DIR, "test.drawio"))
+
+    assert_same_graph(document.graph(0), simple)
+    assert_same_graph(document.graph("Plain sum"), simple)
+    assert_same_graph(document.graph("Bubble sort"), bubble)
+    assert_same_graph(parse_drawio_file(os.path.join(DATA_DIR, "multiPage.drawio"), page=-1), bubble)
+
+    with pytest.raises(KeyError):
+        document.graph("Missing page")
+
+
+def test_small_chunks(monkeypatch):
+    # Chunk boundaries land inside base64 quads, deflate blocks and %XX escapes
+    monkeypatch.setattr(drawio_pages, "B64_CHUNK", 8)
+    monkeypatch.setattr(drawio_pages, "INFLATE_CHUNK", 5)
+    document = DrawioDocument(os.path.join(DATA_DIR, "multiPage.drawio"))
+
+    assert_same_graph(document.graph("Bubble sort"), parse_drawio_file(os.path.join(DATA_DIR, "test.drawio")))
+
+
+def test_bare_graph_model():
+    with open(os.path.join(DATA_DIR, "simpleExample.drawio"), encoding="utf-8") as f:
+        content = f.read()
+    model = content[content.index("<mxGraphModel"):content.index("</mxGraphModel>") + len("</mxGraphModel>")]
+    document = DrawioDocument(io.BytesIO(model.encode("utf-8")))
+
+    assert len(document) == 1
+    assert_same_graph(document.graph(0), parse_drawio_file(os.path.join(DATA_DIR, "simpleExample.drawio")))
@@ -0,0 +1,126 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+import pytest
+
+from src.generator.graph2block import G2BConverter, flatten
+from src.generator.blockModel import Block, IfStatement, RepeatLoop
+from src.generator.CodeGenerationManager import CodeGenerationManager
+from src.pipeline import code_generator, convert_to_code, graph_to_blocks
+from benchmarks.bench_converter import chain_graph, elif_graph, loop_graph, nested_graph
+
+
+def test_chain_longer_than_recursion_limit():
+    n = sys.getrecursionlimit() * 2
+    blocks = G2BConverter(chain_graph(n)).graph_to_blocks('start')
+
+    assert [block[0].p_code for block in blocks[:-1]] == [f'x{i} = {i}' for i in range(n)]
+    assert blocks[-1][0].p_code == 'pass', "The END terminator should become a pass block"
+
+
+def test_loop_body_in_order():
+    blocks = G2BConverter(loop_graph(5)).graph_to_blocks('start')
+
+    loop = blocks[0][0]
+    assert isinstance(loop, RepeatLoop)
+    assert [block.p_code for block in loop.body] == [f'x{i} = {i}' for i in range(5)]
+
+
+def test_deeply_nested_decisions():
+    depth = sys.getrecursionlimit() * 2
+    blocks = G2BConverter(nested_graph(depth)).graph_to_blocks('start')
+
+    # The main flow continues where all branches join, and the join is not repeated inside the decisions
+    assert [type(tree[0]) for tree in blocks] == [IfStatement, Block, Block]
+    assert (blocks[1][0].block_id, blocks[1][0].p_code) == ('join', 'y = 0')
+    block_ids = [entry[0] for tree in blocks for entry in CodeGenerationManager().iter_block(tree[0])]
+    assert block_ids.count('join') == 1, "The join point should be emitted once"
+    block, levels = blocks[0][0], 0
+    while isinstance(block, IfStatement):
+        assert [branch.p_code for branch in block.false_branch_body] == [f'x = {levels}']
+        block = block.true_branch_body[0]
+        levels += 1
+    assert levels == depth
+    assert block.p_code == 'pass', "The last 'Yes' branch goes straight to the join point"
+
+
+def if_else_graph():
+    graph = nx.DiGraph()
+    for node_id, node_type, label in [('start', 'terminator', 'START'), ('d', 'decision', 'x > 0'),
+                                      ('a1', 'process', 'a = 1'), ('a2', 'process', 'a = a + 1'),
+                                      ('b', 'process', 'b = 2'), ('j', 'process', 'c = 3'),
+                                      ('end', 'terminator', 'END')]:
+        graph.add_node(node_id, type=node_type, label=label)
+    graph.add_edge('start', 'd')
+    graph.add_edge('d', 'a1', label='Yes', role='true branch')
+    graph.add_edge('d', 'b', label='No', role='false branch')
+    graph.add_edge('a1', 'a2', role='u_def')
+    graph.add_edge('a2', 'j', role='u_def')
+    graph.add_edge('b', 'j', role='u_def')
+    graph.add_edge('j', 'end', role='u_def')
+    return graph
+
+
+def test_top_level_if_else_code():
+    graph = if_else_graph()
+    code = convert_to_code(code_generator(graph_to_blocks(graph)).iter_entries(), debugger=False)
+
+    assert code == 'if x > 0:\n    a = 1\n    a = a + 1\nelse:\n    b = 2\nc = 3\npass', \
+        "Each branch should hold its blocks up to the join point, which follows the if once"
+    for x, expected in [(1, {'a': 2, 'c': 3}), (0, {'b': 2, 'c': 3})]:
+        namespace = {'x': x}
+        exec(code, namespace)
+        assert {name: namespace[name] for name in 'abc' if name in namespace} == expected
+
+    # A branch going straight to the join point
+    graph.remove_edge('d', 'b')
+    graph.add_edge('d', 'j', label='No', role='false branch')
+    code = convert_to_code(code_generator(graph_to_blocks(graph)).iter_entries(), debugger=False)
+    assert code == 'if x > 0:\n    a = 1\n    a = a + 1\nelse:\n    pass\nc = 3\npass'
+
+
+def test_flatten_deep_lists():
+    nested = [1]
+    for i in range(2, sys.getrecursionlimit() * 2):
+        nested = [nested, i]
+
+    assert flatten([0, nested, []]) == list(range(sys.getrecursionlimit() * 2))
+
+
+def test_main_flow_converts_each_node_once():
+    graph = elif_graph(50)
+    converter = G2BConverter(graph)
+    visits = []
+    original = converter._visit
+    converter._visit = lambda node_id, visited: visits.append(node_id) or original(node_id, visited)
+    blocks = converter.graph_to_blocks('start', compact=True)
+
+    assert [(tree[0].block_id, tree[0].text) for tree in blocks] == [('d0', 'x == 0'), ('-1', 'pass')], \
+        "The elif chain should be one tree, followed by END where its branches join"
+    block = blocks[0][0]
+    for i in range(50):
+        assert [(branch.block_id, branch.text) for branch in block.body] == [(f'p{i}', f'y = {i}')]
+        assert len(block.orelse) == 1
+        block = block.orelse[0]
+    assert (block.block_id, block.text) == ('-1', 'pass'), "The last 'No' branch goes straight to END"
+    assert sorted(visits) == sorted(node_id for node_id in graph if node_id != 'start'), \
+        "Each node should be converted once"
+
+
+def test_no_shared_state_between_conversions():
+    assert not hasattr(G2BConverter, 'visited'), "Conversion state should not live on the class"
+    with pytest.raises(TypeError):
+        G2BConverter.block_map['process'] = None
+
+    graphs = [elif_graph(30), nested_graph(200), loop_graph(100), chain_graph(300)] * 4
+    converter = G2BConverter(graphs[0])
+    expected = [G2BConverter(graph).graph_to_blocks('start') for graph in graphs]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda graph: G2BConverter(graph).graph_to_blocks('start'), graphs))
+        same_converter = list(pool.map(lambda _: converter.graph_to_blocks('start'), range(8)))
+
+    assert results == expected, "Concurrent conversions should match sequential ones"
+    assert all(blocks == expected[0] for blocks in same_converter), "A converter should be reusable from threads"
@@ -0,0 +1,70 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+from src.utils.graph_analysis import immediate_dominators, natural_loops, strongly_connected_components
+from src.parser.validator import detect_loops, validate_loops
+from benchmarks.bench_validator import nested_loop_graph
+
+
+def test_sccs_match_networkx():
+    graph = nx.gnp_random_graph(200, 0.015, seed=3, directed=True)
+    component = strongly_connected_components(graph)
+
+    expected = {frozenset(scc) for scc in nx.strongly_connected_components(graph)}
+    found = {}
+    for node, number in component.items():
+        found.setdefault(number, set()).add(node)
+    assert {frozenset(scc) for scc in found.values()} == expected
+    for source, target in graph.edges:
+        assert component[source] >= component[target], "Components are not in reverse topological order"
+
+
+def test_dominators_match_networkx():
+    graph = nx.gnp_random_graph(150, 0.03, seed=5, directed=True)
+    graph.add_edges_from([(-1, node) for node in graph if node % 10 == 0])
+    reachable = nx.descendants(graph, -1) | {-1}
+    graph = graph.subgraph(reachable).copy()
+
+    idom = immediate_dominators(graph)
+    expected = nx.immediate_dominators(graph, -1)
+    assert idom[-1] is None
+    assert all(idom[node] == expected[node] for node in graph if node != -1)
+
+
+def test_nested_loops_reported_once():
+    graph, nodes = nested_loop_graph(depth=3, diamonds=2)
+
+    analysis = natural_loops(graph)
+
+    assert list(analysis.loops) == ["while0", "while1", "while2"], "Each loop should be found once, outermost first"
+    assert not analysis.irreducible_edges
+    inner = analysis.loops["while2"]
+    assert inner.back_edges == [("join2_1", "while2")]
+    assert set(inner.body) == {"while2"} | {f"{kind}2_{i}" for kind in ("if", "yes", "no", "join") for i in range(2)}
+    assert analysis.loops["while1"].children == ["while2"]
+    assert set(inner.body) < set(analysis.loops["while0"].body)
+
+
+def test_exponential_cycle_count_validates_quickly():
+    # 2 ** 60 elementary cycles: enumerating them would never finish
+    graph, nodes = nested_loop_graph(depth=2, diamonds=30)
+
+    assert validate_loops(graph, nodes) == []
+    assert nodes["yes1_29"].get("is_loop"), "Loop body nodes should be marked"
+    assert graph.edges["join1_29", "while1"].get("is_loop"), "Back edges should be marked"
+    assert not graph.edges["while0", "end"].get("is_loop"), "Loop exits should not be marked"
+
+
+def test_irreducible_cycle_is_reported():
+    graph = nx.DiGraph([("start", "a"), ("start", "b"), ("a", "b"), ("b", "a")])
+    nodes = {node: {"type": "process"} for node in graph}
+    nodes["start"]["type"] = "decision"
+
+    loops, irreducible_edges = detect_loops(graph, nodes)
+
+    assert loops == []
+    assert len(irreducible_edges) == 1
+    assert "more than one entry" in validate_loops(graph, nodes)[0]
+
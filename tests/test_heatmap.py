@@ -0,0 +1,67 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+from src.heatmap import HOT, NOT_RUN, heat_color, write_heatmap
+from src.parser.drawio_pages import DrawioDocument
+from src.parser.drawio_parser import parse_drawio_file
+from src.pipeline import convert_file
+from src.runtime import Tracer, load_program, new_namespace
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TEST_FILE = os.path.join(DATA_DIR, "test.drawio")
+
+
+def traced(file_path, page=None, answer="5,2,9,1"):
+    tracer = Tracer(load_program(file_path, page=page))
+    namespace = new_namespace()
+    namespace["input"] = lambda prompt="": answer
+    namespace["print"] = lambda *args, **kwargs: None
+    tracer.run(namespace)
+    return tracer
+
+
+def test_heatmap_colours_and_tooltips_every_block(tmp_path):
+    tracer = traced(TEST_FILE)
+    target = tmp_path / "heatmap.drawio"
+    assert write_heatmap(TEST_FILE, target, tracer.stats, metric="hits") == len(tracer.stats)
+
+    wrappers = {wrapper.get("id"): wrapper for wrapper in ET.parse(target).getroot().iter("UserObject")}
+    assert set(wrappers) == set(tracer.stats), "Every block should be wrapped to carry a tooltip"
+    hottest = max(tracer.stats.values(), key=lambda stats: stats.hits)
+    for block_id, stats in tracer.stats.items():
+        wrapper = wrappers[block_id]
+        style = wrapper.find("mxCell").get("style")
+        assert wrapper.get("tooltip").startswith(f"{stats.hits} hit"), "The tooltip should give the hits"
+        if stats is hottest:
+            assert f"fillColor={heat_color(1)};" in style and heat_color(1) == "#%02x%02x%02x" % HOT
+        elif not stats.hits:
+            assert f"fillColor={NOT_RUN};" in style
+    exported = json.loads(json.dumps(tracer.to_json()))
+    assert {row["block_id"]: row["hits"] for row in exported} == {key: stats.hits for key, stats in tracer.stats.items()}
+
+
+def test_heatmap_copy_converts_to_the_same_code(tmp_path):
+    target = tmp_path / "heatmap.drawio"
+    write_heatmap(TEST_FILE, target, traced(TEST_FILE).stats)
+
+    graph, copy = parse_drawio_file(TEST_FILE), parse_drawio_file(target)
+    assert dict(copy.nodes(data=True)) == dict(graph.nodes(data=True)), "Wrapped cells should keep their id and label"
+    assert parse_drawio_file(target, streaming=True).nodes(data=True) == copy.nodes(data=True)
+    assert convert_file(target) == convert_file(TEST_FILE), "The heatmap should not change the program"
+
+
+@pytest.mark.parametrize("page", [0, "Bubble sort"])
+def test_heatmap_of_a_compressed_page(tmp_path, page):
+    file_path = os.path.join(DATA_DIR, "multiPage.drawio")
+    assert DrawioDocument(file_path).get_page(page).compressed
+    target = tmp_path / "heatmap.drawio"
+    tracer = traced(file_path, page=page, answer="3")
+    assert write_heatmap(file_path, target, tracer.stats, page=page) == len(tracer.stats)
+
+    assert not DrawioDocument(target).get_page(page).compressed, "The page should be written back as plain XML"
+    assert convert_file(target, page=page) == convert_file(file_path, page=page)
@@ -0,0 +1,126 @@
+import os
+import re
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+from src.incremental import IncrementalConverter
+from src.pipeline import convert_file
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+
+
+def read_diagram():
+    with open(TEST_FILE, encoding="utf-8") as f:
+        return f.read()
+
+
+def set_label(xml, cell_id, label):
+    return re.sub(r'(<mxCell id="%s" value=")[^"]*"' % cell_id, r'\g<1>%s"' % label, xml)
+
+
+def move(xml, cell_id, x, y):
+    return re.sub(r'(<mxCell id="%s" [^>]*>\s*<mxGeometry )x="[^"]*" y="[^"]*"' % cell_id,
+                  r'\g<1>x="%s" y="%s"' % (x, y), xml)
+
+
+def edit_and_update(tmp_path, edit, debugger=True):
+    """Converts the test diagram, applies ``edit`` to it and updates the conversion."""
+    path = tmp_path / "diagram.drawio"
+    xml = read_diagram()
+    path.write_text(xml, encoding="utf-8")
+    converter = IncrementalConverter(debugger=debugger)
+    converter.update(path)
+    before = converter.code
+
+    path.write_text(edit(xml), encoding="utf-8")
+    result = converter.update(path)
+    return converter, result, before, convert_file(path, debugger=debugger)
+
+
+def apply_patches(code, patches):
+    lines = code.split('\n')
+    for patch in reversed(patches):
+        lines[patch.start:patch.stop] = patch.lines
+    return '\n'.join(lines)
+
+
+def test_relabelled_block_is_patched_in_place(tmp_path):
+    converter, result, before, expected = edit_and_update(tmp_path, lambda xml: set_label(xml, 19, "ln=len(data)+0"))
+
+    assert result.mode == "incremental", "A relabelled process block should not need a full conversion"
+    assert result.rebuilt_trees == 0 and result.patched_blocks == 1, "Only the relabelled block should change"
+    assert converter.code == expected, "Incremental code should match a full conversion"
+    assert apply_patches(before, result.patches) == expected, "Patches should turn the old code into the new one"
+    lines = converter.code.split('\n')
+    assert "ln=len(data)+0" in [lines[i] for i in converter.line_ranges('19')[0]], \
+        "line_ranges should locate the lines of the block"
+
+
+def test_release_code_is_patched_in_place(tmp_path):
+    converter, result, before, expected = edit_and_update(
+        tmp_path, lambda xml: set_label(move(xml, 55, 480, 720), 19, "ln=len(data)+0"), debugger=False)
+
+    assert result.mode == "incremental" and result.rebuilt_trees == 1 and result.patched_blocks == 1
+    assert "custom_debugger" not in before, "Release code should have no debugger calls"
+    assert converter.code == expected, "Incremental release code should match a full conversion"
+    assert apply_patches(before, result.patches) == expected, "Patches should start at the first line of the code"
+    lines = converter.code.split('\n')
+    assert "ln=len(data)+0" in [lines[i] for i in converter.line_ranges('19')[0]]
+
+
+def test_moved_label_rebuilds_decision(tmp_path):
+    # Move the 'Yes' label of the outer decision next to the inner one
+    converter, result, before, expected = edit_and_update(tmp_path, lambda xml: move(xml, 55, 480, 720))
+
+    assert result.mode == "incremental", "Moving a label should not need a full conversion"
+    assert result.rebuilt_trees == 1, "Only the tree holding the decision should be rebuilt"
+    assert converter.code == expected, "Incremental code should match a full conversion"
+    assert apply_patches(before, result.patches) == expected, "Patches should turn the old code into the new one"
+
+
+def test_structural_edit_falls_back_to_full_conversion(tmp_path):
+    extra = ('<mxCell id="999" value="x" style="text;" parent="1" vertex="1">'
+             '<mxGeometry x="0" y="0" width="1" height="1" as="geometry" /></mxCell>')
+    converter, result, _, expected = edit_and_update(
+        tmp_path, lambda xml: xml.replace('<mxCell id="55" ', extra + '<mxCell id="55" '))
+
+    assert result.mode == "full", "Adding a cell should trigger a full conversion"
+    assert converter.code == expected, "Full conversion should match convert_file"
+
+
+def test_unchanged_diagram(tmp_path):
+    converter, result, before, expected = edit_and_update(tmp_path, lambda xml: xml)
+
+    assert result.mode == "unchanged" and not result.patches, "An unchanged diagram should produce no patches"
+    assert before == converter.code == expected, "Code should stay the same"
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_two_relabelled_blocks_in_one_tree(tmp_path, monkeypatch, reverse):
+    # Block 26 shrinks from three lines to one, block 33 comes after it in the same tree.
+    # Relabelled nodes come in set order, so try both orders
+    patch_content = IncrementalConverter._patch_content
+    monkeypatch.setattr(IncrementalConverter, "_patch_content", lambda self, content, *args: patch_content(
+        self, sorted(content, key=int, reverse=reverse), *args))
+    converter, result, before, expected = edit_and_update(
+        tmp_path, lambda xml: set_label(set_label(xml, 26, "tmp = 0"), 33, "i = i + 2"))
+
+    assert result.mode == "incremental" and result.patched_blocks == 2
+    assert converter.code == expected, "Incremental code should match a full conversion"
+    assert all(a.stop <= b.start for a, b in zip(result.patches, result.patches[1:])), "Patches should not overlap"
+    assert apply_patches(before, result.patches) == expected, "Patches should be in the coordinates of the old code"
+
+
+def test_relabel_before_a_changed_main_flow(tmp_path, monkeypatch):
+    # Handle the relabelled output block 43 as a change of the main flow, so the
+    # trees from 43 on are replaced while block 19 before them is relabelled
+    patch = IncrementalConverter._patch
+    monkeypatch.setattr(IncrementalConverter, "_patch", lambda self, structural, content, result: patch(
+        self, structural + [n for n in content if n == "43"], [n for n in content if n != "43"], result))
+    converter, result, before, expected = edit_and_update(
+        tmp_path, lambda xml: set_label(set_label(xml, 19, "ln=len(data)+0"), 43, "data[0]"))
+
+    assert result.mode == "incremental" and result.patched_blocks == 1
+    assert converter.code == expected, "Incremental code should match a full conversion"
+    assert apply_patches(before, result.patches) == expected, "Relabels before the main flow change need patches too"
@@ -0,0 +1,138 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+import numpy as np
+from src.utils import matching
+from src.utils.matching import map_labels_to_edges, nearest_decisions
+
+
+def geometry(x, y, width=40, height=30):
+    return {"x": float(x), "y": float(y), "width": float(width), "height": float(height)}
+
+
+def test_nearest_decisions_prefers_first_on_ties(monkeypatch):
+    monkeypatch.setattr(matching, "DISTANCE_CHUNK", 2)
+    texts = np.array([[0, 0], [10, 0], [5, 0]], dtype=float)
+    decisions = np.array([[0, 1], [10, 1], [5, 1], [5, -1]], dtype=float)
+
+    assert nearest_decisions(texts, decisions).tolist() == [0, 1, 2]
+
+
+def test_decision_edges_get_nearest_labels():
+    graph = nx.DiGraph()
+    graph.add_node("d", type="decision", label="x > 1", geometry=geometry(100, 100, 80, 80))
+    graph.add_node("right", type="process", label="a = 1", geometry=geometry(300, 100))
+    graph.add_node("down", type="process", label="a = 2", geometry=geometry(100, 300))
+    graph.add_node("yes", type="text", label="Yes", geometry=geometry(185, 110))
+    graph.add_node("no", type="text", label="No", geometry=geometry(150, 185))
+    graph.add_edge("d", "right", style="exitX=1;exitY=0.5;")
+    graph.add_edge("d", "down", style="exitX=0.5;exitY=1;")
+
+    map_labels_to_edges(graph)
+
+    assert graph.nodes["yes"]["decision"] == "d"
+    assert graph.edges["d", "right"]["label"] == "Yes"
+    assert graph.edges["d", "down"]["label"] == "No"
+    assert graph.edges["d", "right"]["role"] == "true branch"
+
+
+def test_spatial_index_path_matches_brute_force(monkeypatch):
+    def labelled_graph():
+        graph = nx.DiGraph()
+        for i in range(20):
+            x, y = (i % 5) * 300, (i // 5) * 300
+            graph.add_node(f"d{i}", type="decision", label="c", geometry=geometry(x, y, 80, 80))
+            graph.add_node(f"a{i}", type="process", label="pass", geometry=geometry(x + 200, y))
+            graph.add_node(f"b{i}", type="process", label="pass", geometry=geometry(x, y + 200))
+            graph.add_node(f"ty{i}", type="text", label="Yes", geometry=geometry(x + 85, y + 15))
+            graph.add_node(f"tn{i}", type="text", label="No", geometry=geometry(x + 45, y + 85))
+            graph.add_edge(f"d{i}", f"a{i}", style="exitX=1;exitY=0.5;")
+            graph.add_edge(f"d{i}", f"b{i}", style="exitX=0.5;exitY=1;")
+        return graph
+
+    brute_force = labelled_graph()
+    map_labels_to_edges(brute_force)
+    monkeypatch.setattr(matching, "BRUTE_FORCE_PAIRS", 0)
+    indexed = labelled_graph()
+    map_labels_to_edges(indexed)
+
+    assert list(indexed.nodes(data=True)) == list(brute_force.nodes(data=True))
+    assert list(indexed.edges(data=True)) == list(brute_force.edges(data=True))
+
+
+def test_classify_loops_handles_sequential_loops_and_deep_chains():
+    graph = nx.DiGraph()
+
+    def add(node_id, node_type="process"):
+        graph.add_node(node_id, type=node_type)
+
+    # Two while loops in a row, the first one exiting through a diamond
+    for node_id in ("w1", "w2", "if"):
+        add(node_id, "decision")
+    for node_id in ("body1", "body2", "a", "b", "end"):
+        add(node_id)
+    graph.add_edge("w1", "body1", label="Yes")
+    graph.add_edge("body1", "w1")
+    graph.add_edge("w1", "if", label="No")
+    graph.add_edge("if", "a", label="Yes")
+    graph.add_edge("if", "b", label="No")
+    graph.add_edge("a", "w2")
+    graph.add_edge("b", "w2")
+    graph.add_edge("w2", "body2", label="Yes")
+    graph.add_edge("body2", "w2")
+    # A false branch longer than the recursion limit
+    previous = "w2"
+    for i in range(sys.getrecursionlimit() + 100):
+        add(f"s{i}")
+        graph.add_edge(previous, f"s{i}", **({"label": "No"} if previous == "w2" else {}))
+        previous = f"s{i}"
+    graph.add_edge(previous, "end")
+
+    matching.classify_loops(graph)
+
+    assert graph.nodes["w1"]["type"] == "while_loop"
+    assert graph.nodes["w2"]["type"] == "while_loop"
+    assert graph.nodes["if"]["type"] == "decision"
+
+
+def test_classify_loops_uses_the_innermost_loop():
+    graph = nx.DiGraph()
+
+    def add(node_id, node_type="process"):
+        graph.add_node(node_id, type=node_type)
+
+    for node_id in ("outer", "if", "inner", "in_repeat"):
+        add(node_id, "decision")
+    add("repeat", "repeat_loop")
+    for node_id in ("join_outer", "init", "join_inner", "step", "after_inner", "next", "a", "b", "end"):
+        add(node_id)
+    # A while loop whose body holds a decision and another while loop, each
+    # joined by a connector, the outer one exiting through a repeat loop
+    graph.add_edge("join_outer", "outer")
+    graph.add_edge("outer", "if", label="Yes")
+    graph.add_edge("outer", "repeat", label="No")
+    graph.add_edge("if", "init", label="Yes")
+    graph.add_edge("if", "next", label="No")
+    graph.add_edge("init", "join_inner")
+    graph.add_edge("join_inner", "inner")
+    graph.add_edge("inner", "step", label="Yes")
+    graph.add_edge("step", "join_inner")
+    graph.add_edge("inner", "after_inner", label="No")
+    graph.add_edge("after_inner", "next")
+    graph.add_edge("next", "join_outer")
+    # A decision in the repeat loop body comes back to the loop through both branches
+    graph.add_edge("repeat", "in_repeat", role="body")
+    graph.add_edge("in_repeat", "a", label="Yes")
+    graph.add_edge("in_repeat", "b", label="No")
+    graph.add_edge("a", "repeat")
+    graph.add_edge("b", "repeat")
+    graph.add_edge("repeat", "end", role="exit")
+
+    matching.classify_loops(graph)
+
+    assert graph.nodes["outer"]["type"] == "while_loop", "The false branch through a repeat loop leaves the loop"
+    assert graph.nodes["inner"]["type"] == "while_loop", "The enclosing loop should not keep the false branch inside"
+    assert graph.nodes["if"]["type"] == "decision"
+    assert graph.nodes["in_repeat"]["type"] == "decision", "The repeat loop should not make its body a while loop"
@@ -95,3 +95,15 @@ def test_text_blocks():
     for block_id, block_data in text_blocks.items():
         assert getattr(block_data,"label"), f"Text block {block_id} is missing a label."
         assert isinstance(getattr(block_data,"label"), str), f"Text block {block_id} label should be a string."
+
+def test_streaming_matches_tree_parser():
+    for name in ("test.drawio", "simpleExample.drawio"):
+        file_path = os.path.join(os.path.dirname(__file__), "data", name)
+
+        tree_graph = parse_drawio_file(file_path)
+        stream_graph = parse_drawio_file(file_path, streaming=True)
+
+        assert list(stream_graph.nodes(data=True)) == list(tree_graph.nodes(data=True)), \
+            f"Streaming parser nodes differ for {name}."
+        assert list(stream_graph.edges(data=True)) == list(tree_graph.edges(data=True)), \
+            f"Streaming parser edges differ for {name}."
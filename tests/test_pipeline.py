@@ -1,27 +1,31 @@
 # tests/test_pipeline.py
 
 import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
 from src.parser.drawio_parser import parse_drawio_file
-from src.graph.graph import find_entry_nodes, compute_immediate_dominators
-from src.generator.code_generator import generate_code, validate_generated_code
+from src.pipeline import convert_graph
+
+
+def validate_generated_code(code):
+    try:
+        compile(code, '<generated>', 'exec')
+    except SyntaxError as error:
+        return False, error
+    return True, None
+
 
 def test_pipeline():
     # Sample .drawio file path
-    test_file = os.path.abspath(r"C:\Users\orman\Documents\MimicHub\Pygorithm\tests\data\test.drawio")
+    test_file = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
 
     # Parse the file
-    graph, nodes, edge_exit_points = parse_drawio_file(test_file)
+    graph = parse_drawio_file(test_file)
     assert len(graph.nodes) > 0, "Parsing failed: Graph has no nodes."
 
-    # Analyze the graph
-    entry_nodes = find_entry_nodes(graph)
-    dominator_trees = compute_immediate_dominators(graph, entry_nodes)
-
-    # Mock loop analysis
-    loops_by_node = {}
-
     # Generate code
-    code = generate_code(graph, nodes, loops_by_node)
+    code = convert_graph(graph).code
     assert len(code.strip()) > 0, "Generated code is empty."
 
     # Validate the code
@@ -0,0 +1,53 @@
+import json
+import os
+import pstats
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.pipeline import convert_file
+from src.profiling import Profiler
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+STAGES = ['parse_drawio_file', 'map_labels_to_edges', 'classify_loops', 'classify_edges', 'graph_to_blocks',
+          'process_blocks', 'emit']
+
+
+def test_pipeline_records_a_span_per_stage():
+    with Profiler() as profiler:
+        code = convert_file(TEST_FILE, profiler=profiler)
+
+    assert code == convert_file(TEST_FILE), "Profiling should not change the generated code"
+    assert [span.name for span in profiler.spans] == STAGES, "Every stage should be recorded once, in order"
+    spans = {span.name: span for span in profiler.spans}
+    assert spans['parse_drawio_file'].counts == {'nodes': 17, 'edges': 15}, "Parsing should count the graph"
+    assert spans['graph_to_blocks'].counts['blocks'] > 0, "Block building should count the blocks"
+    assert all(span.wall > 0 and span.allocated is not None for span in profiler.spans), \
+        "Spans should have timings and allocations"
+
+
+def test_nested_spans_and_exports(tmp_path):
+    with Profiler(profile=True) as profiler:
+        with profiler.span('outer') as outer:
+            with profiler.span('inner'):
+                data = [0] * 100000
+            del data
+            outer.count(items=1)
+        with profiler.span('short'):
+            pass
+
+    spans = {span.name: span for span in profiler.spans}
+    assert spans['inner'].depth == 1 and spans['outer'].depth == 0, "Nesting should be recorded"
+    assert spans['outer'].peak_allocated >= spans['inner'].peak_allocated >= 800000, \
+        "The peak of a nested span should count for its parent"
+    assert profiler.slowest().name == 'outer', "The slowest top-level span should be found"
+
+    profiler.write_json(tmp_path / "timings.json")
+    profiler.write_chrome_trace(tmp_path / "trace.json")
+    timings = json.loads((tmp_path / "timings.json").read_text())
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [span["name"] for span in timings["spans"]] == ['outer', 'inner', 'short'], "JSON should list spans by start"
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events), "Trace events should be complete events"
+    assert events[0]["args"]["items"] == 1, "Counts should be exported as event arguments"
+
+    assert profiler.dump_profile(tmp_path / "slowest.prof") == 'outer', "The slowest stage should be profiled"
+    assert pstats.Stats(str(tmp_path / "slowest.prof")).total_calls >= 0, "The dump should be readable by pstats"
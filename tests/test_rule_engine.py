@@ -0,0 +1,52 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.bench_validator import nested_loop_graph
+from src.parser.validator import (EDGE, RULES, Rule, ValidationContext, register_rule, run_rules,
+                                  validate_edges, validate_graph, validate_loops, validate_nodes)
+
+
+def test_errors_keep_the_sequential_order():
+    graph, nodes = nested_loop_graph(3, 5)
+    graph.add_node("lonely", type="shape")
+    nodes["lonely"] = {"type": "shape"}
+    graph.add_edge("if0_0", "end", label="maybe")
+
+    expected = validate_nodes(graph, nodes) + validate_edges(graph, nodes) + validate_loops(graph, nodes)
+    expected.append("The graph has disconnected components. Ensure all blocks are connected.")
+    errors = validate_graph(graph, nodes)
+
+    assert errors == expected, "Node, edge, loop and connectivity errors should come in that order"
+    assert "Unknown node type: shape (Node ID: lonely)" in errors, "Unknown node types should be reported"
+    assert "Decision node if0_0 has an edge without a valid label ('Yes' or 'No')." in errors
+    assert validate_graph(graph, nodes, workers=4) == errors, "Threaded validation should keep the order"
+
+
+def test_max_errors_and_fail_fast():
+    graph, nodes = nested_loop_graph(2, 8)
+    errors = validate_graph(graph, nodes)
+
+    assert len(errors) > 5, "The stress graph breaks the degree rules of connectors and loops"
+    assert validate_graph(graph, nodes, max_errors=5) == errors[:5], "max_errors should keep the first errors"
+    assert validate_graph(graph, nodes, fail_fast=True) == errors[:1], "fail_fast should stop at the first error"
+
+
+def test_plugin_rules():
+    graph, nodes = nested_loop_graph(1, 2)
+
+    def unlabelled_yes(context, source, target, data):
+        if data.get("label") == "Yes" and context.nodes[target]["type"] != "process":
+            yield f"Yes branch of {source} should lead to a process"
+
+    rules = [rule for rule in RULES if rule.scope != EDGE]
+    register_rule(Rule("yes_to_process", EDGE, check=unlabelled_yes), rules)
+    graph.add_edge("while0", "end", label="Yes")
+
+    errors = validate_graph(graph, nodes, rules=rules)
+    assert "Yes branch of while0 should lead to a process" in errors, "Registered rules should run"
+    assert not any(error.startswith("Decision node") for error in errors), "Only the given rules should run"
+
+    context = ValidationContext(graph, nodes, block_rules={"decision": {"inputs": 1, "outputs": "any"}})
+    assert run_rules(context, rules, max_errors=1) == ["Unknown node type: terminator (Node ID: start)"], \
+        "Custom block rules should replace BLOCK_RULES"
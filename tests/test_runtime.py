@@ -0,0 +1,70 @@
+import ast
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+from benchmarks.synthetic import write_synthetic_diagram
+from src.pipeline import compile_source, convert_source, entry_lines
+from src.runtime import CONTINUE, QUIT, STEP, StopProgram, Tracer, load_program, new_namespace, run_program
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def program_namespace(answer="3"):
+    namespace = new_namespace()
+    namespace["input"] = lambda prompt="": answer
+    return namespace
+
+
+def test_debugger_calls_follow_the_first_word():
+    def calls(line):
+        return sum(line == "custom_debugger()" for line in entry_lines(["1", 0, [line]]))
+
+    assert calls("data = [int(i) for i in values]") == 1, "Words merely containing keywords get a call"
+    assert calls("iffy = 1") == 1, "Names starting with a keyword get a call"
+    assert calls("if x > 1:") == calls("else:") == calls("elif y:") == calls("pass") == 0
+    assert entry_lines(["1", 1, ["if x:\n    y = 1"]]) == ["    if x:", "        custom_debugger()", "        y = 1"], \
+        "Calls inside a block's own code should be indented like the line"
+
+
+@pytest.mark.parametrize("name", ["test.drawio", "simpleExample.drawio"])
+def test_release_code_has_no_instrumentation(name):
+    code = convert_source(os.path.join(DATA_DIR, name), debugger=False).code
+    assert "custom_debugger" not in code and "prompt_toolkit" not in code, "Release code should not be instrumented"
+
+    program = compile_source(os.path.join(DATA_DIR, name), debugger=False)
+    expected = ast.parse(code)
+    assert ast.dump(program.module) == ast.dump(expected), "The AST should be the one of the release text"
+    assert [node.lineno for node in program.module.body] == [node.lineno for node in expected.body]
+
+
+def test_trace_counts_block_hits(tmp_path):
+    program = load_program(write_synthetic_diagram(tmp_path / "loop.drawio", "while_loops", 4))
+    tracer = Tracer(program)
+    trace = sys.gettrace()
+    namespace = tracer.run(program_namespace("3"))
+
+    assert namespace["i0"] == 3, "The traced program should run to the end"
+    hits = {block_id: stats.hits for block_id, stats in tracer.stats.items()}
+    assert hits == {"i2": 1, "p4": 1, "d8": 4, "p12": 3}, "Loop headers count every test, bodies every iteration"
+    assert all(stats.seconds >= 0 for stats in tracer.stats.values())
+    assert sys.gettrace() is trace, "The previous trace function should be restored"
+    assert run_program(program, program_namespace("3"))["i0"] == 3, "Release runs should give the same result"
+
+
+def test_breakpoints_pause_only_at_requested_blocks(tmp_path):
+    program = load_program(write_synthetic_diagram(tmp_path / "loop.drawio", "while_loops", 4))
+    pauses = []
+
+    def on_break(block_id, frame):
+        pauses.append((block_id, frame.f_globals["i0"]))
+        return STEP if len(pauses) == 1 else CONTINUE
+
+    Tracer(program, breakpoints=["p12"], on_break=on_break).run(program_namespace("3"))
+    assert pauses == [("p12", 0), ("d8", 1), ("p12", 1), ("p12", 2)], "Stepping should pause at the next block only"
+
+    with pytest.raises(StopProgram, match="p12"):
+        Tracer(program, breakpoints=["p12"], on_break=lambda block_id, frame: QUIT).run(program_namespace("3"))
+    with pytest.raises(ValueError, match="nope"):
+        Tracer(program, breakpoints=["nope"])
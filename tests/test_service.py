@@ -0,0 +1,142 @@
+import asyncio
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+
+from src import pipeline
+from src.pipeline import convert_file
+from src.service import ConversionError, ConversionService, ServiceBusy, convert_batch
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+MULTI_PAGE_FILE = os.path.join(os.path.dirname(__file__), "data", "multiPage.drawio")
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def stall_on(monkeypatch, data, block_alarm=False):
+    """Makes conversions of ``data`` sleep, with SIGALRM blocked if ``block_alarm``, as if stuck in C code."""
+    convert_source = pipeline.convert_source
+
+    def stalling(source, *args, **kwargs):
+        if isinstance(source, io.BytesIO) and source.getvalue() == data:
+            if block_alarm:
+                signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+            time.sleep(60)
+        return convert_source(source, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "convert_source", stalling)
+
+
+def test_concurrent_requests_are_batched():
+    async def scenario():
+        async with ConversionService(workers=0) as service:
+            codes = await asyncio.gather(*(service.convert(read(TEST_FILE)) for _ in range(8)))
+            page = await service.convert(read(MULTI_PAGE_FILE), page=1)
+            with pytest.raises(ConversionError):
+                await service.convert(b"<mxfile><diagram>broken")
+            return codes, page, service.status()
+
+    codes, page, status = asyncio.run(scenario())
+    assert codes == [convert_file(TEST_FILE)] * 8, "Every request should get the code of its diagram"
+    assert page == convert_file(MULTI_PAGE_FILE, page=1), "The page should be passed on"
+    assert status["batches"] < 10, f"Queued requests should be sent to the worker together: {status}"
+    assert status["converted"] == 9 and status["failed"] == 1, f"Unexpected counters: {status}"
+
+
+def test_release_code():
+    async def scenario():
+        async with ConversionService(workers=0, debugger=False) as service:
+            return await service.convert(read(TEST_FILE))
+
+    assert asyncio.run(scenario()) == convert_file(TEST_FILE, debugger=False), \
+        "The service should convert without the debugger calls when asked to"
+
+def test_timeouts_and_backpressure():
+    async def scenario():
+        async with ConversionService(workers=0, queue_size=1) as service:
+            results = await asyncio.gather(*(service.convert(read(TEST_FILE), wait=False) for _ in range(4)),
+                                           return_exceptions=True)
+            with pytest.raises(asyncio.TimeoutError):
+                await service.convert(read(TEST_FILE), timeout=0)
+            # The service keeps working after a timeout
+            return results, await service.convert(read(TEST_FILE)), service.status()
+
+    results, code, status = asyncio.run(scenario())
+    assert isinstance(results[0], str), "The first request should fit in the queue"
+    assert all(isinstance(result, ServiceBusy) for result in results[1:]), "A full queue should refuse requests"
+    assert code == convert_file(TEST_FILE)
+    assert status["timed_out"] == 1 and status["rejected"] == 3, f"Unexpected counters: {status}"
+
+
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="needs SIGALRM")
+def test_late_requests_are_stopped_in_the_worker(monkeypatch):
+    stall_on(monkeypatch, b"slow")
+    start = time.monotonic()
+
+    results = convert_batch([(b"slow", None, time.time() + 0.2), (read(TEST_FILE), None, time.time() + 30),
+                             (read(TEST_FILE), None, time.time() - 1)], debugger=False)
+
+    assert results[0] == (None, ""), "A conversion should stop when its deadline passes"
+    assert results[1] == (True, convert_file(TEST_FILE, debugger=False)), \
+        "The requests after a slow one should still be converted"
+    assert results[2] == (None, ""), "Requests that are already late should be skipped"
+    assert time.monotonic() - start < 10
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork" or not hasattr(signal, "pthread_sigmask"),
+                    reason="the worker needs to inherit the stalling conversion")
+def test_stuck_worker_is_replaced(monkeypatch):
+    stall_on(monkeypatch, b"stuck", block_alarm=True)
+    monkeypatch.setattr("src.service.RECYCLE_GRACE", 0.1)
+
+    async def scenario():
+        async with ConversionService(workers=1, timeout=0.3) as service:
+            with pytest.raises(asyncio.TimeoutError):
+                await service.convert(b"stuck")
+            return await service.convert(read(TEST_FILE), timeout=30), service.status()
+
+    start = time.monotonic()
+    code, status = asyncio.run(scenario())
+    assert code == convert_file(TEST_FILE), "A new worker should take the place of the stuck one"
+    assert status["recycled"] == 1 and status["timed_out"] == 1, f"Unexpected counters: {status}"
+    assert time.monotonic() - start < 30, "The stuck worker should not be waited for"
+
+def test_http_server_in_worker_processes():
+    def post(port, body, path="/convert"):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        try:
+            connection.request("POST", path, body=body)
+            response = connection.getresponse()
+            answer = response.status, response.read().decode()
+            connection.request("GET", "/status")
+            return answer, json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+    async def scenario():
+        service = ConversionService(workers=1)
+        await service.serve(port=0)
+        try:
+            port = service.ports()[0]
+            return (await asyncio.to_thread(post, port, read(TEST_FILE)),
+                    await asyncio.to_thread(post, port, b"not a diagram"),
+                    await asyncio.to_thread(post, port, b"", "/missing"))
+        finally:
+            await service.close()
+
+    (converted, status), (failed, _), (missing, _) = asyncio.run(scenario())
+    assert converted == (200, convert_file(TEST_FILE)), "POST /convert should answer with the code"
+    assert status["converted"] == 1 and status["workers"] == 1, f"Unexpected status: {status}"
+    assert failed[0] == 422 and failed[1], "Diagrams that fail to convert should answer 422 with the error"
+    assert missing[0] == 404
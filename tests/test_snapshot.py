@@ -0,0 +1,69 @@
+import os
+import shutil
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import pytest
+
+import src.parser.snapshot
+from benchmarks.synthetic import write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.parser.snapshot import load_snapshot, parse_with_snapshot, save_snapshot
+from src.pipeline import convert_file, convert_graph
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def test_round_trip_keeps_the_graph_and_its_order(tmp_path):
+    mixed = write_synthetic_diagram(tmp_path / "mixed.drawio", 'mixed', 300)
+    for file_path in (os.path.join(DATA_DIR, "test.drawio"), mixed):
+        graph = parse_drawio_file(file_path)
+        save_snapshot(graph, tmp_path / "graph.f2c")
+        snapshot = load_snapshot(tmp_path / "graph.f2c")
+        restored = snapshot.to_networkx()
+
+        assert snapshot.number_of_nodes == len(graph) and snapshot.number_of_edges == graph.number_of_edges()
+        assert list(restored.nodes(data=True)) == list(graph.nodes(data=True)), "Nodes should keep their order and data"
+        assert list(restored.edges(data=True)) == list(graph.edges(data=True)), "Successors should keep their order"
+        assert all(list(restored.pred[node]) == list(graph.pred[node]) for node in graph), \
+            "Predecessors should keep their order"
+        assert convert_graph(restored).code == convert_graph(graph).code, "The snapshot should convert to the same code"
+
+
+def test_snapshot_arrays_are_memory_mapped(tmp_path):
+    graph = parse_drawio_file(os.path.join(DATA_DIR, "simpleExample.drawio"))
+    save_snapshot(graph, tmp_path / "graph.f2c")
+    snapshot = load_snapshot(tmp_path / "graph.f2c")
+    first = next(iter(graph))
+
+    assert not snapshot.indices.flags.writeable, "Loaded arrays should be read-only views of the file"
+    assert snapshot.node_ids[0] == first and snapshot.node_type(0) == graph.nodes[first].get('type')
+    assert [snapshot.node_ids[i] for i in snapshot.successors(0)] == list(graph.successors(first))
+
+    graph.nodes[first]['is_loop'] = True
+    with pytest.raises(ValueError):
+        save_snapshot(graph, tmp_path / "annotated.f2c")
+    (tmp_path / "bad.f2c").write_bytes(b"<mxfile/>")
+    with pytest.raises(ValueError):
+        load_snapshot(tmp_path / "bad.f2c")
+
+
+def test_parse_with_snapshot_refreshes_stale_snapshots(tmp_path, monkeypatch):
+    file_path = tmp_path / "diagram.drawio"
+    shutil.copy(os.path.join(DATA_DIR, "test.drawio"), file_path)
+    snapshot_path = tmp_path / "diagram.f2c"
+    code = convert_file(file_path)
+
+    assert convert_file(file_path, snapshot=snapshot_path) == code and snapshot_path.exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("An up to date snapshot must not parse the diagram again.")
+    with monkeypatch.context() as patch:
+        patch.setattr(src.parser.snapshot, "parse_drawio_file", fail)
+        assert convert_file(file_path, snapshot=snapshot_path) == code, "The snapshot should be used"
+
+    shutil.copy(os.path.join(DATA_DIR, "simpleExample.drawio"), file_path)
+    os.utime(file_path, ns=(0, 0))
+    assert list(parse_with_snapshot(file_path, snapshot_path)) == list(parse_drawio_file(file_path)), \
+        "A changed diagram should be parsed again"
+    assert load_snapshot(snapshot_path).source['mtime_ns'] == 0, "The snapshot should be refreshed"
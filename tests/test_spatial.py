@@ -0,0 +1,51 @@
+import math
+import os
+import random
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import networkx as nx
+from src.utils import spatial
+from src.utils.spatial import SpatialIndex
+
+
+def brute_force(points, x, y, node_type=None):
+    found = [(math.sqrt((px - x) ** 2 + (py - y) ** 2), i, node_id)
+             for i, (node_id, kind, px, py) in enumerate(points) if node_type in (None, kind)]
+    return [(node_id, distance) for distance, _, node_id in sorted(found)]
+
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    # Integer coordinates on a coarse lattice produce plenty of ties
+    points = [(f"n{i}", rng.choice(["decision", "text"]), rng.randint(0, 30) * 10, rng.randint(0, 30) * 10)
+              for i in range(300)]
+    index = SpatialIndex(points)
+
+    for _ in range(200):
+        x, y = rng.uniform(-100, 400), rng.uniform(-100, 400)
+        for node_type in (None, "decision"):
+            expected = brute_force(points, x, y, node_type)
+            assert index.nearest(x, y, k=3, node_type=node_type) == expected[:3]
+            assert index.within(x, y, 55, node_type=node_type) == [item for item in expected if item[1] <= 55]
+
+
+def test_far_queries_fall_back_to_a_scan(monkeypatch):
+    monkeypatch.setattr(spatial, "MAX_SCANNED_CELLS", 4)
+    points = [("a", "text", 0, 0), ("b", "text", 10, 0), ("c", "text", 0, 10)]
+    index = SpatialIndex(points, cell_size=1)
+
+    assert index.nearest(1000, 1000, k=2) == brute_force(points, 1000, 1000)[:2]
+
+
+def test_from_graph_by_type():
+    graph = nx.DiGraph()
+    graph.add_node("d", type="decision", geometry={"x": 0, "y": 0, "width": 80, "height": 80})
+    graph.add_node("t", type="text", geometry={"x": 50, "y": 50, "width": 40, "height": 30})
+    graph.add_node("bare")
+
+    index = SpatialIndex.from_graph(graph, anchor="center")
+
+    assert len(index) == 2
+    assert index.nearest(60, 60, node_type="decision") == [("d", 0.0 + math.sqrt(2) * 20)]
+    assert index.nearest(60, 60, node_type="process") == []
@@ -0,0 +1,12 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.bench_startup import ENTRY_MODULE, eager_lazy_modules, import_times
+
+
+def test_cli_startup_is_lazy():
+    times = import_times(ENTRY_MODULE)
+
+    assert not eager_lazy_modules(times), f"Heavy modules imported at startup: {eager_lazy_modules(times)}"
+
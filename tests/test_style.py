@@ -0,0 +1,57 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from src.parser.drawio_parser import detect_node_type, parse_drawio_file
+from src.parser.style import exit_point, parse_style, set_style_value, style_node_type
+from src.utils.matching import extract_edge_exit_point
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), "data", "test.drawio")
+
+
+def test_parse_style_is_a_cached_read_only_mapping():
+    style = parse_style('rhombus;whiteSpace=wrap;exitX=0;;exitX=1;')
+
+    assert dict(style) == {'rhombus': '', 'whiteSpace': 'wrap', 'exitX': '1'}, \
+        "Flags should map to '' and the last value of a key should win"
+    assert parse_style('rhombus;whiteSpace=wrap;exitX=0;;exitX=1;') is style, "Styles should be parsed once"
+    with pytest.raises(TypeError):
+        style['exitX'] = '0'
+
+
+def test_exit_points_and_node_types():
+    assert exit_point('edgeStyle=none;exitX=1;exitY=0.5;') == (1.0, 0.5), "Exit points should be read from the style"
+    assert exit_point('edgeStyle=none;') == (0.5, 0.5), "Missing exit points should default to the centre"
+    assert extract_edge_exit_point({'style': 'exitY=1;'}) == {'exitX': 0.5, 'exitY': 1.0}, \
+        "extract_edge_exit_point should keep its result format"
+
+    assert style_node_type('shape=parallelogram;perimeter=parallelogramPerimeter;') == 'input_output'
+    assert style_node_type('rounded=1;whiteSpace=wrap;') == 'terminator'
+    assert style_node_type('strokeColor=none;fillColor=none;') == 'text'
+    assert style_node_type('whiteSpace=wrap;') == 'process'
+
+    hexagon = '<mxCell style="shape=hexagon;perimeter=hexagonPerimeter2;" value="{}" />'
+    assert detect_node_type(ET.fromstring(hexagon.format('repeat 3 times'))) == 'repeat_loop'
+    assert detect_node_type(ET.fromstring(hexagon.format('for each x in data'))) == 'for_each_loop'
+    with pytest.raises(ValueError):
+        detect_node_type(ET.fromstring(hexagon.format('x = 1')))
+
+
+def test_parsed_graphs_share_style_strings():
+    graph = parse_drawio_file(TEST_FILE)
+    styles = [data['style'] for _, _, data in graph.edges(data=True)]
+    distinct = {id(style) for style in styles}
+
+    assert len(distinct) == len(set(styles)), "Equal style strings should be one interned object"
+
+
+def test_set_style_value_replaces_or_appends():
+    assert set_style_value('rhombus;fillColor=#fff;html=1', 'fillColor', '#000') == 'rhombus;fillColor=#000;html=1;', \
+        "An existing key should be replaced in place"
+    assert set_style_value('rounded=1;', 'fillColor', '#000') == 'rounded=1;fillColor=#000;', \
+        "A missing key should be appended"
+    assert style_node_type(set_style_value('rounded=1;', 'fillColor', '#000')) == 'terminator'
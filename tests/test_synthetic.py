@@ -0,0 +1,59 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.synthetic import PROGRAMS, mixed_program, nested_decisions_program, program_source, \
+    write_program_diagram, write_synthetic_diagram
+from src.parser.drawio_parser import parse_drawio_file
+from src.pipeline import compile_source, convert_file, convert_graph
+
+
+def test_every_kind_converts(tmp_path):
+    for kind in PROGRAMS:
+        path = write_synthetic_diagram(tmp_path / f"{kind}.drawio", kind, 30)
+        code = convert_file(path, debugger=False)
+        assert code.strip(), f"The {kind} diagram should convert to code"
+        compile(code, f"<{kind}>", "exec")
+        compile_source(path)
+
+
+
+def run(code, answer):
+    """Runs code with ``answer`` as every input; returns what it printed and its variables."""
+    printed = []
+    namespace = {'input': lambda *args: answer, 'print': lambda *args: printed.append(args)}
+    exec(code, namespace)
+    return printed, {name: value for name, value in namespace.items()
+                     if not name.startswith('_') and name not in ('input', 'print')}
+
+
+def test_conversions_behave_like_their_program(tmp_path):
+    programs = {f'mixed_{seed}': mixed_program(40, seed) for seed in range(4)}
+    programs['nested'] = nested_decisions_program(12)
+    for name, program in programs.items():
+        path = tmp_path / f"{name}.drawio"
+        write_program_diagram(path, program)
+        code = convert_file(path, debugger=False)
+        for answer in ('3', '12345678'):
+            assert run(code, answer) == run(program_source(program), answer), \
+                f"The {name} diagram should run like its program with input {answer!r}"
+
+def test_loops_are_recognised(tmp_path):
+    types = {}
+    for kind in ('while_loops', 'hexagon_loops'):
+        graph = parse_drawio_file(write_synthetic_diagram(tmp_path / f"{kind}.drawio", kind, 12))
+        convert_graph(graph)
+        types[kind] = [data['type'] for _, data in graph.nodes(data=True)]
+
+    assert types['while_loops'].count('while_loop') == 3, "Decisions with back edges should become while loops"
+    assert 'decision' not in types['while_loops'], "Every decision of the while loops should be a loop"
+    assert types['hexagon_loops'].count('repeat_loop') == 2 and types['hexagon_loops'].count('for_each_loop') == 2, \
+        "Hexagons should become repeat and for-each loops"
+
+
+def test_dense_labels_do_not_change_the_code(tmp_path):
+    plain = write_synthetic_diagram(tmp_path / "plain.drawio", 'mixed', 200)
+    dense = write_synthetic_diagram(tmp_path / "dense.drawio", 'mixed', 200, notes_per_decision=5)
+
+    assert len(parse_drawio_file(dense)) > len(parse_drawio_file(plain)), "Notes should add text blocks"
+    assert convert_file(dense) == convert_file(plain), "Labels next to the exits should win over distant notes"